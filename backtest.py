@@ -0,0 +1,182 @@
+#!/usr/bin/python
+
+import argparse
+import datetime
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from historical_price_screener import Security
+from history_archive import HistoryArchive
+from indicator_engine import build_date_matrix, build_price_matrices
+from price_archive import PriceArchive
+from price_cache import PriceCache
+from screen_rules import DEFAULT_SCREENS_FILE, load_screens
+from signals import SignalSeries
+
+
+    # Backtests the screener's signals over the local price cache.
+    #
+    # Every stock in the price cache is replayed through the same screens the nightly run uses
+    # (the screens file, see screen_rules.py) and each signal is scored by the stock's return over the next
+    # 5, 10, 30 and 60 trading days.  A signal is a hit when the stock moved the way the signal
+    # called it, up for everything except a down-trend.  The stocks are split into chunks that
+    # are backtested in a pool of worker processes and only the totals come back.
+    #
+    # No requests are made, fill the cache with a nightly run or a backfill first.  When PRICE_ARCHIVE_DIR is set the
+    # prices come from the memory mapped price archive instead (see price_archive.py), which skips the JSON parsing and the copying,
+    # and when HISTORY_ARCHIVE_DIR is set they come from the compressed long term archive (see history_archive.py).
+    ##################################################
+
+
+HORIZONS = (5, 10, 30, 60)
+
+
+def parse_date_argument(date_string = ''):
+    date_pieces = date_string.split('-')
+    return datetime.date(int(date_pieces[2]),int(date_pieces[1]),int(date_pieces[0]))
+
+
+# The symbols there are prices for, in the price archive or history archive if there is one and the price cache otherwise.
+# The price archive's are in slot order so that a chunk of them maps straight onto its files (see load_price_matrices).
+def get_source_symbols(cache_dir = 'price_cache', archive_dir = None, history_dir = None):
+    if archive_dir is not None: return list(PriceArchive(archive_dir).get_symbols())
+    if history_dir is not None: return HistoryArchive(history_dir).get_symbols()
+    return PriceCache(cache_dir).get_cached_symbols()
+
+
+# Loads the whole cached history of each stock, the days before the scored range seed the moving averages
+# and the days after it give the returns.  Stocks with less than min_days trading days are left out like in the nightly run.
+# With a history_dir the Securities are decoded from the history archive's blocks instead.
+def load_cached_securities(symbols = (), cache_dir = 'price_cache', min_days = 50, history_dir = None):
+    securities = []
+    if history_dir is not None:
+        archive = HistoryArchive(history_dir)
+        for k in symbols:
+            history = archive.get_columns(k)
+            if len(history['close']) >= min_days: securities.append(Security.from_columns(k, history))
+        return securities
+    
+    price_cache = PriceCache(cache_dir)
+    for k in symbols:
+        quote_list = price_cache.get_quotes(k, datetime.date.min, datetime.date.max)
+        price_cache.release(k)
+        if len(quote_list) >= min_days: securities.append(Security(quote_list))
+    return securities
+
+
+# Returns the right aligned (closes, highs, lows, volumes, lengths, dates) matrices of the stocks for SignalSeries,
+# or None when there are no stocks to backtest.
+# With an archive_dir the price matrices come straight from the price archive's memory mapped files without
+# building a Security per stock, and usually without a copy (see PriceArchive.get_price_matrices).  The stocks
+# with less than min_days trading days stay in but SignalSeries never screens them.
+def load_price_matrices(symbols = (), cache_dir = 'price_cache', min_days = 50, archive_dir = None, history_dir = None):
+    if archive_dir is not None:
+        if len(symbols) == 0: return None
+        archive = PriceArchive(archive_dir)
+        return archive.get_price_matrices(symbols) + (archive.get_date_matrix(symbols),)
+
+    securities = load_cached_securities(symbols, cache_dir, min_days, history_dir)
+    if len(securities) == 0: return None
+    return build_price_matrices(securities) + (build_date_matrix(securities),)
+
+
+# The days of the date matrix between start_date and end_date, either can be None for no limit.
+def days_in_range(dates = None, start_date = None, end_date = None):
+    in_range = np.ones(dates.shape, dtype=bool)
+    if start_date is not None: in_range &= dates >= np.datetime64(start_date)
+    if end_date is not None: in_range &= dates <= np.datetime64(end_date)
+    return in_range
+
+
+# Returns {horizon: matrix of the return from each day's close to the close horizon trading days later}.
+# The rows are right aligned so the later close is horizon columns to the right, NaN past the last day.
+def forward_returns(closes = None, horizons = HORIZONS):
+    returns = {}
+    for horizon in horizons:
+        future_closes = np.full(closes.shape, np.nan)
+        future_closes[:, :-horizon] = closes[:, horizon:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns[horizon] = (future_closes - closes) / closes
+    return returns
+
+
+# Scores the signals on the given days.
+# Returns {'signals': count, horizon: [signals with a return, hits, sum of the returns]}.
+def score_days(trend_type = '', days = None, returns = None):
+    direction = -1 if trend_type == 'down' else 1
+    stats = { 'signals': int(days.sum()) }
+    for horizon, horizon_returns in returns.items():
+        signal_returns = horizon_returns[days]
+        signal_returns = signal_returns[np.isfinite(signal_returns)]
+        stats[horizon] = [len(signal_returns), int((signal_returns * direction > 0).sum()), float(signal_returns.sum())]
+    return stats
+
+
+# Backtests one chunk of stocks.  The screens are compiled in the worker, the compiled rules can't be pickled.
+# Returns {trend_type: {'signals': count, horizon: [signals with a return, hits, sum of the returns]}}.
+def backtest_symbols(symbols = (), cache_dir = 'price_cache', start_date = None, end_date = None, horizons = HORIZONS, screens_file = DEFAULT_SCREENS_FILE, include_disabled = False, archive_dir = None, history_dir = None):
+    screens = load_screens(screens_file)
+    min_days = max(50, screens.get_lookback(include_disabled))
+    matrices = load_price_matrices(symbols, cache_dir, min_days, archive_dir, history_dir)
+    if matrices is None: return {}
+
+    closes, highs, lows, volumes, lengths, dates = matrices
+    in_range = days_in_range(dates, start_date, end_date)
+    returns = forward_returns(closes, horizons)
+
+    signal_series = SignalSeries(closes, volumes, lengths, highs, lows, min_days)
+    return {trend_type: score_days(trend_type, days & in_range, returns) for trend_type, days in signal_series.screen_days(screens, include_disabled)}
+
+
+def merge_stats(total = None, stats = None):
+    for trend_type, trend_stats in stats.items():
+        total_trend_stats = total.setdefault(trend_type, { 'signals': 0 })
+        for key, value in trend_stats.items():
+            if key == 'signals': total_trend_stats['signals'] += value
+            else: total_trend_stats[key] = [a + b for a, b in zip(total_trend_stats.get(key, [0, 0, 0.0]), value)]
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtests the screener's signals over the local price cache.")
+    parser.add_argument('--from', dest='start_date', default=None, help="First signal day to score as dd-mm-yyyy, defaults to the start of the cache.")
+    parser.add_argument('--to', dest='end_date', default=None, help="Last signal day to score as dd-mm-yyyy, defaults to the end of the cache.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=250, help="Stocks per work item.")
+    parser.add_argument('--all-screens', action='store_true', help="Also score the screens that are switched off with enabled = no.")
+    args = parser.parse_args()
+
+    start_date = parse_date_argument(args.start_date) if args.start_date is not None else None
+    end_date = parse_date_argument(args.end_date) if args.end_date is not None else None
+
+    # Compile the screens once up front so a bad rule stops the run before the workers start.
+    screens_file = os.getenv('SCREENS_FILE', DEFAULT_SCREENS_FILE)
+    load_screens(screens_file)
+
+    cache_dir = os.getenv('PRICE_CACHE_DIR', 'price_cache')
+    archive_dir = os.getenv('PRICE_ARCHIVE_DIR')
+    history_dir = os.getenv('HISTORY_ARCHIVE_DIR')
+    symbols = get_source_symbols(cache_dir, archive_dir, history_dir)
+    chunks = [symbols[i:i + args.chunk_size] for i in range(0, len(symbols), args.chunk_size)]
+    source = 'price archive' if archive_dir is not None else 'history archive' if history_dir is not None else 'price cache'
+    print("Backtesting {} stocks from the {} in {} chunks.".format(len(symbols), source, len(chunks)))
+
+    stats = {}
+    with ProcessPoolExecutor(max_workers=max(args.workers, 1)) as executor:
+        pending = [executor.submit(backtest_symbols, chunk, cache_dir, start_date, end_date, HORIZONS, screens_file, args.all_screens, archive_dir, history_dir) for chunk in chunks]
+        for future in pending:
+            try: merge_stats(stats, future.result())
+            except: logging.exception("Had an issue backtesting one of the chunks, its stocks are left out.")
+
+    print("{:<24}{:>10}{:>10}{:>10}{:>10}{:>12}".format('Signal', 'Signals', 'Horizon', 'Scored', 'Hit rate', 'Avg return'))
+    for trend_type, trend_stats in stats.items():
+        for horizon in HORIZONS:
+            count, hits, return_sum = trend_stats.get(horizon, [0, 0, 0.0])
+            if count > 0: print("{:<24}{:>10}{:>10}{:>10}{:>10.1%}{:>12.2%}".format(trend_type, trend_stats['signals'], horizon, count, hits / count, return_sum / count))
+            else: print("{:<24}{:>10}{:>10}{:>10}{:>10}{:>12}".format(trend_type, trend_stats['signals'], horizon, 0, '-', '-'))
+
+
+if __name__ == "__main__": main()
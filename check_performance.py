@@ -1,9 +1,11 @@
 #!/usr/bin/python
 
-import boto3
-import requests
 import datetime
-from boto3.dynamodb.conditions import Key, Attr
+import os
+
+from quote_fetcher import QuoteFetcher
+from quote_sources import YahooYQLSource
+from trend_store import open_trend_store
 
 
 
@@ -18,28 +20,22 @@ def main():
         
         return datetime.date(year, month, day)
     
-    def get_security_close_price(desired_date, stock_symbol):
-        yahoo_query_url = 'https://query.yahooapis.com/v1/public/yql?q=select%20*%20from%20yahoo.finance.historicaldata%20where%20symbol%20%3D%20%22###%22%20and%20startDate%20%3D%20%22SSSS%22%20and%20endDate%20%3D%20%22EEEE%22&format=json&diagnostics=true&env=store%3A%2F%2Fdatatables.org%2Falltableswithkeys&callback='    
-        
-        specific_query = yahoo_query_url.replace('SSSS', str(desired_date))
-        specific_query = specific_query.replace("EEEE", str(desired_date))
-        specific_query = specific_query.replace("###",stock_symbol)
-                
-        hist_resp = requests.get(specific_query)
-        
-        bulk_response = hist_resp.json()['query']
+    # Pulls the close prices for a set of symbols on one date.  The symbols are requested together in batches
+    # so we make one request per date per batch instead of one per symbol.
+    def get_security_close_prices(desired_date, stock_symbols):
+        close_prices = {}
+        for symbol, pending_response in fetcher.fetch_all([(symbol, desired_date, desired_date) for symbol in stock_symbols]):
+            quote_list = pending_response.result()
+            if quote_list: close_prices[symbol] = float(quote_list[0]['Close'])
         
-        results_dict = bulk_response['results']
-        
-        quote_list = results_dict['quote']
-        
-        return float(quote_list['Close'])
+        return close_prices
+    
+    fetcher = QuoteFetcher(YahooYQLSource(50))
     
     the_stocks = ["AMD", "HSTM", "GRPN", "EBAY", "MET", "NVDA", "TWTR", "MSFT", "NFLX", "AAPL", "C", "ANTH", "APOL","RCII","TROW","DVAX","BMRN","LLTC","PRGX","ASML","MFRI","TTGT","CELG","VNOM","TITN","ININ","XENE","ILMN"]
 
-    dynamodb = boto3.resource('dynamodb', region_name='us-east-1', endpoint_url="http://dynamodb.us-east-1.amazonaws.com")
-    #print("Opening the trend history table.")
-    trend_history_table = dynamodb.Table('Trend_History') 
+    # This has always looked at the PROD trends, set ENV=DEV to look at the local ones.
+    trend_store = open_trend_store(os.getenv('ENV', 'PROD'))
     
     # Loop through and select the trend history for each stock in the list.
     # For each stock we parse out the date of each trend and if it has been at least 30 days, we determine the price change of the stock since the trend identification. 
@@ -47,35 +43,49 @@ def main():
     
     # Note: We started collecting trends on 11-July-2016.  Using that date as the first trend is not valid so we should discount that one.
     
+    # First pull all of the trends so we know which closes we need, then grab the closes for each date in bulk.
+    trend_items = []
+    closes_needed = {}
     for security in the_stocks:
-        trend_dict = trend_history_table.query(
-            KeyConditionExpression=Key('stock_symbol').eq(security)                               
-        )
+        # Loop through the items which is a list of dictionaries.
+        for x in trend_store.query_trend_history(security):
+            trend_date = split_and_make_date(x['occurence_date'])
+            trend_items.append(x)
+            
+            # Don't do analysis for trends that are less than 30 days old.
+            trend_date_plus_thirty = trend_date + datetime.timedelta(days=30)
+            if trend_date > split_and_make_date('2016-07-11') and trend_date_plus_thirty < datetime.date.today():
+                closes_needed.setdefault(trend_date, set()).add(x['stock_symbol'])
+                closes_needed.setdefault(trend_date_plus_thirty, set()).add(x['stock_symbol'])
+    
+    close_prices = {}
+    for desired_date, stock_symbols in closes_needed.items():
+        for symbol, close_price in get_security_close_prices(desired_date, sorted(stock_symbols)).items():
+            close_prices[(symbol, desired_date)] = close_price
+    
+    for security in the_stocks:
+        items = [x for x in trend_items if x['stock_symbol'] == security]
         
-        if trend_dict['Count'] > 0: 
-            print("We have {} trend instances for {}.".format(trend_dict['Count'], security))
+        if len(items) > 0: 
+            print("We have {} trend instances for {}.".format(len(items), security))
    
-            # Loop through the items which is a list of dictionaries.
-            for x in trend_dict['Items']:
+            for x in items:
                 
                 trend_date = split_and_make_date(x['occurence_date'])
                 
                 if trend_date > split_and_make_date('2016-07-11'):
                     
                     print("\t{} has a {} signal on {}".format(x['stock_symbol'], x['trend_type'], x['occurence_date']))
-                
-                
-                    
                     
-                    #print(type(trend_date))
                     trend_date_plus_thirty = trend_date + datetime.timedelta(days=30)
-                    #print(trend_date)
-                    #print(trend_date_plus_thirty)
                     
                     # Don't do analysis for trends that are less than 30 days old.
                     if trend_date_plus_thirty < datetime.date.today(): 
-                        trend_date_close = get_security_close_price(trend_date, x['stock_symbol'])
-                        thirty_day_close = get_security_close_price(trend_date_plus_thirty, x['stock_symbol'])
+                        trend_date_close = close_prices.get((x['stock_symbol'], trend_date))
+                        thirty_day_close = close_prices.get((x['stock_symbol'], trend_date_plus_thirty))
+                        if trend_date_close is None or thirty_day_close is None:
+                            print("\t\tYahoo didn't have a close price for one of these dates (weekend or holiday).")
+                            continue
                         print("\t\tClose price on {} was {}".format(trend_date, trend_date_close))
                         print("\t\tClose price on {} was {}".format(trend_date_plus_thirty, thirty_day_close))
                         print("\t\tWhich represents a {} increase.".format((thirty_day_close - trend_date_close) / trend_date_close))
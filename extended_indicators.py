@@ -0,0 +1,138 @@
+#!/usr/bin/python
+
+import numpy as np
+
+from indicator_engine import build_price_matrices, cumulative_sums, rolling_sum
+
+
+    # Extended indicator library: RSI, MACD, Bollinger Bands, ATR and OBV.
+    #
+    # Works on the same right aligned (symbols x days) matrices as indicator_engine.py and computes
+    # every requested indicator in one sweep instead of one loop per indicator.  The intermediate
+    # values are worked out once and shared: the day to day close changes feed the RSI and the OBV,
+    # the previous close feeds the changes and the true range, and the running sums of the closes and
+    # the squared closes give the Bollinger middle band and width.
+    #
+    # The indicators that are smoothed one day at a time (the MACD EMAs and signal line, the RSI's
+    # average gain and loss and the ATR) are all advanced together in a single walk over the days.
+    #
+    # The EMAs follow the screener's convention, seeded with the SMA of the first period days and
+    # reported from the next day on.  The RSI and ATR use Wilder's smoothing and are reported from the
+    # day their first average is complete.  Days without enough history are NaN.
+    ##################################################
+
+
+# The names the indicators are stored under in a Security (see Security.get_indicator), for the default periods.
+EXTENDED_INDICATORS = ('rsi14', 'macd', 'macd_signal', 'macd_histogram', 'bollinger_upper', 'bollinger_middle', 'bollinger_lower', 'atr14', 'obv')
+
+
+class _Smoother:
+    # One exponentially smoothed series for the fused walk: value = (x - value) * alpha + value.
+    # seed_end is the column of each row where the seed average of the first period inputs is complete,
+    # the series is reported from that column (report_seed) or from the one after it.
+    def __init__(self, inputs = None, alpha = 0.0, period = 0, seed_end = None, report_seed = False):
+        self.inputs = inputs
+        self.alpha = alpha
+        self.period = period
+        self.seed_end = seed_end
+        self.report_seed = report_seed
+
+        self.seed_sum = np.zeros(len(seed_end))
+        self.current = np.full(len(seed_end), np.nan)
+        self.output = None
+
+    def step(self, j = 0, x = None):
+        in_seed = (j > self.seed_end - self.period) & (j <= self.seed_end)
+        self.seed_sum += np.where(in_seed, np.nan_to_num(x), 0.0)
+
+        self.current = np.where(j == self.seed_end, self.seed_sum / self.period, np.where(j > self.seed_end, (x - self.current) * self.alpha + self.current, self.current))
+
+        reported = (j >= self.seed_end) if self.report_seed else (j > self.seed_end)
+        self.output[:, j] = np.where(reported, self.current, np.nan)
+
+
+# Computes the requested indicators (names from EXTENDED_INDICATORS) for every day of the matrices.
+# Returns {name: (symbols x days) matrix}.
+def extended_indicator_series(closes = None, highs = None, lows = None, volumes = None, lengths = None, indicators = EXTENDED_INDICATORS,
+                              rsi_period = 14, macd_periods = (12, 26, 9), bollinger_period = 20, bollinger_width = 2, atr_period = 14):
+    n_rows, width = closes.shape
+    start = width - lengths
+    indicators = set(indicators)
+    series = {}
+
+    # Shared by the RSI, the OBV and the true range.
+    previous_closes = np.full(closes.shape, np.nan)
+    previous_closes[:, 1:] = closes[:, :-1]
+    changes = closes - previous_closes
+
+    smoothers = {}
+    if indicators & {'macd', 'macd_signal', 'macd_histogram'}:
+        fast_period, slow_period, signal_period = macd_periods
+        smoothers['fast_ema'] = _Smoother(closes, 2 / (fast_period + 1), fast_period, start + fast_period - 1)
+        smoothers['slow_ema'] = _Smoother(closes, 2 / (slow_period + 1), slow_period, start + slow_period - 1)
+        # The signal line smooths the MACD itself so its input is filled in during the walk.
+        smoothers['macd_signal'] = _Smoother(None, 2 / (signal_period + 1), signal_period, start + slow_period + signal_period - 1)
+        series['macd'] = np.full(closes.shape, np.nan)
+
+    if 'rsi14' in indicators:
+        with np.errstate(invalid='ignore'):
+            gains, losses = np.where(changes > 0, changes, 0.0), np.where(changes < 0, -changes, 0.0)
+        smoothers['average_gain'] = _Smoother(gains, 1 / rsi_period, rsi_period, start + rsi_period, True)
+        smoothers['average_loss'] = _Smoother(losses, 1 / rsi_period, rsi_period, start + rsi_period, True)
+
+    if 'atr14' in indicators:
+        # True range = the largest of today's range and the gaps from yesterday's close, just the range on the first day.
+        with np.errstate(invalid='ignore'):
+            true_ranges = np.fmax(highs - lows, np.fmax(np.abs(highs - previous_closes), np.abs(lows - previous_closes)))
+        smoothers['atr'] = _Smoother(true_ranges, 1 / atr_period, atr_period, start + atr_period - 1, True)
+
+    # The fused walk, one vectorized step per trading day for every smoothed series at once.
+    if len(smoothers) > 0:
+        for smoother in smoothers.values(): smoother.output = np.full(closes.shape, np.nan)
+        first_col = int(start.min()) if n_rows > 0 else width
+        for j in range(first_col, width):
+            for name, smoother in smoothers.items():
+                if name == 'macd_signal':
+                    series['macd'][:, j] = smoothers['fast_ema'].output[:, j] - smoothers['slow_ema'].output[:, j]
+                    smoother.step(j, series['macd'][:, j])
+                else: smoother.step(j, smoother.inputs[:, j])
+
+    if 'macd' in series:
+        series['macd_signal'] = smoothers['macd_signal'].output
+        series['macd_histogram'] = series['macd'] - series['macd_signal']
+
+    if 'rsi14' in indicators:
+        average_gain, average_loss = smoothers['average_gain'].output, smoothers['average_loss'].output
+        # RSI = 100 - 100 / (1 + gain / loss), written so a day without losses is 100 instead of a divide by zero.
+        # A stretch with no change at all has neither and is reported as 50.
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = 100 * average_gain / (average_gain + average_loss)
+        series['rsi14'] = np.where((average_gain == 0) & (average_loss == 0), 50.0, rsi)
+
+    if 'atr14' in indicators: series['atr14'] = smoothers['atr'].output
+
+    if indicators & {'bollinger_upper', 'bollinger_middle', 'bollinger_lower'}:
+        # The middle band is the SMA and the width is bollinger_width standard deviations of the same closes.
+        middle = rolling_sum(closes, lengths, bollinger_period, cumulative_sums(closes)) / bollinger_period
+        mean_squares = rolling_sum(closes * closes, lengths, bollinger_period) / bollinger_period
+        deviation = np.sqrt(np.maximum(mean_squares - middle * middle, 0.0))
+        series['bollinger_middle'] = middle
+        series['bollinger_upper'] = middle + bollinger_width * deviation
+        series['bollinger_lower'] = middle - bollinger_width * deviation
+
+    if 'obv' in indicators:
+        # On balance volume adds the day's volume on an up close and takes it away on a down close, starting from zero.
+        with np.errstate(invalid='ignore'):
+            signed_volumes = np.sign(np.nan_to_num(changes)) * volumes
+        obv = np.cumsum(np.nan_to_num(signed_volumes), axis=1)
+        obv[np.arange(width)[None, :] < start[:, None]] = np.nan
+        series['obv'] = obv
+
+    return {name: series[name] for name in indicators if name in series}
+
+
+# The latest value of each requested indicator for every security, as arrays that line up with securities.
+def latest_extended_indicators(securities = (), indicators = EXTENDED_INDICATORS):
+    if len(securities) == 0: return {name: np.zeros(0) for name in indicators}
+    closes, highs, lows, volumes, lengths = build_price_matrices(securities)
+    return {name: values[:, -1] for name, values in extended_indicator_series(closes, highs, lows, volumes, lengths, indicators).items()}
@@ -0,0 +1,134 @@
+#!/usr/bin/python
+
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+    # Shared HTTP client for the price source.
+    #
+    # One requests Session is shared by all of the fetch threads so connections are kept alive
+    # and reused.  Every request has a timeout, failed requests (connection problems, non-200
+    # responses and malformed JSON) are retried with exponential backoff and jitter, and a
+    # circuit breaker pauses the whole run when the upstream is clearly down instead of failing
+    # every remaining symbol one after the other.
+    ##################################################
+
+
+# Raised when a request still fails after all of its retries, or when the upstream stays down.
+# It is a ConnectionError so the screener counts it with the rest of the connection errors.
+class FetchError(ConnectionError):
+    pass
+
+
+class CircuitBreaker:
+    # After failure_threshold failures in a row the breaker opens and every caller waits for cooldown seconds.
+    # Then one request is let through: if it works the breaker closes, otherwise it opens again with twice the cooldown.
+    # Once the breaker has been open for more than max_pause seconds in total we give up and raise FetchError.
+    def __init__(self, failure_threshold = 5, cooldown = 30.0, max_cooldown = 600.0, max_pause = 3600.0):
+        self._failure_threshold = failure_threshold
+        self._base_cooldown = cooldown
+        self._cooldown = cooldown
+        self._max_cooldown = max_cooldown
+        self._max_pause = max_pause
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._total_pause = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    # Blocks while the breaker is open.
+    def before_request(self):
+        while True:
+            with self._lock:
+                if self._opened_at is None: return
+
+                remaining = self._opened_at + self._cooldown - time.monotonic()
+                if remaining <= 0 and not self._trial_in_flight:
+                    # Half open, let one request through to see if the upstream is back.
+                    self._trial_in_flight = True
+                    return
+
+                if self._total_pause >= self._max_pause:
+                    raise FetchError("The price source has been down for more than {} seconds, giving up.".format(self._max_pause))
+
+            time.sleep(max(min(remaining, 1.0), 0.1))
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None: logging.info("The price source is responding again, resuming the run.")
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._cooldown = self._base_cooldown
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._trial_in_flight:
+                # The trial request failed, stay open and back off further.
+                self._trial_in_flight = False
+                self._total_pause += self._cooldown
+                self._cooldown = min(self._cooldown * 2, self._max_cooldown)
+                self._opened_at = time.monotonic()
+                logging.warn("The price source is still down, pausing for {} seconds.".format(self._cooldown))
+            elif self._opened_at is None and self._consecutive_failures >= self._failure_threshold:
+                self._opened_at = time.monotonic()
+                logging.warn("{} requests in a row failed, pausing the run for {} seconds.".format(self._consecutive_failures, self._cooldown))
+
+    def is_open(self):
+        return self._opened_at is not None
+
+
+class FetchClient:
+    def __init__(self, pool_size = 8, timeout = 30.0, max_retries = 4, backoff_base = 1.0, backoff_max = 60.0, circuit_breaker = None):
+        self._timeout = timeout
+        self._max_retries = max_retries
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+        self._circuit_breaker = circuit_breaker or CircuitBreaker()
+
+        # Keep alive connection pooling, sized so every fetch thread can hold its own connection.
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+    # Full jitter: sleep somewhere between zero and the exponential backoff for this attempt.
+    def _backoff(self, attempt = 0):
+        time.sleep(random.uniform(0, min(self._backoff_max, self._backoff_base * (2 ** attempt))))
+
+    # Returns the parsed JSON body for url.
+    # is_valid is an optional function that checks the parsed body, an invalid body is retried like a malformed one.
+    # rate_limiter is an optional TokenBucket (see quote_fetcher.py), every attempt takes a token so the retries count against the rate too.
+    def get_json(self, url = '', is_valid = None, rate_limiter = None):
+        last_problem = ''
+        for attempt in range(self._max_retries + 1):
+            if attempt > 0: self._backoff(attempt - 1)
+            self._circuit_breaker.before_request()
+            if rate_limiter is not None: rate_limiter.acquire()
+
+            try:
+                response = self._session.get(url, timeout=self._timeout)
+                if response.status_code != 200:
+                    last_problem = "received a {} status code".format(response.status_code)
+                else:
+                    payload = response.json()
+                    if is_valid is None or is_valid(payload):
+                        self._circuit_breaker.record_success()
+                        return payload
+                    last_problem = "received an unexpected response body"
+            except ValueError as ve: last_problem = "received malformed JSON ({})".format(ve)
+            except requests.exceptions.RequestException as re: last_problem = "could not connect ({})".format(re)
+
+            self._circuit_breaker.record_failure()
+            logging.warn("Attempt {} of {} {}.".format(attempt + 1, self._max_retries + 1, last_problem))
+
+        raise FetchError("Giving up after {} attempts, the last one {}.".format(self._max_retries + 1, last_problem))
+
+    def close(self):
+        self._session.close()
@@ -1,13 +1,29 @@
 #!/usr/bin/python
 
-import requests
+import argparse
 import datetime
 import boto3
 import logging
 import os
-import sys
-import time
-from _ctypes import ArgumentError
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from extended_indicators import EXTENDED_INDICATORS, latest_extended_indicators
+from indicator_engine import UNIVERSE_INDICATORS, build_date_matrix, build_price_matrices
+from indicator_state import IndicatorStateStore
+from input_loader import InputLoader
+from negative_cache import NegativeCache
+from price_cache import PriceCache
+from quote_fetcher import QuoteFetcher
+from quote_sources import YahooYQLSource
+from run_journal import RunJournal
+from screen_results import NotifiedStock, ScreenResult, shard_symbols
+from screen_rules import DEFAULT_SCREENS_FILE, INDICATOR_PATTERN, latest_indicator_values, load_screens
+from signals import SignalSeries
+from trend_store import open_trend_store
+from universe import UniverseFilter, load_universe
 
 
 
@@ -28,76 +44,21 @@ from _ctypes import ArgumentError
     ##################################################
 
 
-class TradingDay:
-    def __init__(self, sec_trading_data = None):    
-        self._data = sec_trading_data      
-        self._symbol = ''
-        self._open = 0.0
-        self._close = 0.0
-        self._volume = 0
-        self._adj_close = 0.0
-        self._low = 0.0
-        self._high = 0.0
-        self._date = None
- 
-        try:
-            # Assign the day's data to object properties.
-            if self._data != None:
-                self._symbol = self._data['Symbol']
-                self._open = float(self._data['Open'])
-                self._close = float(self._data['Close'])
-                self._volume = int(self._data['Volume'])
-                self._adj_close = float(self._data['Adj_Close'])
-                self._low = float(self._data['Low'])
-                self._high = float(self._data['High'])
-                date_parts = self._data['Date'].split('-')
-                self._date = datetime.date(int(date_parts[0]),int(date_parts[1]),int(date_parts[2]))
-            else: raise ArgumentError
-        except KeyError as e: logging.exception("Threw a key error while populating this trading day:", e)
-        except ArgumentError as e: logging.exception("There is an issue with the arguments passed into the TradingDay class:", e)
-        except: logging.exception("There is an issue assigning values within the __init__ function of the TradingDay class.")
-    
-    # Set this so that you can just call .sort() on a list of these objects and sort them by date.
-    def __lt__(self,other):           
-        return self.get_date() < other.get_date()
-        
-    def get_symbol(self):
-        return self._symbol
-        
-    def get_open(self):
-        return self._open
-        
-    def get_close(self):
-        return self._close
-        
-    def get_volume(self):
-        return self._volume
-        
-    def get_adj_close(self):
-        return self._adj_close
-        
-    def get_low(self):
-        return self._low
-        
-    def get_high(self):
-        return self._high
-        
-    def get_date(self):
-        return self._date
-    
-        
+def _quote_column(quote_list = None, key = '', dtype = float):
+    return np.fromiter((quote[key] for quote in quote_list), dtype=dtype, count=len(quote_list))
 
 
 class Security:
-    def __init__(self, security_data_list = None):
+    # The indicators are calculated the first time they are asked for and then remembered, most stocks never need the CMF.
+    # indicators lists the ones to calculate up front (names like 'sma10', 'ema20' and 'cmf15', see screen_rules.py).
+    # Runs that calculate the indicators for the whole universe at once (see indicator_engine.py) hand them over with assign_indicators.
+    # The raw quote dictionaries are let go once they are turned into arrays unless keep_raw_data is True.
+    def __init__(self, security_data_list = None, indicators = (), keep_raw_data = False):
         
         # security_data_list is a list of dictionary objects containing historical prices for the security.
         self._data = security_data_list      
-        self._10_day_sma = 0.0
-        self._50_day_sma = 0.0
-        self._20_day_ema = 0.0
-        self._30_day_ema = 0.0
-        self._chaikin_money_flow = 0.0
+        self._indicators = {}
+        self._prefix_sums = None
         self._current_day_volume = 0
         self._current_day_close = 0.0
         self._yesterday_close = 0.0
@@ -108,78 +69,96 @@ class Security:
         # make sure that the list was passed in and that it has 30 days of security prices.
         # Right now we are selecting 124 days of historical data, need to change the date parsing in the query generation process.
         # Still need to add the 30 day compare and build out assigning variables.  Moving out to parsing out the Yahoo query first so we can loop back in.
-                
-        self._trading_day_list = []
         
-        # Each iteration of i will be a dictionary object holding a days trading data which will be passed in with the init function of the TradingDay object.
+        # The trading days are held as one array per column (dates, open, high, low, close, adjusted close and volume)
+        # instead of one object per day.  Index i in every array is the same trading day and the arrays are sorted by date.
+        quote_list = []
         if self._data != None:
-            for i in self._data:
-                #print(i)
-                day = TradingDay(i)
-               
-                self._trading_day_list.append(day)
-                
-        # This sorts the trading days by date.        
-        self._trading_day_list.sort()
+            # The dates are ISO formatted strings so sorting on the string sorts the trading days by date.
+            quote_list = sorted(self._data, key=lambda quote: quote['Date'])
         
-        num_trd = len(self._trading_day_list)
+        symbol = ''
+        if len(quote_list) > 0: symbol = quote_list[len(quote_list) - 1]['Symbol']
+        if not keep_raw_data: self._data = None
         
-        #logging.info("This is the total number of trading days - {}".format(num_trd))  
-               
-        # Calculate and assign the moving averages
-        self._10_day_sma = self.calc_simple_moving_average(10, num_trd)
-        self._50_day_sma = self.calc_simple_moving_average(50, num_trd)
-        self._20_day_ema = self.calc_exp_moving_average(20, num_trd)
-        self._30_day_ema = self.calc_exp_moving_average(30, num_trd)
+        self._assign_columns(symbol, np.array([quote['Date'] for quote in quote_list], dtype='datetime64[D]'), _quote_column(quote_list, 'Open'), _quote_column(quote_list, 'High'),
+                             _quote_column(quote_list, 'Low'), _quote_column(quote_list, 'Close'), _quote_column(quote_list, 'Adj_Close'), _quote_column(quote_list, 'Volume', np.int64))
         
-        # Calculate and assign the Chaikin Money Flow
-        # Going to use a 15 day period CMF since that is the default I've been using with Fidelity.
-        self._chaikin_money_flow = self.calc_chaikin_money_flow(15, num_trd)
+        for name in indicators: self.get_indicator(name)
+    
+    # Makes a Security from price arrays that are already in columns, e.g. the memory mapped views of the price archive
+    # (see price_archive.py), without parsing or copying them.  columns is {'date', 'open', 'high', 'low', 'close', 'adj_close', 'volume': array}
+    # sorted by date with every row a trading day.
+    @classmethod
+    def from_columns(cls, symbol = '', columns = None, indicators = ()):
+        security = cls.__new__(cls)
+        security._data = None
+        security._indicators = {}
+        security._prefix_sums = None
+        security._assign_columns(symbol, columns['date'], columns['open'], columns['high'], columns['low'], columns['close'], columns['adj_close'], columns['volume'])
+        for name in indicators: security.get_indicator(name)
+        return security
+    
+    def _assign_columns(self, symbol = '', dates = None, opens = None, highs = None, lows = None, closes = None, adj_closes = None, volumes = None):
+        self._symbol = symbol
+        self._dates = dates
+        self._opens = opens
+        self._highs = highs
+        self._lows = lows
+        self._closes = closes
+        self._adj_closes = adj_closes
+        self._volumes = volumes
+        
+        num_trd = len(closes)
+        #logging.info("This is the total number of trading days - {}".format(num_trd))  
         
         # Assign the other values - these are all for the current trading day only.
         # We are running this script after the market closes. 
-        self._current_day_close = self._trading_day_list[num_trd - 1].get_close()
-        self._current_day_volume = self._trading_day_list[num_trd - 1].get_volume()
-        self._yesterday_close = self._trading_day_list[num_trd - 2].get_close()
-        self._yesterday_volume = self._trading_day_list[num_trd - 2].get_volume()
-        self._symbol = self._trading_day_list[num_trd - 1].get_symbol()
+        self._current_day_close = float(self._closes[num_trd - 1])
+        self._current_day_volume = int(self._volumes[num_trd - 1])
+        self._yesterday_close = float(self._closes[num_trd - 2])
+        self._yesterday_volume = int(self._volumes[num_trd - 2])
+    
+    # Running sums of the closes, volumes, money flow volumes and flat days with a zero in front, built the first time they are needed.
+    # The sum over any window of trading days is then the difference of two entries, so any period and end day is O(1).
+    def _get_prefix_sums(self):
+        if self._prefix_sums is None:
+            # Money flow multiplier = [(Close - Low) - (High - Close)] / (High - Low) 
+            # Money flow volume = money flow multiplier x volume for the day
+            # There is a chance that the high and low prices will be the same which means that we might be dividing by zero here.
+            # Leave the multiplier as zero for those days and log them.  We need to check these values against reality.
+            volumes = self._volumes.astype(float)
+            ranges = self._highs - self._lows
+            flat_days = ranges == 0
+            money_flow_multiplier = np.zeros(len(ranges))
+            np.divide((self._closes - self._lows) - (self._highs - self._closes), ranges, out=money_flow_multiplier, where=~flat_days)
             
-        #print("This is the SMA10 value {}".format(self.get_10_day_sma()))    
-            #print("Stock symbol {} and date {}".format(trading_day.get_symbol(), trading_day.get_date()))
+            self._prefix_sums = {}
+            for name, values in (('close', self._closes), ('volume', volumes), ('money_flow_volume', money_flow_multiplier * volumes), ('flat_days', flat_days.astype(float))):
+                self._prefix_sums[name] = np.concatenate(([0.0], np.cumsum(values)))
+        return self._prefix_sums
+    
+    # Sum of a column over the period trading days that end with trading day num_trd_days - 1, None if there aren't that many days.
+    def _window_sum(self, name = 'close', period = 0, num_trd_days = 0):
+        if period <= 0 or num_trd_days < period or num_trd_days > self.get_num_trading_days(): return None
+        prefix_sums = self._get_prefix_sums()[name]
+        return float(prefix_sums[num_trd_days] - prefix_sums[num_trd_days - period])
+    
+    # The number of trading days up to and including end_date (a date or an ISO date string), all of them when end_date is None.
+    def _trading_days_through(self, end_date = None):
+        if end_date is None: return self.get_num_trading_days()
+        return int(np.searchsorted(self._dates, np.datetime64(end_date), side='right'))
     
     def calc_chaikin_money_flow(self, period = 0, num_trd_days = 0):
         # This isn't great because the CMF can actually be zero.
         chaikin_money_flow = 0.0
-        if period > 0:
-            # For each of the last $period days of trading we calculate the money flow multiplier and the money flow volume then we sum them and divide them.
-            # Money flow multiplier = [(Close - Low) - (High - Close)] / (High - Low) 
-            # Money flow volume = money flow multiplier x volume for the period
-            # -period- CMF = $period sum of the money flow volume / $period day sum of the volume.
-            
-            sum_of_money_flow_volume = 0.0
-            sum_of_volume = 0
-            
-            for i in range(period):
-                high = float(self._trading_day_list[num_trd_days-(i+1)].get_high())
-                low = float(self._trading_day_list[num_trd_days-(i+1)].get_low())
-                close_price = float(self._trading_day_list[num_trd_days-(i+1)].get_close())
-                volume = float(self._trading_day_list[num_trd_days-(i+1)].get_volume())
-                
-                #print("For {} trading day: High is {}, low is {}, close is {}, and volume is {}".format(self._trading_day_list[num_trd_days-(i+1)].get_date(),high,low,close_price, volume))
-                
-                # There is a chance that the high and low prices will be the same which means that we might be dividing by zero here.
-                money_flow_multiplier = 0.0
-                try:
-                    money_flow_multiplier = ((close_price - low) - (high - close_price)) / (high - low)
-                except ZeroDivisionError as zde:
-                    # Log the relevant values and leave the multiplier as zero. We need to check these values against reality.
-                    logging.warn("We got a divide by zero error. High is {}, low is {}, close is {}, and volume is {}. Your error message was: {}".format(high, low, close_price, volume, zde))
-                money_flow_volume = money_flow_multiplier * volume
-                sum_of_money_flow_volume += money_flow_volume
-                sum_of_volume += volume
-                
-            chaikin_money_flow = sum_of_money_flow_volume / sum_of_volume     
-    
+        # -period- CMF = $period sum of the money flow volume / $period day sum of the volume.
+        volume_sum = self._window_sum('volume', period, num_trd_days)
+        if volume_sum is not None and volume_sum > 0:
+            flat_day_count = int(round(self._window_sum('flat_days', period, num_trd_days)))
+            if flat_day_count > 0:
+                logging.warn("The high and low were the same on {} of the last {} trading days for {}, using a money flow multiplier of zero for those days.".format(flat_day_count, period, self.get_symbol() or 'this stock'))
+            chaikin_money_flow = self._window_sum('money_flow_volume', period, num_trd_days) / volume_sum
     
         return chaikin_money_flow
     
@@ -188,50 +167,16 @@ class Security:
         ema = 0.0
         
         if period > 0 and num_trd_days > 0:
-            # need to calculate the previous days EMA in order to return the EMA.  Need to think on how to do this.
-            # -> use the 20 day SMA for that value and do this outside the function.
             # EMA Formula is (Close - EMA(previous day)) * multiplier + EMA(previous day)
             # If there is no EMA from before then you use the SMA.
-            
-            def calc_ema(close = 0.0, previous_day_ema = 0.0):
-                multiplier = 2 / (period + 1)
-                return (close - previous_day_ema) * multiplier + previous_day_ema
-                        
+            multiplier = 2 / (period + 1)
             
             # First, calculate the SMA from the first available period based on the argument "period"
-            initial_sma = self.calc_earliest_simple_moving_average(period,num_trd_days)
-            #print("The initial_sma for your stock is {}.".format(initial_sma))
-                                  
-            
-            # Need to define a dictionary of ema's mapping date to EMA value.
-            ema_list = {}
-            ema = 0.0
-            
-            # Add the dictionary entries.
-            for k in range(period, num_trd_days):
-                # First time through just use the initial_sma, otherwise use the previous period ema
-                previous_ema = 0.0
-                #print("k is {}, the period is {}, and the number_trd_Days is {}".format(k,period,num_trd_days))
-                
-                if k == period:
-                    previous_ema = initial_sma
-                else:
-                    #print("Yesterdays close was {} and yesterdays ema was {}".format(self._trading_day_list[k-1].get_adj_close(),ema_list[str(self._trading_day_list[k-1].get_date())]))
-                    previous_ema = ema_list[str(self._trading_day_list[k-1].get_date())]
-                
-                #print("The previous day's ema is {}".format(previous_ema))
-                #print("The date I'm adding to the dict is {} and the {} day ema for that date is {}".format(str(self._trading_day_list[k].get_date()), period, calc_ema(self._trading_day_list[k].get_adj_close(),previous_ema)))
-                #print("--------------------------------")
-                ema_list[str(self._trading_day_list[k].get_date())] = calc_ema(self._trading_day_list[k].get_close(),previous_ema)
-                
-                # Store the last date to return the final EMA.
-                if k == num_trd_days-1: ema = calc_ema(self._trading_day_list[k].get_close(),previous_ema)
-                
-                
-            
-
-            #print(last_day)
-            #ema = ema_list[last_day]
+            # and then walk the EMA forward one trading day at a time.
+            if num_trd_days > period:
+                ema = self.calc_earliest_simple_moving_average(period,num_trd_days)
+                for close in self._closes[period:num_trd_days].tolist():
+                    ema = (close - ema) * multiplier + ema
             
         return ema
     
@@ -239,14 +184,10 @@ class Security:
     # that was set in the init function. It returns a float
     # if the value returned is a zero then something went wrong.
     def calc_earliest_simple_moving_average(self, period = 0, num_trd_days = 0):
-        sma_10_total = 0.0
         sma = 0.0
         if period > 0 and num_trd_days > 0:
-            
-            for i in range(period):
-                sma_10_total += self._trading_day_list[i].get_close()
-                #print("initial sma total is {}".format(sma_10_total))
-                sma = sma_10_total / period
+            close_sum = self._window_sum('close', period, period)
+            if close_sum is not None: sma = close_sum / period
         return sma    
      
     # This method will calculate the current SMA for a given period based on the trading_day_list
@@ -255,35 +196,113 @@ class Security:
     
     # Checked this against Fidelity reported SMA and they agree.
     def calc_simple_moving_average(self, period = 0, num_trd_days = 0):
-        sma_10_total = 0.0
         sma = 0.0
-        if period > 0 and num_trd_days > 0:
-            
-            for i in range(period):
-                
-                #print("i is {} and the adjusted closing price on {} is {}".format(i, self._trading_day_list[num_trd_days-(i+1)].get_date(), self._trading_day_list[num_trd_days-(i+1)].get_adj_close()))
-                
-                # Have to add 1 to i since ranges in Python are non-inclusive.
-                sma_10_total += self._trading_day_list[num_trd_days-(i+1)].get_close()
-                #print("sma total is {}".format(sma_10_total))
-                sma = sma_10_total / period
+        close_sum = self._window_sum('close', period, num_trd_days)
+        if close_sum is not None: sma = close_sum / period
         return sma
     
+    # Ad-hoc queries for any period ending on any day, e.g. for reports and backtests.  They aren't memoized like the
+    # named indicators since each one is just a couple of lookups.  end_date defaults to the last trading day and a
+    # date that isn't a trading day means the last trading day before it.  They return zero without enough history.
+    def get_sma(self, period = 10, end_date = None):
+        return self.calc_simple_moving_average(period, self._trading_days_through(end_date))
+    
+    def get_average_volume(self, period = 10, end_date = None):
+        volume_sum = self._window_sum('volume', period, self._trading_days_through(end_date))
+        if volume_sum is None: return 0.0
+        return volume_sum / period
+    
+    def get_cmf(self, period = 15, end_date = None):
+        return self.calc_chaikin_money_flow(period, self._trading_days_through(end_date))
+    
+    # Column accessors for the full price history.  These return the underlying arrays so treat them as read only.
+    def get_num_trading_days(self):
+        return len(self._closes)
+    
+    def get_dates(self):
+        return self._dates
+    
+    def get_opens(self):
+        return self._opens
+    
+    def get_highs(self):
+        return self._highs
+    
+    def get_lows(self):
+        return self._lows
+    
+    def get_closes(self):
+        return self._closes
+    
+    def get_adj_closes(self):
+        return self._adj_closes
+    
+    def get_volumes(self):
+        return self._volumes
+    
+    # Used to hand the Security the values calculated by the universe wide indicator engine, as a dictionary of name -> value.
+    def assign_indicators(self, indicator_values = None):
+        for name, value in indicator_values.items(): self._indicators[name] = float(value)
+    
+    # Returns an indicator by name ('sma10', 'ema20', 'cmf15', 'rsi14', ...), calculating it on the first call.
+    # Asking for any of the extended indicators (see extended_indicators.py) calculates all of them in one pass.
+    def get_indicator(self, name = ''):
+        if name not in self._indicators and name in EXTENDED_INDICATORS:
+            for extended_name, values in latest_extended_indicators([self]).items(): self._indicators[extended_name] = float(np.nan_to_num(values[0]))
+        elif name not in self._indicators:
+            match = INDICATOR_PATTERN.match(name)
+            if match is None: raise ValueError("Unknown indicator {}".format(name))
+            period, num_trd = int(match.group(2)), self.get_num_trading_days()
+            if match.group(1) == 'sma': self._indicators[name] = self.calc_simple_moving_average(period, num_trd)
+            elif match.group(1) == 'ema': self._indicators[name] = self.calc_exp_moving_average(period, num_trd)
+            else: self._indicators[name] = self.calc_chaikin_money_flow(period, num_trd)
+        return self._indicators[name]
+    
     def get_10_day_sma(self):
-        return self._10_day_sma
+        return self.get_indicator('sma10')
     
     def get_50_day_sma(self):
-        return self._50_day_sma
+        return self.get_indicator('sma50')
     
     def get_20_day_ema(self):
-        return self._20_day_ema
+        return self.get_indicator('ema20')
     
     def get_30_day_ema(self):
-        return self._30_day_ema
+        return self.get_indicator('ema30')
     
+    # Going to use a 15 day period CMF since that is the default I've been using with Fidelity.
     def get_chaikin_money_flow(self):
-        return self._chaikin_money_flow
+        return self.get_indicator('cmf15')
+    
+    # The extended indicators, these are zero when the stock doesn't have enough history for them.
+    def get_rsi(self):
+        return self.get_indicator('rsi14')
     
+    def get_macd(self):
+        return self.get_indicator('macd')
+    
+    def get_macd_signal(self):
+        return self.get_indicator('macd_signal')
+    
+    def get_macd_histogram(self):
+        return self.get_indicator('macd_histogram')
+    
+    def get_upper_bollinger_band(self):
+        return self.get_indicator('bollinger_upper')
+    
+    def get_middle_bollinger_band(self):
+        return self.get_indicator('bollinger_middle')
+    
+    def get_lower_bollinger_band(self):
+        return self.get_indicator('bollinger_lower')
+    
+    def get_average_true_range(self):
+        return self.get_indicator('atr14')
+    
+    def get_on_balance_volume(self):
+        return self.get_indicator('obv')
+    
+    # None unless the Security was made with keep_raw_data = True.
     def get_raw_data(self):
         return self._data
     
@@ -303,16 +322,419 @@ class Security:
         return self._symbol
         
 
+def open_quote_fetcher(environment = 'DEV'):
+    # Yahoo has a limit of 2000 requests per hour. In PROD we run through the entire stock list so we rate limit the requests, 
+    # but we let several of them be in flight at once instead of waiting on each one in turn.
+    # Both can be overridden with the FETCH_CONCURRENCY and FETCH_RATE (requests per second) environment variables.
+    if environment == 'PROD': default_fetch_rate = 0.5
+    else: default_fetch_rate = 0.0
+    # Symbols that need the same days are requested together in batches of FETCH_BATCH_SIZE.
+    quote_source = YahooYQLSource(int(os.getenv('FETCH_BATCH_SIZE', 20)))
+    return QuoteFetcher(quote_source, int(os.getenv('FETCH_CONCURRENCY', 8)), float(os.getenv('FETCH_RATE', default_fetch_rate)))
+
+
+# Calendar days of prices to load for the screens' lookback in trading days, never less than the 300 we have always used.
+def history_calendar_days(lookback = 0):
+    return max(300, int(lookback * 1.5))
+
+
+# Screens one shard of the universe: fetches the prices, calculates the indicators, saves the trends
+# and returns a ScreenResult for the results page.  It runs in the worker processes when the run is sharded,
+# shard_label is the machine shard's and worker_label the worker process's ('i-of-n').
+def screen_stocks(the_stocks = (), securities_to_add = (), start_date = None, end_date = None, environment = 'DEV', shard_label = '', log_file_name = '', resume = False, screens_file = DEFAULT_SCREENS_FILE, worker_label = ''):
+
+    # A worker process starts without the run's logging set up.
+    if len(log_file_name) > 0: logging.basicConfig(filename=log_file_name,level=logging.INFO)
+    
+    today_date_string = str(end_date)
+    
+    # The trend and signal rules are compiled once here, every stock is then screened with a few array operations per rule.
+    screens = load_screens(screens_file)
+    min_trading_days = max(50, screens.get_lookback())
+    
+    # Finished stocks are checkpointed to a journal (one per day and shard) every JOURNAL_CHECKPOINT_EVERY stocks.
+    # When resuming, the stocks in the journal are skipped and their results are replayed from it.
+    run_label = '.'.join(x for x in (shard_label, worker_label) if len(x) > 0)
+    journal_name = "screener_journal_{}.jsonl".format('.'.join(x for x in (today_date_string, run_label) if len(x) > 0))
+    journal = RunJournal(os.path.join(os.getenv('JOURNAL_DIR', '.'), journal_name), resume, int(os.getenv('JOURNAL_CHECKPOINT_EVERY', 250)))
+    the_stocks = [k for k in the_stocks if not journal.is_complete(k)]
+    
+    # The notifications, trend counts and error counts of this shard.
+    result = journal.replay(run_label)
+    
+    # DynamoDB in PROD, a local SQLite file in DEV unless TREND_STORE says otherwise.
+    # Anything a resumed run saved before it died is saved again in case it never made it to the db.
+    trend_store = open_trend_store(environment, write_behind=True)
+    trend_store.write_trends(*journal.get_trend_items())
+    
+    # Trend changes wait in the journal until the next checkpoint and then go to the trend store's queue.
+    # The negative cache is saved along with it so a resumed run doesn't lose the failures of the stocks it skips.
+    def checkpoint():
+        trend_store.write_trends(*journal.checkpoint(result))
+        negative_cache.save()
+    
+    # We only ask Yahoo for the days that aren't in our local price cache.
+    price_cache = PriceCache(os.getenv('PRICE_CACHE_DIR', 'price_cache'))
+
+    # The result only keeps a small NotifiedStock record, not the Security.  A stock notified twice in a run
+    # (a signal and a new trend) keeps the last one, as it always has.
+    def tally_notification(stock = None, trend_type = ''):
+        result.add_notification(NotifiedStock.from_security(stock, trend_type))
+    
+    # The save helpers hand the rows that changed to the journal, at each checkpoint they go to the 
+    # trend store's write behind queue and are written to the db in batches in the background while we keep screening.
+    def save_signal(symbol = '', trend_type = ''):
+        return_code = 1
+        
+        if(len(symbol) > 0):
+            # We only save the history of signals, there is not "current" signal so we don't save to the Current_Trend table.
+            journal.add_trend_items([], [{
+                  'stock_symbol': symbol,
+                  'occurence_date': today_date_string,
+                  'trend_type': trend_type
+            }])
+            return_code = 0
+        return return_code     
+    
+    
+    def save_up_trend(symbol = '', new = False):
+        return_code = 1
+        
+        if(len(symbol) > 0):
+            current_trend_item = {
+                  'stock_symbol': symbol,
+                  'up_trend': True,
+                  'down_trend': False,
+                  'trend_start_date': today_date_string 
+            }
+            trend_history_item_list = []
+            
+            # If the trend is new, we also update the trend_history table with an entry of trend. Occurrence 
+            if new: 
+                trend_history_item_list.append({
+                      'stock_symbol': symbol,
+                      'occurence_date': today_date_string,
+                      'trend_type': 'up'
+                })
+            journal.add_trend_items([current_trend_item], trend_history_item_list)
+            return_code = 0
+        return return_code 
+ 
+    def save_down_trend(symbol = '', new = False):
+        return_code = 1
+        
+        if(len(symbol) > 0):
+            current_trend_item = {
+                  'stock_symbol': symbol,
+                  'up_trend': False,
+                  'down_trend': True,
+                  'trend_start_date': today_date_string 
+            }
+            trend_history_item_list = []
+            
+            if new: 
+                trend_history_item_list.append({
+                      'stock_symbol': symbol,
+                      'occurence_date': today_date_string,
+                      'trend_type': 'down'
+                })
+            journal.add_trend_items([current_trend_item], trend_history_item_list)
+            return_code = 0
+        return return_code 
+    
+        
+    
+    fetcher = open_quote_fetcher(environment)
+    
+    # Work out the days each stock is missing from the price cache.  
+    # Stocks that are already fully cached (e.g. re-runs for a past date) don't need a request at all.
+    symbol_ranges = []
+    fetch_ranges = {}
+    cached_stocks = []
+    # Symbols that keep coming back empty are skipped for a while instead of being requested every night.
+    # Every machine shard keeps its own negative cache for the same reason it keeps its own indicator state.
+    negative_cache = NegativeCache.from_environment(shard_label, worker_label)
+    today = datetime.date.today()
+    for k in the_stocks:
+        missing_range = price_cache.get_missing_range(k, start_date, end_date)
+        if missing_range is None: cached_stocks.append((k, None))
+        elif negative_cache.should_skip(k, today): result.add_skipped_stock(k)
+        else:
+            fetch_ranges[k] = missing_range
+            symbol_ranges.append((k, missing_range[0], missing_range[1]))
+    
+    logging.info("{} stocks are fully cached, {} stocks need to be requested from Yahoo and {} stocks that have no data are skipped.".format(len(cached_stocks), len(symbol_ranges), len(result.get_skipped_stocks())))
+    
+    # Generally speaking, I am going to log errors and then move on.  Yahoo will likely act a bit differently over time with new stocks, etc.
+    def record_error(k = '', e = None):
+        if isinstance(e, TypeError): 
+            error_count = result.add_error('Type Error')
+            logging.warn("Came back with a TypeError from Yahoo Finance. We have {} of this type error. The error was: {}".format(str(error_count), e))    # This is the error that is thrown if the query to Yahoo comes back with nothing.  Sometimes it happens with a bad stock symbol.
+        elif isinstance(e, IndexError): 
+            result.add_error('Index Error')
+            logging.warn("Somehow we got a stock through that didn't have enough entries. We have {} of this type error. The error was: {}".format(str(result.get_error_counter()['Type Error']), e))
+        elif isinstance(e, ConnectionError): 
+            error_count = result.add_error('Connection Error')
+            logging.warn("We encountered an error connecting to Yahoo Finance. We have {} of this type error. The error was: {}".format(str(error_count), e))
+        else: 
+            error_count = result.add_error('Other Error')
+            logging.exception("Had an issue processing {}. The current uncategorized error count is {}".format(k, str(error_count))) # We keep going since sometimes Yahoo craps out on us. MIGHT WANT TO ADD AN ERROR COUNTER AND EXIT THE SCRIPT IF WE HIT A THRESHOLD.
+    
+    # The stocks that have enough history to analyze.
+    securities = []
+    
+    # Stocks whose requests failed even after the fetch client's retries.  They get one more try at the end of the 
+    # fetch phase (the upstream may have recovered by then) and anything still missing is listed in the results page.
+    retry_ranges = []
+    
+    def load_stock(k = '', pending_response = None, final_attempt = False):
+        logging.debug("-----------------Starting work on stock symbol {} at {}.------------------------".format(k, datetime.datetime.today()))
+        
+        try:        
+            if pending_response is not None:
+                new_quotes = pending_response.result()
+                logging.debug("The query for {} covering {} to {} worked.".format(k, fetch_ranges[k][0], fetch_ranges[k][1]))
+                
+                # An empty response for the newest few days just means there was no trading (weekend, holiday).
+                # If we don't have anything cached for the stock then it is the same as Yahoo not knowing the symbol,
+                # and only that counts against the symbol in the negative cache.
+                if new_quotes is None and price_cache.get_last_cached_date(k) is None:
+                    negative_cache.record_failure(k, "Yahoo returned no results", today)
+                    raise TypeError("Yahoo returned no results for {}".format(k))
+                
+                price_cache.add_quotes(k, new_quotes, fetch_ranges[k][0])
+            
+            # The Security is always built from the merged cached series.
+            quote_list = price_cache.get_quotes(k, start_date, end_date)
+            price_cache.release(k)
+            if pending_response is not None: negative_cache.record_success(k)
+            
+            # This is a bit arbitrary but we want at least 50 days of trading in a stock to be available before we start tracking trends,
+            # or more if the screens use longer indicators.
+            # The indicators are calculated for the whole universe at once below so we don't calculate them as we build the Security.
+            if len(quote_list) >= min_trading_days: 
+                securities.append(Security(quote_list))
+                return
+            else: logging.debug("This stock has not been traded long enough to do analysis on it.")
+        except Exception as e: 
+            # The batch request failed or its response couldn't be split (e.g. a KeyError or ValueError for the whole batch).
+            # That says nothing about the symbol, so it gets one more try at the end and is listed in the results page if that fails too.
+            if pending_response is not None and pending_response.is_batch_error():
+                if not final_attempt:
+                    retry_ranges.append((k, fetch_ranges[k][0], fetch_ranges[k][1]))
+                    return
+                result.add_unfetched_stock(k)
+            record_error(k, e)
+        finally: logging.debug("-----------------End work on stock symbol {} at {}.------------------------".format(k, datetime.datetime.today()))
+        
+        # Nothing more to do for this stock, the ones we have prices for are finished after the trend checks.
+        if journal.mark_complete(k): checkpoint()
+    
+    # Now loop through the stocks as their responses come back and build up the list of securities.
+    for k, pending_response in itertools.chain(cached_stocks, fetcher.fetch_all(symbol_ranges)): load_stock(k, pending_response)
+    
+    if len(retry_ranges) > 0:
+        logging.warn("Retrying {} stocks whose requests failed.".format(len(retry_ranges)))
+        for k, pending_response in fetcher.fetch_all(retry_ranges): load_stock(k, pending_response, True)
+    negative_cache.save()
+    
+    # Advance the indicators saved from the last run by the new trading days, anything that can't be advanced 
+    # (new stocks, gaps, revised data) is calculated for all of those stocks in one pass.
+    # Then make the trend determinations on the result arrays.
+    # Every machine shard keeps its own state file since the shards run at the same time, a symbol always lands in the same shard.
+    # The worker processes of a shard share its file whatever their number, see state_files.py.
+    # Only the indicators the screens use are worked out for the whole universe.  The CMF in the results page
+    # is calculated by the Security when a stock is notified, most stocks never need it.
+    indicator_state_store = IndicatorStateStore.from_environment(shard_label, worker_label)
+    indicators = indicator_state_store.update(securities, [name for name in screens.get_indicators() if name in UNIVERSE_INDICATORS])
+    indicator_state_store.save()
+    logging.info("Calculated indicators for {} stocks at {}.".format(len(securities), datetime.datetime.today()))
+    
+    # The indicators the screens use, the ones the indicator state has are reused and anything else
+    # (e.g. a screen on the 100 day SMA) is calculated for the whole universe in one pass.
+    indicator_values = latest_indicator_values(screens.get_indicators(), securities, indicators.get_values())
+    security_indicators = [name for name in indicator_values if INDICATOR_PATTERN.match(name) is not None]
+    
+    # Check for up-trend and down-trend
+    up_signals = screens.get_trend('up').evaluate(indicator_values)
+    down_signals = screens.get_trend('down').evaluate(indicator_values)
+    
+    # Check for the signals, e.g. heavy volume reversal.
+    screen_signals = [(screen.get_name(), screen.evaluate(indicator_values)) for screen in screens.get_signals()]
+    
+    # Load every current trend once, the new/existing decisions below are made against this dictionary.
+    current_trends = trend_store.load_current_trends()
+    
+    for i, my_stock in enumerate(securities):
+        k = my_stock.get_symbol()
+        
+        # Hand the Security the indicators we already have so it doesn't calculate them again if they are asked for.
+        my_stock.assign_indicators({name: indicator_values[name][i] for name in security_indicators})
+        
+        try:
+            # Process our trend signals.              
+            for trend_type, signal_matches in screen_signals:
+                if signal_matches[i]:
+                    logging.debug("We have a {} signal for {}".format(trend_type, k))
+                    if save_signal(k, trend_type) == 0: tally_notification(my_stock, trend_type)
+                    else: logging.warn("We were unable to save the {} trend for {}".format(trend_type, k))
+            
+            if up_signals[i]: 
+                result.add_up_trend()
+                logging.debug("We have a up-trend signal from {}".format(k))
+                # Check if the stock has a stored up-trend.  If so, then ignore. 
+                # If the stock isn't in the current trends then the symbol was not previously saved.
+                
+                stored_trend = current_trends.get(k)
+                if stored_trend is None:
+                    # Save the trend to the db.
+                    logging.info("Saving trend to the db")
+                    if save_up_trend(k, True) == 0: tally_notification(my_stock, 'up')
+                    else: logging.warn("We were unable to save the up-trend for {}".format(k))
+                    
+                else:
+                    # Check if the stock is already on an uptrend, if it is, then just move on.  
+                    # If it isn't, then update the entry to indicate up-trend = True, and down-trend = False.
+                    # 'Item': {'trend_start_date': '2016-07-06', 'up-trend': False, 'stock_symbol': 'AMD', 'down-trend': True}}
+                    #trend_info = 
+                    if stored_trend['up_trend'] == True: 
+                        logging.debug("We already know about the up-trend for {}".format(k)) # We are literally passing here, we already know about the up-trend.
+                        # If it is an index, we still notify, right at the top but we set the trend to "existing" in the notification_dict.  We leave the trend valid in the db, this is just for notification purposes.
+                        if k in securities_to_add: tally_notification(my_stock, 'existing-up')
+                    elif stored_trend['up_trend'] == False:
+                        # Updating trend in the database.
+                        if save_up_trend(k, True) == 0: tally_notification(my_stock, 'up') 
+                        else: logging.warn("We were unable to save the new up-trend for {}".format(k)) # Should probably change this to the method call raising an exception and catch it here.
+            elif down_signals[i]: 
+                result.add_down_trend()
+                logging.debug("We have a down-trend signal from {}".format(k))
+                # When a down-trend occurs we check if the stock has a stored down-trend. 
+                # If so, we ignore, if not, then update the down-trend bit to true, update the up-trend bit to false, insert the date, then notify.
+                stored_trend = current_trends.get(k)
+                if stored_trend is None:
+                    # Save the trend to the db as this is a either a new signal or a new stock.
+                    logging.debug("Saving new trend to the db")
+                    if save_down_trend(k, True) == 0: tally_notification(my_stock, 'down') 
+                    else: logging.warn("We were unable to save the down-trend for {}".format(k))
+                    
+                else:
+                    # Check if the stock is already on a downtrend, if it is, then just move on.  
+                    # If it isn't, then update the entry to indicate down_trend = True, and up-trend = False.
+                    # 'Item': {'trend_start_date': '2016-07-06', 'up-trend': False, 'stock_symbol': 'AMD', 'down-trend': True}}
+                    if stored_trend['down_trend'] == True: 
+                        logging.debug("We already know about the down-trend for {}".format(k)) # We are literally passing here, we already know about the down-trend.
+                        # If it is an index, we still notify, right at the top but we set the trend to "existing" in the notification_dict.  We leave the trend valid in the db, this is just for notification purposes.
+                        if k in securities_to_add: tally_notification(my_stock, 'existing-down')
+                    elif stored_trend['down_trend'] == False:
+                        # Updating trend in the database.
+                        if save_down_trend(k, False) == 0: tally_notification(my_stock, 'down')
+                        else: logging.warn("We were unable to save the new down-trend for {}".format(k))        
+            else:
+                logging.debug("No trend detected for {} which means the SMA and EMA are equal".format(k))
+            
+            
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug("Current 10 day SMA is {}, current 20 day EMA is {}, and current 30 day EMA is {}".format(round(my_stock.get_10_day_sma(), 2), round(my_stock.get_20_day_ema(), 2),round(my_stock.get_30_day_ema(), 2)))
+        except Exception as e: record_error(k, e)
+        
+        # Let go of the stock's price history now, anything the results page needs is in its NotifiedStock.
+        securities[i] = None
+        my_stock = None
+        
+        if journal.mark_complete(k): checkpoint()
+    
+    
+    # Wait for the write behind queue to finish saving everything that changed.
+    checkpoint()
+    journal.close()
+    try:
+        trend_store.close()
+    except:
+        logging.exception("Ran into an issue saving the trends to the db.")
+    
+    logging.info("Screened {} stocks for shard {} at {}.".format(len(the_stocks), run_label or 'all', datetime.datetime.today()))
+    return result
+
+
+# Rebuilds the Trend_History entries for every trading day from range_start to range_end.
+# Each stock's history is loaded once and the signals for all of the days are calculated as whole series,
+# with the same screens and minimum days as the nightly run, then the entries are written to the db in bulk.
+# include_disabled also backfills the screens that are switched off with enabled = no.
+# The moving averages are seeded 300 days before range_start instead of 300 days before each day so the EMAs 
+# can differ from the nightly run's in the last decimals.  Current_Trend is left to the nightly run.
+# Returns the number of Trend_History entries written.
+def backfill_stocks(the_stocks = (), range_start = None, range_end = None, environment = 'DEV', include_disabled = False, log_file_name = '', screens_file = DEFAULT_SCREENS_FILE):
+    
+    if len(log_file_name) > 0: logging.basicConfig(filename=log_file_name,level=logging.INFO)
+    
+    screens = load_screens(screens_file)
+    min_trading_days = max(50, screens.get_lookback(include_disabled))
+    start_date = range_start - datetime.timedelta(days=history_calendar_days(screens.get_lookback(include_disabled)))
+    price_cache = PriceCache(os.getenv('PRICE_CACHE_DIR', 'price_cache'))
+    fetcher = open_quote_fetcher(environment)
+    
+    fetch_ranges = {}
+    for k in the_stocks:
+        missing_range = price_cache.get_missing_range(k, start_date, range_end)
+        if missing_range is not None: fetch_ranges[k] = missing_range
+    
+    for k, pending_response in fetcher.fetch_all((k, r[0], r[1]) for k, r in fetch_ranges.items()):
+        try:
+            price_cache.add_quotes(k, pending_response.result(), fetch_ranges[k][0])
+        except Exception as e: logging.warn("Could not get the prices for {}, it is left out of the backfill. The error was: {}".format(k, e))
+    
+    securities = []
+    for k in the_stocks:
+        quote_list = price_cache.get_quotes(k, start_date, range_end)
+        price_cache.release(k)
+        if len(quote_list) >= min_trading_days: securities.append(Security(quote_list))
+    
+    logging.info("Backfilling {} to {} for {} stocks at {}.".format(range_start, range_end, len(securities), datetime.datetime.today()))
+    
+    # One row per stock, right aligned on each stock's last trading day, with the date of every column.
+    closes, highs, lows, volumes, lengths = build_price_matrices(securities)
+    dates = build_date_matrix(securities)
+    in_range = (dates >= np.datetime64(range_start)) & (dates <= np.datetime64(range_end))
+    
+    # There is one entry per stock per day, a later signal replaces an earlier one the same way it does in the nightly run.
+    trend_history_items = {}
+    for trend_type, days in SignalSeries(closes, volumes, lengths, highs, lows, min_trading_days).screen_days(screens, include_disabled):
+        for i, j in zip(*np.nonzero(days & in_range)):
+            trend_history_items[(securities[i].get_symbol(), str(dates[i, j]))] = trend_type
+    
+    trend_store = open_trend_store(environment)
+    trend_store.write_trends([], [{ 'stock_symbol': symbol, 'occurence_date': occurence_date, 'trend_type': trend_type } for (symbol, occurence_date), trend_type in trend_history_items.items()])
+    trend_store.close()
+    
+    logging.info("Wrote {} Trend_History entries for {} to {} at {}.".format(len(trend_history_items), range_start, range_end, datetime.datetime.today()))
+    return len(trend_history_items)
+
+
 def main():
 
     # Grab what environment we will be working in from the 'ENV' environment variable.  Either DEV or PROD.
     environment = os.getenv('ENV', 'DEV')
 
-    # Set an error counter to track the number of errors by error type:
-    error_counter = { 'Connection Error' : 0, 'Type Error' : 0, 'Index Error' : 0, 'Other Error' : 0 }
+    # The universe can be screened by several worker processes and/or split across machines.
+    #   --workers N     screens this machine's stocks in N processes (default SCREEN_WORKERS or 1).
+    #   --shard I/N     screens shard I of N and saves the shard's results instead of writing the results page.
+    #   --merge N       writes the results page from the saved results of shards 0 to N-1.
+    #   --resume        picks up a run that died part way through from its journal, use the same --workers and --shard as the run that died.
+    #   --backfill-from D   rebuilds the Trend_History entries from D (dd-mm-yyyy) to the end date instead of screening one day.
+    #   --all-screens   also backfills the screens that are switched off in the screens file, e.g. the heavy volume up-swing.
+    parser = argparse.ArgumentParser(description="Screens the stock universe for trends and writes the results page.")
+    parser.add_argument('end_date', nargs='?', help="Trading day to screen as dd-mm-yyyy, defaults to yesterday.")
+    parser.add_argument('--workers', type=int, default=int(os.getenv('SCREEN_WORKERS', 1)))
+    parser.add_argument('--shard', default='0/1')
+    parser.add_argument('--merge', type=int, default=0)
+    parser.add_argument('--resume', action='store_true')
+    parser.add_argument('--backfill-from', default=None)
+    parser.add_argument('--all-screens', action='store_true')
+    args = parser.parse_args()
+    
+    shard_index, shard_count = (int(x) for x in args.shard.split('/'))
+    if not 0 <= shard_index < shard_count: parser.error("--shard must be INDEX/COUNT with 0 <= INDEX < COUNT")
     
-    up_trend_count = 0
-    down_trend_count = 0
     # Set the dates to be used throughout the script.
     
     # If there is an argument passed in then the date passed in will be used, otherwise, just go back a day.
@@ -320,36 +742,30 @@ def main():
     # Since we are running this at night on AWS and their system clocks are at UTC we can also subtract a day from those times.  That works for both scenarios.
     end_date = datetime.date.today() - datetime.timedelta(days=1)
     
-    # Go back 300 calendar days which should give us around 204 trading days.
-    # We do this because our EMA needs the previous EMA to calculate.  Instead we use the SMA so we're going back relatively far to smooth out any differences.
-    start_date = end_date - datetime.timedelta(days=300)
-    num_args = len(sys.argv)
-    
     # However...  If a command line argument is passed in then we parse that out and use that as the end date for analysis.  This allows us to run analysis from the past to do catch-up, etc, without having to modify the script.
-    if num_args == 2: # Then the date was passed in
+    if args.end_date is not None: # Then the date was passed in
         
-        date_pieces = sys.argv[1].split('-')
+        date_pieces = args.end_date.split('-')
         end_date = datetime.date(int(date_pieces[2]),int(date_pieces[1]),int(date_pieces[0]))
-        logging.info("The following date was passed in, we will use this as our end_date: {}".format(end_date))
     
     today_date_string = str(end_date) 
     
     log_file_name = ".".join(("_".join(("screener", today_date_string)),"log"))
     
-    # Set the logging level.
+    # Set the logging level.  This has to come before anything is logged, the first logging call otherwise sets up logging to stderr and the log file is never written.
     logging.basicConfig(filename=log_file_name,level=logging.INFO)
     
+    if args.end_date is not None: logging.info("The following date was passed in, we will use this as our end_date: {}".format(end_date))
     logging.info("Starting processing for the {} trading day at {}.".format(end_date, datetime.datetime.today()))
     
-    historical_data_url = 'https://query.yahooapis.com/v1/public/yql?q=select%20*%20from%20yahoo.finance.historicaldata%20where%20symbol%20%3D%20%22###%22%20and%20startDate%20%3D%20%22SSSS%22%20and%20endDate%20%3D%20%22EEEE%22&format=json&diagnostics=true&env=store%3A%2F%2Fdatatables.org%2Falltableswithkeys&callback='    
+    # The trend and signal rules come from the screens file (SCREENS_FILE), the workers compile their own copy.
+    screens_file = os.getenv('SCREENS_FILE', DEFAULT_SCREENS_FILE)
+    screens = load_screens(screens_file)
     
-    historical_data_url = historical_data_url.replace('SSSS', str(start_date))
-    historical_data_url = historical_data_url.replace("EEEE", str(end_date))
-
-    notification_dict = {}
-
-    def tally_notification(stock = None, trend_type = ''):
-        notification_dict[stock] = trend_type
+    # Go back 300 calendar days which should give us around 204 trading days, further if the screens need it.
+    # We do this because our EMA needs the previous EMA to calculate.  Instead we use the SMA so we're going back relatively far to smooth out any differences.
+    # This has to happen after the end date is parsed, otherwise catch-up runs ask Yahoo for a start date after their end date.
+    start_date = end_date - datetime.timedelta(days=history_calendar_days(screens.get_lookback()))
     
     def make_color(s = '', color=''):
         if len(s) > 0 and len(color) > 0:
@@ -366,322 +782,107 @@ def main():
         return s
 
 
-    def save_heavy_volume_reversal(symbol = ''):
-        return_code = 1
-        
-        if(len(symbol) > 0):
-            try:
-                
-                # We only save the history of signals, there is not "current" signal so we don't save to the Current_Trend table.
-                trend_history_table.put_item(
-                    Item={
-                          'stock_symbol': symbol,
-                          'occurence_date': today_date_string,
-                          'trend_type': 'heavy volume reversal'
-                    }
-                )                
-    
-                return_code = 0
-            except: 
-                return_code = 2
-                logging.exception("Ran into an issue saving your heavy volume reversal signal.")
-        return return_code     
-    
-    def save_heavy_volume_upswing(symbol = ''):
-        return_code = 1
-        
-        if(len(symbol) > 0):
-            try:
-                # We only save the history of signals, there is not "current" signal so we don't save to the Current_Trend table.
-                trend_history_table.put_item(
-                    Item={
-                          'stock_symbol': symbol,
-                          'occurence_date': today_date_string,
-                          'trend_type': 'heavy volume up-swing'
-                    }
-                )                
-    
-                return_code = 0
-            except: 
-                return_code = 2
-                logging.exception("Ran into an issue saving your heavy volume up-swing signal.")
-        return return_code    
+    # Going to add the following indexes to the stock list and report them first in the results file.
+    securities_to_add = ["SPY", "QQQ", "XLE"]
     
+    # Saved shard results live in SHARD_RESULTS_DIR, in PROD they are also passed between machines through S3.
+    shard_results_dir = os.getenv('SHARD_RESULTS_DIR', '.')
+    def shard_results_file_name(index = 0, count = 1):
+        return "shard_results_{}.{}-of-{}.json".format(today_date_string, index, count)
     
-    def save_up_trend(symbol = '', new = False):
-        return_code = 1
-        
-        if(len(symbol) > 0):
+    if args.merge > 0:
+        # Coordinator for a run split across machines, all of the screening has already been done by the shards.
+        result = ScreenResult()
+        for index in range(args.merge):
+            name = shard_results_file_name(index, args.merge)
             try:
-                current_trend_table.put_item(
-                    Item={
-                          'stock_symbol': symbol,
-                          'up_trend': True,
-                          'down_trend': False,
-                          'trend_start_date': today_date_string 
-                    }
-                )
-                
-                # If the trend is new, we also update the trend_history table with an entry of trend. Occurrence 
-                if new: 
-                    trend_history_table.put_item(
-                        Item={
-                              'stock_symbol': symbol,
-                              'occurence_date': today_date_string,
-                              'trend_type': 'up'
-                        }
-                    )                
-                
-                
-                return_code = 0
-            except: 
-                return_code = 2
-                logging.exception("Ran into an issue saving your up trend.")
-        return return_code 
- 
-    def save_down_trend(symbol = '', new = False):
-        return_code = 1
-        
-        try:
-            if(len(symbol) > 0):
-                current_trend_table.put_item(
-                    Item={
-                          'stock_symbol': symbol,
-                          'up_trend': False,
-                          'down_trend': True,
-                          'trend_start_date': today_date_string 
-                    }
-                )
-                
-                if new: 
-                    trend_history_table.put_item(
-                        Item={
-                              'stock_symbol': symbol,
-                              'occurence_date': today_date_string,
-                              'trend_type': 'down'
-                        }
-                    ) 
-                
-                return_code = 0
-        except: 
-            return_code = 2
-            logging.exception("Ran into an issue saving your down trend.")
-        return return_code 
-    
-        
+                if environment == 'PROD': boto3.resource('s3').Object('rodell-screener-output', name).download_file(os.path.join(shard_results_dir, name))
+                result.merge(ScreenResult.load(os.path.join(shard_results_dir, name)))
+            except:
+                logging.exception("Had an issue loading the results of shard {}.".format(name))
+                exit() # A page missing a shard would look like a quiet day for those stocks.
+        logging.info("Merged the results of {} shards.".format(args.merge))
+    else:
+        # This list of stocks we will iterate through to select historical data from Yahoo finance.
+        # This list -MUST- have at least two stocks in it in order for this script to work.
     
-    # This list of stocks we will iterate through to select historical data from Yahoo finance.
-    # This list -MUST- have at least two stocks in it in order for this script to work.
-    
-    # Pull the stock lists from S3.
-    the_stocks = [] 
+        # Pull the stock lists from S3.
+        the_stocks = [] 
        
-    if environment == 'PROD':
-        try:
-            input_file_list = ('NASDAQ.csv', 'NYSE.csv')
-            s3_inputs = boto3.resource('s3')
-            for name in input_file_list:
-                s3_inputs.Object('rodell-screener-input', name).download_file(name)
-                logging.info("Saved {} locally for processing.".format(name))
-                # Need to catch a file not found exception here.
-                company_list = open(name)
+        if environment == 'PROD':
+            try:
+                # The company lists come from the rodell-screener-input bucket unless INPUT_BUCKET or INPUT_DIR say otherwise,
+                # and are only downloaded again when they have changed (see input_loader.py).
+                input_file_list = ('NASDAQ.csv', 'NYSE.csv')
                 
-                for line in company_list:
-                    # Skip the first line since it's the column headers and filter out any strange symbols that we don't want to look at.
-                    if(line.find("Symbol") != -1 or line.find("n/a") != -1): pass
-                    else:
-                        stock_symbol_list = line.split(',')
-                        the_stocks.append(stock_symbol_list[0].strip('"')) 
-
-                logging.info("Added stocks from {} for processing.".format(name))
-        except: 
-            logging.exception("Had an issue downloading your input files from S3.")
-            exit() # If we can't get our inputs then we can't proceed.
-    else: the_stocks = ["AMD", "HSTM", "GRPN", "EBAY", "MET", "NVDA", "TWTR", "MSFT", "NFLX", "AAPL", "C", "ANTH", "APOL","RCII","TROW","DVAX","BMRN","LLTC","PRGX","ASML","MFRI","TTGT","CELG","VNOM","TITN","ININ","XENE","ILMN"]
- 
-    # Going to add the following indexes to the stock list and report them first in the results file.
-    securities_to_add = ["SPY", "QQQ", "XLE"]
-    for x in securities_to_add: the_stocks.append(x)
+                # Filter out any strange symbols that we don't want to look at, and the ones the
+                # UNIVERSE_* price and market cap limits rule out before we request any prices for them.
+                the_stocks = load_universe(input_file_list, UniverseFilter.from_environment(), True, InputLoader.from_environment('rodell-screener-input'))
+            except: 
+                logging.exception("Had an issue downloading your input files from S3.")
+                exit() # If we can't get our inputs then we can't proceed.
+        else: the_stocks = ["AMD", "HSTM", "GRPN", "EBAY", "MET", "NVDA", "TWTR", "MSFT", "NFLX", "AAPL", "C", "ANTH", "APOL","RCII","TROW","DVAX","BMRN","LLTC","PRGX","ASML","MFRI","TTGT","CELG","VNOM","TITN","ININ","XENE","ILMN"]
  
-    logging.info("We are processing {} stocks today.".format(len(the_stocks)))
+        for x in securities_to_add:
+            if x not in the_stocks: the_stocks.append(x)
         
-    # Now loop through the stocks and do your work.
-    for k in the_stocks:
-        
-        logging.debug("-----------------Starting work on stock symbol {} at {}.------------------------".format(k, datetime.datetime.today()))
-        # Generate the YQL string.
-        specific_query = historical_data_url.replace("###",k)
+        # Each machine screens its own shard and splits that between its worker processes.
+        the_stocks = shard_symbols(the_stocks, shard_index, shard_count)
+        workers = max(args.workers, 1)
+        worker_stocks = [shard_symbols(the_stocks, i, workers, shard_count) for i in range(workers)]
         
-        #print(specific_query)
-        # I could embed the following in a long one line assignment but I'll never remember what I did later so I'm breaking them out.       
+        logging.info("We are processing {} stocks today in {} worker processes.".format(len(the_stocks), workers))
         
-        # Generally speaking, I am going to log errors and then move on.  Yahoo will likely act a bit differently over time with new stocks, etc.
-        try:        
-            hist_resp = requests.get(specific_query)
-            
-            if hist_resp.status_code != 200:
-                # This means something went wrong.
-                # I should raise a custom exception for this.
-                logging.warn("You didn't receive a 200 code from Yahoo, you received a {}.".format(hist_resp.status_code))
-                logging.warn("The specific query string that you received an error for was: {}".format(specific_query))
-            else: logging.debug("The query that worked was: {}".format(specific_query))
-                        
-            bulk_response = hist_resp.json()['query']
+        # A backfill rebuilds the signal history for a range of days, there is no results page for it.
+        if args.backfill_from is not None:
+            date_pieces = args.backfill_from.split('-')
+            backfill_start = datetime.date(int(date_pieces[2]),int(date_pieces[1]),int(date_pieces[0]))
             
-            results_dict = bulk_response['results']
+            if workers == 1: entry_count = backfill_stocks(the_stocks, backfill_start, end_date, environment, args.all_screens, '', screens_file)
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    pending = [executor.submit(backfill_stocks, worker_stocks[i], backfill_start, end_date, environment, args.all_screens, log_file_name, screens_file) for i in range(workers)]
+                    entry_count = sum(future.result() for future in pending)
             
-            quote_list = results_dict['quote']
-            
-
-            # This is a bit arbitrary but we want at least 50 days of trading in a stock to be available before we start tracking trends.
-            if len(quote_list) >= 50:       
+            logging.info("Backfilled {} Trend_History entries from {} to {}.".format(entry_count, backfill_start, end_date))
+            logging.info("All Done at {}.".format(datetime.datetime.today()))
+            return
+        
+        # The machine label keeps the shards' state files apart, a plain single machine run keeps the usual files.
+        machine_label = ''
+        if shard_count > 1: machine_label = "{}-of-{}".format(shard_index, shard_count)
+        
+        if workers == 1: result = screen_stocks(the_stocks, securities_to_add, start_date, end_date, environment, machine_label, '', args.resume, screens_file)
+        else:
+            result = ScreenResult(machine_label)
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                pending = [executor.submit(screen_stocks, worker_stocks[i], securities_to_add, start_date, end_date, environment, machine_label, log_file_name, args.resume, screens_file, "{}-of-{}".format(i, workers)) for i in range(workers)]
+                for future in pending: result.merge(future.result())
             
-                my_stock = Security(quote_list)
-                up_signal_generated = False
-                down_signal_generated = False
-                #fifty_day_breach_up = False
-                #fifty_day_breach_down = False
-                heavy_volume_reversal_signal = False
-                #heavy_volume_upswing_signal = False
-                
-                # set the values for trend determination.
-                ten_day_sma = my_stock.get_10_day_sma()
-                #fifty_day_sma = my_stock.get_50_day_sma()
-                twenty_day_ema = my_stock.get_20_day_ema()
-                thirty_day_ema = my_stock.get_30_day_ema()
-                # Haven't integrated the sorting on CMF into the criteria yet so we're just listing it in the results file.
-                #chaikin_money_flow = my_stock.get_chaikin_money_flow()
-                
-                # Check for up-trend
-                if ten_day_sma > twenty_day_ema or ten_day_sma > thirty_day_ema: up_signal_generated = True
-                
-                # Check for down-trend
-                if ten_day_sma < twenty_day_ema or ten_day_sma < thirty_day_ema: down_signal_generated = True
-                
-                # Check for 50 day breach upwards
-                #if fifty_day_sma > my_stock.get_close(): fifty_day_breach_up = True
-                
-                # Check for 50 day breach downwards
-                #if fifty_day_sma < my_stock.get_close(): fifty_day_breach_down = True
-                
-                volume = my_stock.get_volume()
-                yesterday_volume = my_stock.get_yesterday_volume()
-                                
-                # Sort out stocks that have zero volume to avoid divide by zero errors, if volume is zero we leave the indicator as false.
-                if volume > 0 and yesterday_volume > 0:    
-                    close_price = my_stock.get_close()
-                    yesterday_close = my_stock.get_yesterday_close()
-                    vol_percent_change = yesterday_volume / volume
-                    close_percent_change = yesterday_close / close_price
-                    
-                    # Check for heavy volume reversal signal.
-                    if volume >= 250000 and close_price <= 20 and close_price >= 5 and close_percent_change < .5 and vol_percent_change > .25 and close_price > yesterday_close and volume > yesterday_volume: heavy_volume_reversal_signal = True
-                
-                    # Check for general heavy volume up-swing with increasing price.
-                    if volume >= 250000 and close_price <= 20 and close_price >= 5 and vol_percent_change > .25 and close_price > yesterday_close and volume > yesterday_volume: heavy_volume_upswing_signal = True
-                    
-                # Depending on environment, open locally or to our PROD db.
-                # we default to local development.
-                if environment == "PROD": dynamodb = boto3.resource('dynamodb', region_name='us-east-1', endpoint_url="http://dynamodb.us-east-1.amazonaws.com")
-                else: dynamodb = boto3.resource('dynamodb', region_name='us-west-2', endpoint_url="http://localhost:8000")
-                
-                # For running against our AWS instance.
-                #dynamodb = boto3.resource('dynamodb', region_name='us-east-1', endpoint_url="http://dynamodb.us-east-1.amazonaws.coms")
-                
-                current_trend_table = dynamodb.Table('Current_Trend')             
-                
-                # Open a connection to the trend_history_table.
-                trend_history_table = dynamodb.Table('Trend_History') 
-                
-                # Process our trend signals.              
-                if heavy_volume_reversal_signal:
-                    logging.debug("We have a heavy volume reversal signal for {}".format(k))
-                    if save_heavy_volume_reversal(k) == 0: tally_notification(my_stock, 'heavy volume reversal')
-                    else: logging.warn("We were unable to save the heavy volume reversal trend for {}".format(k))
-                
-                #if heavy_volume_upswing_signal:
-                #    logging.info("We have a heavy volume up-swing signal for {}".format(k))
-                #    if save_heavy_volume_upswing(k) == 0: tally_notification(my_stock, 'heavy volume up-swing')
-                #    else: logging.warn("We were unable to save the heavy volume up-swing trend for {}".format(k))
-                
-                if up_signal_generated: 
-                    up_trend_count += 1
-                    logging.debug("We have a up-trend signal from {}".format(k))
-                    # Check if the stock has a stored up-trend.  If so, then ignore. 
-                    # The response comes in the form of a dictionary object.  If it has length of 1 then the symbol was not previously saved.
-                    # If it has more than one, then you are getting a response from the database and there is a current trend saved.
-                    
-                    response = current_trend_table.get_item(Key={'stock_symbol': k})
-                    if len(response) == 1:
-                        # Save the trend to the db.
-                        logging.info("Saving trend to the db")
-                        if save_up_trend(k, True) == 0: tally_notification(my_stock, 'up')
-                        else: logging.warn("We were unable to save the up-trend for {}".format(k))
-                        
-                    elif len(response) > 1:
-                        # Check if the stock is already on an uptrend, if it is, then just move on.  
-                        # If it isn't, then update the entry to indicate up-trend = True, and down-trend = False.
-                        # 'Item': {'trend_start_date': '2016-07-06', 'up-trend': False, 'stock_symbol': 'AMD', 'down-trend': True}}
-                        #trend_info = 
-                        if response['Item']['up_trend'] == True: 
-                            logging.debug("We already know about the up-trend for {}".format(k)) # We are literally passing here, we already know about the up-trend.
-                            # If it is an index, we still notify, right at the top but we set the trend to "existing" in the notification_dict.  We leave the trend valid in the db, this is just for notification purposes.
-                            if k in securities_to_add: tally_notification(my_stock, 'existing-up')
-                        elif response['Item']['up_trend'] == False:
-                            # Updating trend in the database.
-                            if save_up_trend(k, True) == 0: tally_notification(my_stock, 'up') 
-                            else: logging.warn("We were unable to save the new up-trend for {}".format(k)) # Should probably change this to the method call raising an exception and catch it here.
-                elif down_signal_generated: 
-                    down_trend_count += 1
-                    logging.debug("We have a down-trend signal from {}".format(k))
-                    # When a down-trend occurs we check if the stock has a stored down-trend. 
-                    # If so, we ignore, if not, then update the down-trend bit to true, update the up-trend bit to false, insert the date, then notify.
-                    response = current_trend_table.get_item(Key={'stock_symbol': k})
-                    if len(response) == 1:
-                        # Save the trend to the db as this is a either a new signal or a new stock.
-                        logging.debug("Saving new trend to the db")
-                        if save_down_trend(k, True) == 0: tally_notification(my_stock, 'down') 
-                        else: logging.warn("We were unable to save the down-trend for {}".format(k))
-                        
-                    elif len(response) > 1:
-                        # Check if the stock is already on a downtrend, if it is, then just move on.  
-                        # If it isn't, then update the entry to indicate down_trend = True, and up-trend = False.
-                        # 'Item': {'trend_start_date': '2016-07-06', 'up-trend': False, 'stock_symbol': 'AMD', 'down-trend': True}}
-                        if response['Item']['down_trend'] == True: 
-                            logging.debug("We already know about the down-trend for {}".format(k)) # We are literally passing here, we already know about the down-trend.
-                            # If it is an index, we still notify, right at the top but we set the trend to "existing" in the notification_dict.  We leave the trend valid in the db, this is just for notification purposes.
-                            if k in securities_to_add: tally_notification(my_stock, 'existing-down')
-                        elif response['Item']['down_trend'] == False:
-                            # Updating trend in the database.
-                            if save_down_trend(k, False) == 0: tally_notification(my_stock, 'down')
-                            else: logging.warn("We were unable to save the new down-trend for {}".format(k))        
-                else:
-                    logging.debug("No trend detected for {} which means the SMA and EMA are equal".format(k))
-                
-                
-                logging.debug("Current 10 day SMA is {}, current 20 day EMA is {}, and current 30 day EMA is {}".format(round(my_stock.get_10_day_sma(), 2), round(my_stock.get_20_day_ema(), 2),round(my_stock.get_30_day_ema(), 2)))
-                
-               
-            else: logging.debug("This stock has not been traded long enough to do analysis on it.")
-        except TypeError as te: 
-            error_counter['Type Error'] += 1
-            logging.warn("Came back with a TypeError from Yahoo Finance. We have {} of this type error. The error was: {}".format(str(error_counter['Type Error']), te))    # This is the error that is thrown if the query to Yahoo comes back with nothing.  Sometimes it happens with a bad stock symbol.
-        except IndexError as ie: 
-            error_counter['Index Error'] += 1
-            logging.warn("Somehow we got a stock through that didn't have enough entries. We have {} of this type error. The error was: {}".format(str(error_counter['Type Error']), ie))
-        except ConnectionError as ce: 
-            error_counter['Connection Error'] += 1
-            logging.warn("We encountered an error connecting to Yahoo Finance. We have {} of this type error. The error was: {}".format(str(error_counter['Connection Error']), ce))
-        except: 
-            error_counter['Other Error'] += 1
-            logging.exception("Had an issue processing {}. The current uncategorized error count is {}".format(k, str(error_counter['Other Error']))) # We keep going since sometimes Yahoo craps out on us. MIGHT WANT TO ADD AN ERROR COUNTER AND EXIT THE SCRIPT IF WE HIT A THRESHOLD.
-        logging.debug("-----------------End work on stock symbol {} at {}.------------------------".format(k, datetime.datetime.today()))
-        
-        # Yahoo has a limit of 2000 requests per hour. If we are going to run through the entire stock list then we should wait a few seconds between each so that we don't run up against it.
-        if environment == 'PROD': 
-            logging.debug("Waiting for 5 seconds in between requests to Yahoo to let them rest...")
-            time.sleep(5)
+            # Fold the workers' changes back into the machine's state files so the next run can use any number of workers.
+            IndicatorStateStore.from_environment(machine_label).save()
+            NegativeCache.from_environment(machine_label).save()
+        
+        # One shard of a run split across machines, save the results for the --merge run.
+        if shard_count > 1:
+            name = shard_results_file_name(shard_index, shard_count)
+            result.save(os.path.join(shard_results_dir, name))
+            logging.info("Saved the results of shard {}.".format(name))
+            if environment == 'PROD':
+                try:
+                    s3_outputs = boto3.resource('s3')
+                    s3_outputs.Object('rodell-screener-output', name).upload_file(os.path.join(shard_results_dir, name))
+                    s3_outputs.Object('rodell-screener-output', log_file_name).upload_file(log_file_name)
+                except: logging.exception("Had an issue writing the shard results to S3.")
+            logging.info("All Done at {}.".format(datetime.datetime.today()))
+            return
     
+    # NotifiedStock -> trend type, one entry per stock like it has always been.
+    notification_dict = {stock: stock.get_trend_type() for stock in result.get_notifications()}
+    up_trend_count = result.get_up_trend_count()
+    down_trend_count = result.get_down_trend_count()
+    error_counter = result.get_error_counter()
+    unfetched_stocks = result.get_unfetched_stocks()
     
     # Now we write out our results sorted on volume and price ranges. 
     results_list_filename = "list.html"
@@ -717,56 +918,32 @@ def main():
         print("<p>The total number of stocks in an upward trend is <b>{}</b><br>".format(str(up_trend_count)), file=results_file)
         print("The total number of stocks in a downward trend is <b>{}</b></p>".format(str(down_trend_count)), file=results_file)
         
-        # Then report on our heavy volume reversals.    
-        #print("<h4>The following stocks threw a heavy volume up-swing signal:</h4>\n<ul>\n", file=results_file)
-        
-        #for j in notification_dict.keys():
-        #    print(notification_dict[j], j.get_symbol())
-        #    if notification_dict[j] == 'heavy volume up-swing':
-        #        
-        #        volume = j.get_volume()
-        #        close_price = j.get_close()
-        #        yesterday_volume = j.get_yesterday_volume()
-        #        yesterday_close = j.get_yesterday_close()
-        #        vol_percent_change = yesterday_volume / volume
-        #        close_percent_change = yesterday_close / close_price
-        #    
-        #        print("<li>You have a new {} signal for {} - CMF is {}</li>\n".format(notification_dict[j], j.get_symbol(), round(j.get_chaikin_money_flow(), 2)), file=results_file)
-        #        print("<li>Stats are as follows:\n", file=results_file)
-        #        print("<ul>", file=results_file)
-        #        print("<li>Volume: {}</li>\n".format(volume), file=results_file)
-        #        print("<li>Close: {}</li>\n".format(close_price), file=results_file)
-        #        print("<li>Yesterday's Volume: {}</li>\n".format(yesterday_volume), file=results_file)
-        #        print("<li>Yesterday's Close: {}</li>\n".format(yesterday_close), file=results_file)
-        #        print("<li>Volume Percent Change: {}</li>\n".format(vol_percent_change), file=results_file)
-        #        print("<li>Close Percent Change: {}</li>\n".format(close_percent_change), file=results_file)
-                
-        #print("</ul>", file=results_file)
-        
-        # Then report on our heavy volume reversals.    
-        print("<h4>The following stocks threw a heavy volume reversal signal:</h4>\n<ul>\n", file=results_file)
-        
-        for j in notification_dict.keys():
+        # Then a section for each signal screen, e.g. our heavy volume reversals.
+        for screen in screens.get_signals():
+            if not screen.is_reported(): continue
+            print("<h4>The following stocks threw a {} signal:</h4>\n<ul>\n".format(screen.get_name()), file=results_file)
             
-            if notification_dict[j] == 'heavy volume reversal':
-                volume = j.get_volume()
-                close_price = j.get_close()
-                yesterday_volume = j.get_yesterday_volume()
-                yesterday_close = j.get_yesterday_close()
-                vol_percent_change = yesterday_volume / volume
-                close_percent_change = yesterday_close / close_price
-            
-                print("<li>You have a new {} signal for {} - CMF is {}</li>\n".format(notification_dict[j], j.get_symbol(), round(j.get_chaikin_money_flow(), 2)), file=results_file)
-                print("<li>Stats are as follows:\n", file=results_file)
-                print("<ul>", file=results_file)
-                print("<li>Volume: {}</li>\n".format(volume), file=results_file)
-                print("<li>Close: {}</li>\n".format(close_price), file=results_file)
-                print("<li>Yesterday's Volume: {}</li>\n".format(yesterday_volume), file=results_file)
-                print("<li>Yesterday's Close: {}</li>\n".format(yesterday_close), file=results_file)
-                print("<li>Volume Percent Change: {}</li>\n".format(vol_percent_change), file=results_file)
-                print("<li>Close Percent Change: {}</li>\n".format(close_percent_change), file=results_file)
-         
-        print("</ul>", file=results_file)
+            for j in notification_dict.keys():
+                
+                if notification_dict[j] == screen.get_name():
+                    volume = j.get_volume()
+                    close_price = j.get_close()
+                    yesterday_volume = j.get_yesterday_volume()
+                    yesterday_close = j.get_yesterday_close()
+                    vol_percent_change = yesterday_volume / volume
+                    close_percent_change = yesterday_close / close_price
+                
+                    print("<li>You have a new {} signal for {} - CMF is {}</li>\n".format(notification_dict[j], j.get_symbol(), round(j.get_chaikin_money_flow(), 2)), file=results_file)
+                    print("<li>Stats are as follows:\n", file=results_file)
+                    print("<ul>", file=results_file)
+                    print("<li>Volume: {}</li>\n".format(volume), file=results_file)
+                    print("<li>Close: {}</li>\n".format(close_price), file=results_file)
+                    print("<li>Yesterday's Volume: {}</li>\n".format(yesterday_volume), file=results_file)
+                    print("<li>Yesterday's Close: {}</li>\n".format(yesterday_close), file=results_file)
+                    print("<li>Volume Percent Change: {}</li>\n".format(vol_percent_change), file=results_file)
+                    print("<li>Close Percent Change: {}</li>\n".format(close_percent_change), file=results_file)
+             
+            print("</ul>", file=results_file)
         
         # I haven't decided what to do with the 50 day moving average.  If I should log it or just display it on the chart.
         
@@ -842,6 +1019,16 @@ def main():
         s = "<li>We had {} instances of error type {}</li>".format(error_counter[x],x)
         print(s, file=results_file)
     print("</ul>", file=results_file)
+    
+    # Make it obvious when we couldn't get prices for part of the universe.
+    if len(unfetched_stocks) > 0:
+        logging.warn("We were unable to get prices for {} stocks: {}".format(len(unfetched_stocks), ', '.join(sorted(unfetched_stocks))))
+        print("<h4>We were unable to get prices for the following {} stocks:</h4>\n<p>{}</p>".format(len(unfetched_stocks), ', '.join(sorted(unfetched_stocks))), file=results_file)
+    
+    skipped_stocks = result.get_skipped_stocks()
+    if len(skipped_stocks) > 0:
+        logging.info("Skipped {} stocks that have had no data from Yahoo for a while: {}".format(len(skipped_stocks), ', '.join(sorted(skipped_stocks))))
+        print("<h4>We skipped the following {} stocks that have had no data for a while (see negative_cache.py):</h4>\n<p>{}</p>".format(len(skipped_stocks), ', '.join(sorted(skipped_stocks))), file=results_file)
     print("</body>\n</html>", file=results_file)
     
     logging.info("All Done at {}.".format(datetime.datetime.today()))
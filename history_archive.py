@@ -0,0 +1,267 @@
+#!/usr/bin/python
+
+import argparse
+import datetime
+import glob
+import json
+import logging
+import os
+import zlib
+
+import numpy as np
+
+from price_cache import PriceCache
+
+
+    # Compressed long term archive of daily prices.
+    #
+    # The archive is partitioned by year, each year is a data file (YYYY.N.bin) and a block index
+    # (YYYY.index.json).  The data file holds one zlib compressed block per symbol with that symbol's
+    # bars for the year, and the index has the offset, size, bar count and first/last date of every
+    # block, so one symbol or date range is read without decompressing anything else.
+    #
+    # Inside a block the bars are stored by column.  The dates are day numbers and the volumes are
+    # integers, both delta encoded against the previous bar.  The prices are scaled integers
+    # (1/10000ths) delta encoded the same way.  Every delta is zigzag varint encoded, so a typical bar
+    # takes a handful of bytes before compression, against a few hundred for the Yahoo JSON.
+    #
+    # A year is rewritten as a whole when quotes are added to it, which in practice is the current
+    # year, the older years don't change.  The new data goes to a new version of the data file (N + 1)
+    # and the index, which names its data file, is replaced last.  So the index a reader sees always
+    # matches the data file it names, and a crash part way through leaves the old year in place.
+    ##################################################
+
+
+PRICE_SCALE = 10000
+PRICE_COLUMNS = (('open', 'Open'), ('high', 'High'), ('low', 'Low'), ('close', 'Close'), ('adj_close', 'Adj_Close'))
+
+
+# Unsigned LEB128 varints of the zigzag encoded values, so small negative deltas stay small too.
+def encode_varints(values = None):
+    values = np.asarray(values, dtype=np.int64)
+    zigzag = ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+    byte_counts = np.ones(len(zigzag), dtype=np.int64)
+    for k in range(1, 10): byte_counts += zigzag >= (np.uint64(1) << np.uint64(7 * k))
+    offsets = np.concatenate(([0], np.cumsum(byte_counts)[:-1]))
+
+    encoded = np.zeros(int(byte_counts.sum()), dtype=np.uint8)
+    for k in range(10):
+        has_byte = byte_counts > k
+        if not has_byte.any(): break
+        group = (zigzag[has_byte] >> np.uint64(7 * k)) & np.uint64(0x7f)
+        more = np.where(byte_counts[has_byte] > k + 1, 0x80, 0).astype(np.uint64)
+        encoded[offsets[has_byte] + k] = (group | more).astype(np.uint8)
+    return encoded.tobytes()
+
+
+def decode_varints(data = b''):
+    encoded = np.frombuffer(data, dtype=np.uint8)
+    ends = np.nonzero(encoded < 0x80)[0]
+    starts = np.concatenate(([0], ends[:-1] + 1)).astype(np.int64)
+
+    zigzag = np.zeros(len(ends), dtype=np.uint64)
+    for k in range(10):
+        positions = starts + k
+        in_value = positions <= ends
+        if not in_value.any(): break
+        zigzag[in_value] |= (encoded[positions[in_value]].astype(np.uint64) & np.uint64(0x7f)) << np.uint64(7 * k)
+    return ((zigzag >> np.uint64(1)).astype(np.int64)) ^ -((zigzag & np.uint64(1)).astype(np.int64))
+
+
+def _encode_deltas(values = None):
+    values = np.asarray(values, dtype=np.int64)
+    return encode_varints(np.diff(values, prepend=0))
+
+
+def _decode_deltas(data = b''):
+    return np.cumsum(decode_varints(data))
+
+
+# Turns a symbol's quotes for one year into a compressed block.
+def encode_block(columns = None):
+    encoded_columns = [_encode_deltas(columns['date'].astype(np.int64))]
+    for name, key in PRICE_COLUMNS: encoded_columns.append(_encode_deltas(np.round(columns[name] * PRICE_SCALE)))
+    encoded_columns.append(_encode_deltas(columns['volume']))
+
+    # The block starts with the byte length of each column so the columns can be split apart again.
+    header = encode_varints([len(encoded) for encoded in encoded_columns])
+    return zlib.compress(bytes([len(header)]) + header + b''.join(encoded_columns), 6)
+
+
+def decode_block(block = b''):
+    data = zlib.decompress(block)
+    header_length = data[0]
+    lengths = decode_varints(data[1:1 + header_length])
+
+    encoded_columns, position = [], 1 + header_length
+    for length in lengths:
+        encoded_columns.append(data[position:position + length])
+        position += length
+
+    columns = { 'date': _decode_deltas(encoded_columns[0]).astype('datetime64[D]') }
+    for (name, key), encoded in zip(PRICE_COLUMNS, encoded_columns[1:]): columns[name] = _decode_deltas(encoded) / PRICE_SCALE
+    columns['volume'] = _decode_deltas(encoded_columns[-1])
+    return columns
+
+
+# Yahoo quote dictionaries (sorted by date) -> {column: array}.
+def quotes_to_columns(quote_list = None):
+    columns = { 'date': np.array([quote['Date'] for quote in quote_list], dtype='datetime64[D]') }
+    for name, key in PRICE_COLUMNS: columns[name] = np.array([float(quote[key]) for quote in quote_list])
+    columns['volume'] = np.array([int(float(quote['Volume'])) for quote in quote_list], dtype=np.int64)
+    return columns
+
+
+class HistoryArchive:
+    def __init__(self, archive_dir = 'history_archive'):
+        self._archive_dir = archive_dir
+        self._indexes = {}
+
+        if not os.path.isdir(self._archive_dir): os.makedirs(self._archive_dir)
+
+    def _data_path(self, year = 0, version = 0):
+        return os.path.join(self._archive_dir, "{}.{}.bin".format(year, version))
+
+    def _index_path(self, year = 0):
+        return os.path.join(self._archive_dir, "{}.index.json".format(year))
+
+    # The year's index file, {'version': N, 'blocks': {symbol: block entry}}.  Version 0 is a year with no data file yet.
+    def _load_index(self, year = 0):
+        if year not in self._indexes:
+            try:
+                with open(self._index_path(year)) as index_file: self._indexes[year] = json.load(index_file)
+            except FileNotFoundError: self._indexes[year] = { 'version': 0, 'blocks': {} }
+        return self._indexes[year]
+
+    def get_years(self):
+        return sorted(int(name[:-len('.index.json')]) for name in os.listdir(self._archive_dir) if name.endswith('.index.json'))
+
+    # {symbol: {'offset', 'length', 'count', 'first', 'last'}} for one year.
+    def get_index(self, year = 0):
+        return self._load_index(year)['blocks']
+
+    # The size in bytes of the year's data file.
+    def get_data_size(self, year = 0):
+        index = self._load_index(year)
+        if index['version'] == 0: return 0
+        return os.path.getsize(self._data_path(year, index['version']))
+
+    def get_symbols(self):
+        symbols = set()
+        for year in self.get_years(): symbols.update(self.get_index(year))
+        return sorted(symbols)
+
+    # Reads one block, only that block's bytes are read and decompressed.
+    # If the year was rewritten since its index was read the data file is gone, so the new index is read and the block looked up again.
+    def _read_block(self, year = 0, symbol = ''):
+        for attempt in range(2):
+            index = self._load_index(year)
+            entry = index['blocks'].get(symbol)
+            if entry is None: return None
+            try:
+                with open(self._data_path(year, index['version']), 'rb') as data_file:
+                    data_file.seek(entry['offset'])
+                    return decode_block(data_file.read(entry['length']))
+            except FileNotFoundError:
+                if attempt > 0: raise
+                self._indexes.pop(year, None)
+
+    # Returns {column: array} of a symbol's bars from start_date to end_date inclusive (either can be None for no limit),
+    # with 'date' as datetime64[D].  Only the years and blocks that overlap the range are read.
+    def get_columns(self, symbol = '', start_date = None, end_date = None):
+        first, last = str(start_date) if start_date is not None else '', str(end_date) if end_date is not None else '9999'
+        pieces = []
+        for year in self.get_years():
+            entry = self.get_index(year).get(symbol)
+            if entry is None or entry['last'] < first or entry['first'] > last: continue
+            columns = self._read_block(year, symbol)
+            dates = columns['date'].astype(str)
+            in_range = (dates >= first) & (dates <= last)
+            pieces.append({name: values[in_range] for name, values in columns.items()})
+
+        names = ['date'] + [name for name, key in PRICE_COLUMNS] + ['volume']
+        if len(pieces) == 0: return { 'date': np.zeros(0, dtype='datetime64[D]'), **{name: np.zeros(0) for name, key in PRICE_COLUMNS}, 'volume': np.zeros(0, dtype=np.int64) }
+        return {name: np.concatenate([piece[name] for piece in pieces]) for name in names}
+
+    # The same bars as Yahoo style quote dictionaries, like PriceCache.get_quotes.
+    def get_quotes(self, symbol = '', start_date = None, end_date = None):
+        columns = self.get_columns(symbol, start_date, end_date)
+        quote_list = []
+        for i in range(len(columns['date'])):
+            quote = { 'Symbol': symbol, 'Date': str(columns['date'][i]), 'Volume': int(columns['volume'][i]) }
+            for name, key in PRICE_COLUMNS: quote[key] = float(columns[name][i])
+            quote_list.append(quote)
+        return quote_list
+
+    # Writes a whole year, quote_lists is {symbol: Yahoo quote dictionaries for that year}.
+    def write_year(self, year = 0, quote_lists = None):
+        self._indexes.pop(year, None)
+        version = self._load_index(year)['version'] + 1
+
+        blocks = {}
+        temp_path = self._data_path(year, version) + '.tmp'
+        with open(temp_path, 'wb') as data_file:
+            for symbol in sorted(quote_lists):
+                quote_list = sorted(quote_lists[symbol], key=lambda quote: quote['Date'])
+                if len(quote_list) == 0: continue
+                block = encode_block(quotes_to_columns(quote_list))
+                blocks[symbol] = { 'offset': data_file.tell(), 'length': len(block), 'count': len(quote_list), 'first': quote_list[0]['Date'], 'last': quote_list[-1]['Date'] }
+                data_file.write(block)
+            data_file.flush()
+            os.fsync(data_file.fileno())
+        os.replace(temp_path, self._data_path(year, version))
+
+        # Swapping in the index is what switches the year over to the new data file, until then the old index and data file are untouched.
+        index = { 'version': version, 'blocks': blocks }
+        temp_path = self._index_path(year) + '.tmp'
+        with open(temp_path, 'w') as index_file:
+            json.dump(index, index_file)
+            index_file.flush()
+            os.fsync(index_file.fileno())
+        os.replace(temp_path, self._index_path(year))
+        self._indexes[year] = index
+
+        # Now nothing points at the older data files, including any left behind by a write that died part way through.
+        for path in glob.glob(os.path.join(self._archive_dir, "{}.*.bin".format(year))):
+            if path != self._data_path(year, version): os.remove(path)
+
+    # Merges new quotes into the archive, quote_lists is {symbol: Yahoo quote dictionaries}.
+    # Only the years the quotes fall in are rewritten.
+    def add_quotes(self, quote_lists = None):
+        by_year = {}
+        for symbol, quote_list in quote_lists.items():
+            for quote in quote_list: by_year.setdefault(int(quote['Date'][:4]), {}).setdefault(symbol, {})[quote['Date']] = quote
+
+        for year, new_quotes in sorted(by_year.items()):
+            merged = {}
+            for symbol in self.get_index(year):
+                merged[symbol] = {quote['Date']: quote for quote in self.get_quotes(symbol, datetime.date(year, 1, 1), datetime.date(year, 12, 31))}
+            for symbol, quotes in new_quotes.items(): merged.setdefault(symbol, {}).update(quotes)
+            self.write_year(year, {symbol: list(quotes.values()) for symbol, quotes in merged.items()})
+            logging.info("Wrote {} symbols to the {} history archive.".format(len(merged), year))
+
+
+def main():
+    # import    adds everything in the local price cache to the archive.
+    # info      lists the size of each year.
+    parser = argparse.ArgumentParser(description="Builds the compressed long term price history archive.")
+    parser.add_argument('command', choices=('import', 'info'))
+    args = parser.parse_args()
+
+    archive = HistoryArchive(os.getenv('HISTORY_ARCHIVE_DIR', 'history_archive'))
+
+    if args.command == 'import':
+        price_cache = PriceCache(os.getenv('PRICE_CACHE_DIR', 'price_cache'))
+        quote_lists = {}
+        for k in price_cache.get_cached_symbols():
+            quote_lists[k] = price_cache.get_quotes(k, datetime.date.min, datetime.date.max)
+            price_cache.release(k)
+        archive.add_quotes(quote_lists)
+
+    for year in archive.get_years():
+        index = archive.get_index(year)
+        print("{}: {} symbols, {} bars, {} bytes".format(year, len(index), sum(entry['count'] for entry in index.values()), archive.get_data_size(year)))
+
+
+if __name__ == "__main__": main()
@@ -0,0 +1,201 @@
+#!/usr/bin/python
+
+import logging
+
+import numpy as np
+
+
+    # Cross sectional indicator engine.
+    #
+    # Instead of walking each stock's history in Python once per indicator, the price
+    # histories for the whole universe are stacked into 2-D (symbols x days) matrices
+    # and every indicator is computed for all of the symbols at once.
+    #
+    # Stocks don't all have the same number of trading days so each row is right aligned
+    # on the last trading day and padded with NaN on the left.  lengths holds the number
+    # of real trading days in each row.
+    ##################################################
+
+
+# The indicators the universe wide pass can produce, named like the screen rules name them (see screen_rules.py).
+UNIVERSE_INDICATORS = ('sma10', 'sma50', 'ema20', 'ema30', 'cmf15')
+
+
+# Stacks the price history of a list of Security objects into right aligned matrices.
+# Returns (closes, highs, lows, volumes, lengths).
+def build_price_matrices(securities = ()):
+    lengths = np.array([s.get_num_trading_days() for s in securities], dtype=np.int64)
+    width = int(lengths.max()) if len(lengths) > 0 else 0
+
+    closes = np.full((len(lengths), width), np.nan)
+    highs = np.full((len(lengths), width), np.nan)
+    lows = np.full((len(lengths), width), np.nan)
+    volumes = np.full((len(lengths), width), np.nan)
+
+    for i, security in enumerate(securities):
+        start = width - lengths[i]
+        closes[i, start:] = security.get_closes()
+        highs[i, start:] = security.get_highs()
+        lows[i, start:] = security.get_lows()
+        volumes[i, start:] = security.get_volumes()
+
+    return closes, highs, lows, volumes, lengths
+
+
+# The date of every column of the matrices from build_price_matrices, NaT in the padding.
+def build_date_matrix(securities = ()):
+    lengths = np.array([s.get_num_trading_days() for s in securities], dtype=np.int64)
+    width = int(lengths.max()) if len(lengths) > 0 else 0
+
+    dates = np.full((len(lengths), width), np.datetime64('NaT'), dtype='datetime64[D]')
+    for i, security in enumerate(securities): dates[i, width - lengths[i]:] = security.get_dates()
+    return dates
+
+
+# Running sums along each row with a zero column in front, the sum over any window is the difference of two columns.
+def cumulative_sums(values = None):
+    n_rows, width = values.shape
+    cumulative = np.zeros((n_rows, width + 1))
+    np.cumsum(np.nan_to_num(values), axis=1, out=cumulative[:, 1:])
+    return cumulative
+
+
+# Rolling sum over the last period columns, NaN wherever a row doesn't have period days of history yet.
+# Pass the cumulative_sums of values when taking rolling sums of several periods so they are only summed once.
+def rolling_sum(values = None, lengths = None, period = 0, cumulative = None):
+    n_rows, width = values.shape
+    if cumulative is None: cumulative = cumulative_sums(values)
+
+    sums = np.full((n_rows, width), np.nan)
+    if period <= width:
+        sums[:, period - 1:] = cumulative[:, period:] - cumulative[:, :width - period + 1]
+
+    # Blank out the windows that reach back into the padding.
+    first_valid = (width - lengths) + period - 1
+    sums[np.arange(width)[None, :] < first_valid[:, None]] = np.nan
+    return sums
+
+
+def sma_series(closes = None, lengths = None, period = 0, cumulative = None):
+    return rolling_sum(closes, lengths, period, cumulative) / period
+
+
+# The EMA for each row is seeded with the SMA of that row's first period trading days
+# and then walked forward one column at a time.  The walk is over days, not symbols,
+# so it is one vectorized step per trading day for the whole universe.
+def ema_series(closes = None, lengths = None, period = 0):
+    n_rows, width = closes.shape
+    multiplier = 2 / (period + 1)
+    start = width - lengths
+    first_ema_col = start + period
+
+    ema = np.full((n_rows, width), np.nan)
+    seeded = first_ema_col < width
+    if not seeded.any(): return ema
+
+    seed_cols = np.minimum(start[:, None] + np.arange(period)[None, :], width - 1)
+    current = np.take_along_axis(closes, seed_cols, axis=1).sum(axis=1) / period
+
+    for j in range(int(first_ema_col[seeded].min()), width):
+        active = j >= first_ema_col
+        current = np.where(active, (closes[:, j] - current) * multiplier + current, current)
+        ema[:, j] = np.where(active, current, np.nan)
+
+    return ema
+
+
+# Money flow multiplier = [(Close - Low) - (High - Close)] / (High - Low)
+# A day where the high equals the low gets a multiplier of zero.
+# Returns the money flow volume matrix and the number of flat days that were zeroed.
+def money_flow_volume(highs = None, lows = None, closes = None, volumes = None):
+    ranges = highs - lows
+    flat_days = ranges == 0
+
+    multiplier = np.zeros(ranges.shape)
+    np.divide((closes - lows) - (highs - closes), ranges, out=multiplier, where=~flat_days)
+    multiplier[np.isnan(ranges)] = np.nan
+
+    return multiplier * volumes, int(flat_days.sum())
+
+
+# The latest SMA for each row, zero for rows without period days of history.
+def latest_sma(closes = None, lengths = None, period = 0):
+    sma = np.zeros(len(lengths))
+    has_history = lengths >= period
+    sma[has_history] = closes[has_history, -period:].sum(axis=1) / period
+    return sma
+
+
+def cmf_series(highs = None, lows = None, closes = None, volumes = None, lengths = None, period = 0):
+    flow_volumes, flat_day_count = money_flow_volume(highs, lows, closes, volumes)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cmf = rolling_sum(flow_volumes, lengths, period) / rolling_sum(volumes, lengths, period)
+    return cmf, flat_day_count
+
+
+class UniverseIndicators:
+    # Holds the indicators that the screener uses for every stock.
+    # The values are arrays that line up with the symbols list, None for the indicators the run didn't ask for.
+    def __init__(self, symbols = (), ten_day_sma = None, fifty_day_sma = None, twenty_day_ema = None, thirty_day_ema = None, chaikin_money_flow = None):
+        self._symbols = list(symbols)
+        self._index = {symbol: i for i, symbol in enumerate(self._symbols)}
+        self._values = {}
+        for name, values in zip(UNIVERSE_INDICATORS, (ten_day_sma, fifty_day_sma, twenty_day_ema, thirty_day_ema, chaikin_money_flow)):
+            if values is not None: self._values[name] = np.asarray(values, dtype=float)
+
+    # Computes the indicators for every stock at once from right aligned price matrices.
+    # indicators lists the ones the run needs, the others are skipped.
+    @classmethod
+    def compute(cls, symbols = (), closes = None, highs = None, lows = None, volumes = None, lengths = None, indicators = UNIVERSE_INDICATORS):
+        values = dict.fromkeys(UNIVERSE_INDICATORS)
+        if len(symbols) == 0:
+            for name in indicators: values[name] = np.zeros(0)
+            return cls(symbols, *(values[name] for name in UNIVERSE_INDICATORS))
+
+        # We only need the latest value of each SMA and CMF so just sum the last period columns.
+        if 'sma10' in indicators: values['sma10'] = latest_sma(closes, lengths, 10)
+        if 'sma50' in indicators: values['sma50'] = latest_sma(closes, lengths, 50)
+
+        # The EMA needs the whole walk but we only keep the last day.
+        if 'ema20' in indicators: values['ema20'] = np.nan_to_num(ema_series(closes, lengths, 20)[:, -1])
+        if 'ema30' in indicators: values['ema30'] = np.nan_to_num(ema_series(closes, lengths, 30)[:, -1])
+
+        # Going to use a 15 day period CMF since that is the default I've been using with Fidelity.
+        if 'cmf15' in indicators:
+            flow_volumes, flat_day_count = money_flow_volume(highs[:, -15:], lows[:, -15:], closes[:, -15:], volumes[:, -15:])
+            if flat_day_count > 0:
+                logging.warn("The high and low were the same on {} trading days across the universe, using a money flow multiplier of zero for those days.".format(flat_day_count))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                values['cmf15'] = np.nan_to_num(flow_volumes.sum(axis=1) / volumes[:, -15:].sum(axis=1))
+
+        return cls(symbols, *(values[name] for name in UNIVERSE_INDICATORS))
+
+    @classmethod
+    def from_securities(cls, securities = (), indicators = UNIVERSE_INDICATORS):
+        closes, highs, lows, volumes, lengths = build_price_matrices(securities)
+        return cls.compute([s.get_symbol() for s in securities], closes, highs, lows, volumes, lengths, indicators)
+
+    def get_symbols(self):
+        return self._symbols
+
+    def get_index(self, symbol = ''):
+        return self._index[symbol]
+
+    # Returns {name: array} for the indicators that were calculated.
+    def get_values(self):
+        return self._values
+
+    def get_10_day_sma(self):
+        return self._values.get('sma10')
+
+    def get_50_day_sma(self):
+        return self._values.get('sma50')
+
+    def get_20_day_ema(self):
+        return self._values.get('ema20')
+
+    def get_30_day_ema(self):
+        return self._values.get('ema30')
+
+    def get_chaikin_money_flow(self):
+        return self._values.get('cmf15')
@@ -0,0 +1,195 @@
+#!/usr/bin/python
+
+import logging
+import os
+
+import numpy as np
+
+from indicator_engine import UNIVERSE_INDICATORS, UniverseIndicators
+from state_files import labelled_path, load_records, save_records, save_worker_records
+
+
+    # Persisted per-stock indicator state.
+    #
+    # The EMA only needs yesterday's EMA and today's close, and the SMAs and the CMF only need
+    # their last few days.  So instead of walking the whole price history every night we keep
+    # those values for each stock between runs and advance them by the new trading day.
+    #
+    # The state remembers the last trading day it has seen.  If that day isn't in the new price
+    # history (a gap) or its prices don't match any more (Yahoo revised the data) we fall back to
+    # a full recompute with the indicator engine and start the state over from there.
+    #
+    # The worker processes of a run share one state file, see state_files.py.
+    ##################################################
+
+
+EMA_PERIODS = (20, 30)
+SMA_WINDOW = 50
+CMF_PERIOD = 15
+
+
+class IndicatorState:
+    def __init__(self, record = None):
+        if record is None: record = {}
+        self._symbol = record.get('symbol', '')
+        self._last_date = record.get('last_date')
+        # The high, low, close and volume of the last trading day.  Used to detect revised data.
+        self._last_bar = record.get('last_bar')
+        self._ema = {int(period): value for period, value in record.get('ema', {}).items()}
+        self._closes = record.get('closes', [])
+        self._flow_volumes = record.get('flow_volumes', [])
+        self._volumes = record.get('volumes', [])
+
+    # Starts a new state from a Security's full history and the EMAs calculated by the indicator engine.
+    @classmethod
+    def seed(cls, security = None, ema_values = None):
+        state = cls({ 'symbol': security.get_symbol(), 'ema': ema_values })
+        highs, lows, closes, volumes = security.get_highs(), security.get_lows(), security.get_closes(), security.get_volumes()
+        dates = security.get_dates()
+
+        first = max(security.get_num_trading_days() - SMA_WINDOW, 0)
+        for i in range(first, security.get_num_trading_days()):
+            state._push(str(dates[i]), float(highs[i]), float(lows[i]), float(closes[i]), int(volumes[i]))
+        return state
+
+    def _push(self, date = '', high = 0.0, low = 0.0, close = 0.0, volume = 0):
+        # There is a chance that the high and low prices will be the same, leave the multiplier as zero on those days.
+        flat_day = high == low
+        money_flow_multiplier = 0.0
+        if not flat_day: money_flow_multiplier = ((close - low) - (high - close)) / (high - low)
+
+        self._closes = (self._closes + [close])[-SMA_WINDOW:]
+        self._flow_volumes = (self._flow_volumes + [money_flow_multiplier * volume])[-CMF_PERIOD:]
+        self._volumes = (self._volumes + [volume])[-CMF_PERIOD:]
+        self._last_date = date
+        self._last_bar = [high, low, close, volume]
+        return flat_day
+
+    # EMA Formula is (Close - EMA(previous day)) * multiplier + EMA(previous day)
+    # Returns True if the day had the same high and low.
+    def advance(self, date = '', high = 0.0, low = 0.0, close = 0.0, volume = 0):
+        for period in self._ema:
+            multiplier = 2 / (period + 1)
+            self._ema[period] = (close - self._ema[period]) * multiplier + self._ema[period]
+        return self._push(date, high, low, close, volume)
+
+    # Works out where the state picks up in a Security's history.
+    # Returns the index of the state's last trading day or None if the state can't be used (gap or revised data).
+    def find_anchor(self, security = None):
+        if self._last_date is None: return None
+
+        dates = security.get_dates()
+        anchor = int(np.searchsorted(dates, np.datetime64(self._last_date)))
+        if anchor >= len(dates) or str(dates[anchor]) != self._last_date: return None
+
+        bar = [float(security.get_highs()[anchor]), float(security.get_lows()[anchor]), float(security.get_closes()[anchor]), int(security.get_volumes()[anchor])]
+        if bar != self._last_bar: return None
+
+        return anchor
+
+    def to_dict(self):
+        return { 'symbol': self._symbol, 'last_date': self._last_date, 'last_bar': self._last_bar, 'ema': self._ema,
+                 'closes': self._closes, 'flow_volumes': self._flow_volumes, 'volumes': self._volumes }
+
+    def _sma(self, period = 0):
+        if len(self._closes) < period: return 0.0
+        return sum(self._closes[-period:]) / period
+
+    def get_last_date(self):
+        return self._last_date
+
+    def get_10_day_sma(self):
+        return self._sma(10)
+
+    def get_50_day_sma(self):
+        return self._sma(50)
+
+    def get_20_day_ema(self):
+        return self._ema.get(20, 0.0)
+
+    def get_30_day_ema(self):
+        return self._ema.get(30, 0.0)
+
+    def get_chaikin_money_flow(self):
+        volume_total = sum(self._volumes)
+        if volume_total == 0: return 0.0
+        return sum(self._flow_volumes) / volume_total
+
+    def get_indicator(self, name = ''):
+        if name == 'sma10': return self.get_10_day_sma()
+        if name == 'sma50': return self.get_50_day_sma()
+        if name == 'ema20': return self.get_20_day_ema()
+        if name == 'ema30': return self.get_30_day_ema()
+        return self.get_chaikin_money_flow()
+
+
+class IndicatorStateStore:
+    # A worker process passes its worker_label and only saves the states it changed, see state_files.py.
+    def __init__(self, path = 'indicator_state.json', worker_label = ''):
+        self._path = path
+        self._worker_label = worker_label
+        self._states = {}
+        self._worker_files = []
+        self._changed = set()
+
+        try:
+            records, self._worker_files = load_records(self._path)
+            self._states = {symbol: IndicatorState(record) for symbol, record in records.items()}
+        except ValueError: logging.warn("The indicator state file {} or one of its worker files is corrupt, all indicators will be recomputed.".format(self._path))
+
+    # The store in INDICATOR_STATE_FILE, label is the machine shard's (the worker processes share its file).
+    @classmethod
+    def from_environment(cls, label = '', worker_label = ''):
+        return cls(labelled_path(os.getenv('INDICATOR_STATE_FILE', 'indicator_state.json'), label), worker_label)
+
+    # Returns the UniverseIndicators for the securities, advancing the saved state where we can
+    # and running the indicator engine on the rest.  indicators lists the ones the run needs (see UNIVERSE_INDICATORS),
+    # the state is kept up to date for all of them either way.
+    def update(self, securities = (), indicators = UNIVERSE_INDICATORS):
+        n = len(securities)
+        values = {name: np.zeros(n) for name in indicators}
+
+        recompute = []
+        flat_day_count = 0
+        for i, security in enumerate(securities):
+            symbol = security.get_symbol()
+            state = self._states.get(symbol)
+            anchor = None
+            if state is not None: anchor = state.find_anchor(security)
+
+            if anchor is None:
+                recompute.append(i)
+                continue
+
+            highs, lows, closes, volumes, dates = security.get_highs(), security.get_lows(), security.get_closes(), security.get_volumes(), security.get_dates()
+            for j in range(anchor + 1, security.get_num_trading_days()):
+                if state.advance(str(dates[j]), float(highs[j]), float(lows[j]), float(closes[j]), int(volumes[j])): flat_day_count += 1
+            self._changed.add(symbol)
+
+            for name in indicators: values[name][i] = state.get_indicator(name)
+
+        if flat_day_count > 0:
+            logging.warn("The high and low were the same on {} new trading days, using a money flow multiplier of zero for those days.".format(flat_day_count))
+
+        logging.info("Advanced the saved indicator state for {} stocks and recomputed {} stocks in full.".format(n - len(recompute), len(recompute)))
+
+        if len(recompute) > 0:
+            # The EMAs are always needed to seed the new states.
+            recomputed = UniverseIndicators.from_securities([securities[i] for i in recompute], set(indicators) | {'ema20', 'ema30'})
+            recomputed_values = recomputed.get_values()
+            for row, i in enumerate(recompute):
+                for name in indicators: values[name][i] = recomputed_values[name][row]
+
+                # Start the state over from the recomputed values, unless we are catching up on a day
+                # that is older than what we have already saved.
+                security = securities[i]
+                old_state = self._states.get(security.get_symbol())
+                if old_state is None or old_state.get_last_date() <= str(security.get_dates()[-1]):
+                    self._states[security.get_symbol()] = IndicatorState.seed(security, { 20: float(recomputed_values['ema20'][row]), 30: float(recomputed_values['ema30'][row]) })
+                    self._changed.add(security.get_symbol())
+
+        return UniverseIndicators([s.get_symbol() for s in securities], *(values.get(name) for name in UNIVERSE_INDICATORS))
+
+    def save(self):
+        if len(self._worker_label) > 0: save_worker_records(self._path, self._worker_label, {symbol: self._states[symbol].to_dict() for symbol in self._changed})
+        else: save_records(self._path, {symbol: state.to_dict() for symbol, state in self._states.items()}, self._worker_files)
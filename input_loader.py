@@ -0,0 +1,104 @@
+#!/usr/bin/python
+
+import contextlib
+import io
+import logging
+import os
+
+import boto3
+from botocore.exceptions import ClientError
+
+
+    # Reads the input files (the exchange company lists) from an S3 bucket or a local directory.
+    #
+    # from_environment picks where they come from:
+    #
+    #    INPUT_DIR      read the files from this directory, for testing and DEV runs
+    #    INPUT_BUCKET   otherwise read them from this bucket, the screener's PROD run defaults to
+    #                   rodell-screener-input and read_s3.py to rodell-screener-output
+    #
+    # With neither of them set (and no default bucket) the files are read from the current directory,
+    # where populate_stock_table.py has always expected them.
+    #
+    # Each file read from S3 is kept in a local cache (INPUT_CACHE_DIR) along with its ETag, and the next run asks
+    # S3 for it with If-None-Match, so an unchanged file costs a 304 instead of a download.  A changed
+    # file is parsed straight from the response body as it streams in and written to the cache on the
+    # way through, nothing has to be downloaded to a file and opened again.
+    ##################################################
+
+
+class _TeeStream(io.RawIOBase):
+    # Reads a streaming response body and copies everything read to copy_file.
+    def __init__(self, body = None, copy_file = None):
+        self._body = body
+        self._copy_file = copy_file
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer = None):
+        data = self._body.read(len(buffer))
+        self._copy_file.write(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class InputLoader:
+    def __init__(self, bucket = 'rodell-screener-input', cache_dir = 'input_cache', local_dir = None):
+        self._bucket = bucket
+        self._cache_dir = cache_dir
+        self._local_dir = local_dir
+
+        if self._local_dir is None and not os.path.isdir(self._cache_dir): os.makedirs(self._cache_dir)
+
+    # The loader for the INPUT_DIR directory when that is set, otherwise for INPUT_BUCKET (or default_bucket)
+    # and INPUT_CACHE_DIR.  Without a bucket the files are read from the current directory.
+    @classmethod
+    def from_environment(cls, default_bucket = None):
+        local_dir = os.getenv('INPUT_DIR')
+        bucket = os.getenv('INPUT_BUCKET', default_bucket)
+        if local_dir is None and bucket is None: local_dir = '.'
+        return cls(bucket, os.getenv('INPUT_CACHE_DIR', 'input_cache'), local_dir)
+
+    def _cache_path(self, name = ''):
+        return os.path.join(self._cache_dir, name)
+
+    def _get_cached_etag(self, name = ''):
+        try:
+            with open(self._cache_path(name) + '.etag') as etag_file: return etag_file.read().strip()
+        except FileNotFoundError: return None
+
+    # Opens an input file as text for csv.reader and friends, e.g.
+    #    with input_loader.open_text('NASDAQ.csv') as company_list: ...
+    @contextlib.contextmanager
+    def open_text(self, name = ''):
+        if self._local_dir is not None:
+            with open(os.path.join(self._local_dir, name), newline='') as text_file: yield text_file
+            return
+
+        # Only ask for the file if it changed since the copy we have.
+        etag = self._get_cached_etag(name)
+        if not os.path.exists(self._cache_path(name)): etag = None
+        try:
+            if etag is not None: response = boto3.resource('s3').Object(self._bucket, name).get(IfNoneMatch=etag)
+            else: response = boto3.resource('s3').Object(self._bucket, name).get()
+        except ClientError as ce:
+            if ce.response.get('Error', {}).get('Code') not in ('304', 'NotModified'): raise
+            logging.info("{} hasn't changed since the last run, using the cached copy.".format(name))
+            with open(self._cache_path(name), newline='') as text_file: yield text_file
+            return
+
+        # Parse from the body while it streams in, the cache copy only replaces the old one once the whole file has been read.
+        logging.info("Reading {} from S3.".format(name))
+        temp_path = self._cache_path(name) + '.tmp'
+        try:
+            with open(temp_path, 'wb') as copy_file:
+                text_file = io.TextIOWrapper(io.BufferedReader(_TeeStream(response['Body'], copy_file)), encoding='utf-8', newline='')
+                yield text_file
+                # Whatever the caller didn't read still belongs in the cache.
+                text_file.read()
+        except:
+            os.remove(temp_path)
+            raise
+        os.replace(temp_path, self._cache_path(name))
+        with open(self._cache_path(name) + '.etag', 'w') as etag_file: etag_file.write(response['ETag'])
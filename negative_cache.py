@@ -0,0 +1,98 @@
+#!/usr/bin/python
+
+import datetime
+import logging
+import os
+
+from state_files import labelled_path, load_records, save_records, save_worker_records
+
+
+    # Persistent record of the symbols the upstream has no data for.
+    #
+    # Preferred shares, warrants, delisted tickers and the like come back empty every night and each
+    # one still costs a request.  Every time a symbol fails that way its failure count goes up, and
+    # once it has failed min_failures nights in a row it is skipped for ttl_days.  When the time is up
+    # it is requested again, a success clears it and another failure skips it for twice as long as
+    # the time before, up to max_ttl_days.
+    #
+    # Only a symbol that comes back empty (or is missing from its batch's response) counts.  Connection
+    # problems, failed requests and batch responses that can't be split say nothing about the symbols
+    # in them and are left to the retries.
+    #
+    # The worker processes of a run share one cache file, see state_files.py.
+    #
+    # Run this file to list the symbols that are being skipped.
+    ##################################################
+
+
+def parse_date(date_string = ''):
+    return datetime.datetime.strptime(date_string, '%Y-%m-%d').date()
+
+
+class NegativeCache:
+    # A worker process passes its worker_label and only saves the symbols it changed, see state_files.py.
+    def __init__(self, path = 'negative_cache.json', min_failures = 3, ttl_days = 7, max_ttl_days = 180, worker_label = ''):
+        self._path = path
+        self._worker_label = worker_label
+        self._min_failures = max(int(min_failures), 1)
+        self._ttl_days = ttl_days
+        self._max_ttl_days = max_ttl_days
+
+        # symbol -> { 'failures', 'reason', 'first_failure', 'last_failure', 'skip_until' }
+        self._entries = {}
+        self._worker_files = []
+        self._changed = set()
+        try: self._entries, self._worker_files = load_records(self._path)
+        except ValueError: logging.warn("The negative cache {} or one of its worker files is corrupt, starting a new one.".format(self._path))
+
+    # The cache in NEGATIVE_CACHE_FILE, with the NEGATIVE_CACHE_MIN_FAILURES, NEGATIVE_CACHE_TTL_DAYS and
+    # NEGATIVE_CACHE_MAX_TTL_DAYS settings.  label is the machine shard's, the worker processes share its file.
+    @classmethod
+    def from_environment(cls, label = '', worker_label = ''):
+        path = labelled_path(os.getenv('NEGATIVE_CACHE_FILE', 'negative_cache.json'), label)
+        return cls(path, int(os.getenv('NEGATIVE_CACHE_MIN_FAILURES', 3)), int(os.getenv('NEGATIVE_CACHE_TTL_DAYS', 7)), int(os.getenv('NEGATIVE_CACHE_MAX_TTL_DAYS', 180)), worker_label)
+
+    def should_skip(self, symbol = '', today = None):
+        entry = self._entries.get(symbol)
+        if entry is None or entry['skip_until'] is None: return False
+        return today < parse_date(entry['skip_until'])
+
+    def record_failure(self, symbol = '', reason = '', today = None):
+        entry = self._entries.setdefault(symbol, { 'failures': 0, 'reason': '', 'first_failure': str(today), 'last_failure': None, 'skip_until': None })
+        # A re-run on the same day isn't another night of failing.
+        if entry['last_failure'] == str(today): return
+        self._changed.add(symbol)
+        entry['failures'] += 1
+        entry['reason'] = reason
+        entry['last_failure'] = str(today)
+
+        # The first skip is ttl_days and each failed re-probe doubles it.
+        if entry['failures'] >= self._min_failures:
+            ttl = min(self._ttl_days * 2 ** (entry['failures'] - self._min_failures), self._max_ttl_days)
+            entry['skip_until'] = str(today + datetime.timedelta(days=ttl))
+
+    # Any data at all clears the symbol.
+    def record_success(self, symbol = ''):
+        if self._entries.pop(symbol, None) is not None: self._changed.add(symbol)
+
+    # [(symbol, entry)] of the symbols skipped on today, sorted by symbol.
+    def get_skipped(self, today = None):
+        return [(symbol, self._entries[symbol]) for symbol in sorted(self._entries) if self.should_skip(symbol, today)]
+
+    def save(self):
+        if len(self._worker_label) > 0: save_worker_records(self._path, self._worker_label, {symbol: self._entries.get(symbol) for symbol in self._changed})
+        else: save_records(self._path, self._entries, self._worker_files)
+
+
+def main():
+    negative_cache = NegativeCache.from_environment()
+    today = datetime.date.today()
+    skipped = negative_cache.get_skipped(today)
+
+    print("{:<10}{:>10}  {:<12}{:<12}{:<12}{}".format('Symbol', 'Failures', 'First', 'Last', 'Skip until', 'Reason'))
+    for symbol, entry in skipped:
+        print("{:<10}{:>10}  {:<12}{:<12}{:<12}{}".format(symbol, entry['failures'], entry['first_failure'], entry['last_failure'], entry['skip_until'], entry['reason']))
+    print("\n{} symbols are being skipped.".format(len(skipped)))
+
+
+if __name__ == "__main__": main()
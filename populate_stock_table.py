@@ -1,75 +1,100 @@
 #!/usr/bin/python
 
-import boto3
+import argparse
+import logging
+import os
+import sys
 
-def main():
-    
-    
-    dynamodb = boto3.resource('dynamodb', region_name='us-west-2', endpoint_url="http://localhost:8000")
-    #dynamodb = boto3.resource('dynamodb', region_name='us-east-1', endpoint_url="http://dynamodb.us-east-1.amazonaws.com")
+from input_loader import InputLoader
+from trend_store import dynamodb_resource, parallel_batch_write, parallel_scan
+from universe import load_universe
 
-    stock_list_table = dynamodb.Table('Stock_List')
-    stock_list_table.delete()
-    
-    # There is one entry per stock symbol in this table.
-    stock_list_table = dynamodb.create_table(
-        TableName='Stock_List',
-        KeySchema=[
-            {
-                'AttributeName': 'stock_symbol',
-                'KeyType': 'HASH'  #Partition key
-            },
-        ],
-        AttributeDefinitions=[
-            {         
-                'AttributeName': 'stock_symbol',
-                'AttributeType': 'S'
-            }
-     
-        ],
-        ProvisionedThroughput={
-            'ReadCapacityUnits': 2,
-            'WriteCapacityUnits': 2
-        }
-    )
 
-    print("Stock List Table status:", stock_list_table.table_status)
+    # Brings the Stock_List table in line with the exchange company lists.
+    #
+    # The company lists (NASDAQ.csv, NYSE.csv and AMEX.csv) are read from the current directory, or from
+    # INPUT_DIR or the INPUT_BUCKET bucket when those are set (see input_loader.py).
+    #
+    # The table is read with a parallel scan and compared with the universe from the company lists,
+    # and only the symbols that were added or dropped are written, in batches from several threads
+    # that back off when DynamoDB throttles them.  The table is never dropped, so it stays readable
+    # while it is being refreshed and a day with few listing changes costs a handful of writes.
+    #
+    # A company list that comes back empty or cut short would otherwise delete most of the table, so
+    # the update is called off when the universe is empty or more than STOCK_LIST_MAX_DELETE_FRACTION
+    # (default .1) of the listed stocks would be removed.  Check the company lists, then set it higher
+    # for the run if that many stocks really were delisted.
+    #
+    # ENV=PROD updates the production table, otherwise the local one.  The table is created (with the
+    # same 2/2 capacity as always) if it doesn't exist yet.
+    ##################################################
 
-        
-    
-    nasdaq_company_list = open('NASDAQ.csv')
-    nyse_company_list = open('NYSE.csv')
-    amex_company_list = open('AMEX.csv')
 
-    the_stocks = []
-    for line in nasdaq_company_list:
-        
-        # Skip the first line since it's the column headers and filter out any strange symbols that we don't want to look at.
-        if(line.find("Symbol") != -1 or line.find("n/a") != -1): pass
-        else:
-            data_list = line.split(',')
-            stock_list_table.put_item( Item = { 'stock_symbol': data_list[0].strip('"') } ) 
-           
-    print(stock_list_table.scan())
-    
-    for line in nyse_company_list:
+# Returns the (additions, deletions) that bring the listed stocks in line with the universe, or None when
+# the universe is empty or the deletions are more than max_delete_fraction of the listed stocks.
+def diff_stock_list(the_stocks = (), listed_stocks = (), max_delete_fraction = .1):
+    the_stocks, listed_stocks = set(the_stocks), set(listed_stocks)
+    additions = sorted(the_stocks - listed_stocks)
+    deletions = sorted(listed_stocks - the_stocks)
+
+    if len(the_stocks) == 0:
+        logging.warn("The company lists have no stocks in them, leaving Stock_List alone.")
+        return None
+    if len(deletions) > max_delete_fraction * len(listed_stocks):
+        logging.warn("Removing {} of the {} stocks in Stock_List is more than the {:.0%} allowed, leaving Stock_List alone. "
+                     "Check the company lists or raise STOCK_LIST_MAX_DELETE_FRACTION.".format(len(deletions), len(listed_stocks), max_delete_fraction))
+        return None
+    return additions, deletions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Updates the Stock_List table from the exchange company lists.")
+    parser.add_argument('--workers', type=int, default=4, help="Threads for the scan and the writes.")
+    parser.add_argument('--dry-run', action='store_true', help="Only print what would change.")
+    args = parser.parse_args()
     
-        # Skip the first line since it's the column headers and filter out any strange symbols that we don't want to look at.
-        if(line.find("Symbol") != -1 or line.find("n/a") != -1): pass
-        else:
-            data_list = line.split(',')
-            stock_list_table.put_item( Item = { 'stock_symbol': data_list[0].strip('"') } )
+    logging.basicConfig(level=logging.INFO)
+    environment = os.getenv('ENV', 'DEV')
+    dynamodb = dynamodb_resource(environment)
     
-    print(stock_list_table.scan())
+    # There is one entry per stock symbol in this table.
+    if 'Stock_List' not in [table.name for table in dynamodb.tables.all()]:
+        stock_list_table = dynamodb.create_table(
+            TableName='Stock_List',
+            KeySchema=[
+                {
+                    'AttributeName': 'stock_symbol',
+                    'KeyType': 'HASH'  #Partition key
+                },
+            ],
+            AttributeDefinitions=[
+                {         
+                    'AttributeName': 'stock_symbol',
+                    'AttributeType': 'S'
+                }
+         
+            ],
+            ProvisionedThroughput={
+                'ReadCapacityUnits': 2,
+                'WriteCapacityUnits': 2
+            }
+        )
+        stock_list_table.wait_until_exists()
+        print("Stock List Table status:", stock_list_table.table_status)
     
-    for line in amex_company_list:
+    # The company lists come through the input loader, a symbol listed by more than one exchange is only added once.
+    the_stocks = set(load_universe(('NASDAQ.csv', 'NYSE.csv', 'AMEX.csv'), None, True, InputLoader.from_environment()))
+    listed_stocks = set(item['stock_symbol'] for item in parallel_scan(environment, 'Stock_List', args.workers))
     
-        # Skip the first line since it's the column headers and filter out any strange symbols that we don't want to look at.
-        if(line.find("Symbol") != -1 or line.find("n/a") != -1): pass
-        else:
-            data_list = line.split(',')
-            stock_list_table.put_item( Item = { 'stock_symbol': data_list[0].strip('"') } )
+    diff = diff_stock_list(the_stocks, listed_stocks, float(os.getenv('STOCK_LIST_MAX_DELETE_FRACTION', .1)))
+    if diff is None: sys.exit(1)
+    additions, deletions = diff
+    print("Stock_List has {} stocks, adding {} and removing {}.".format(len(listed_stocks), len(additions), len(deletions)))
+    if args.dry_run:
+        print("Adding: {}\nRemoving: {}".format(', '.join(additions), ', '.join(deletions)))
+        return
     
-    print(stock_list_table.scan())
+    parallel_batch_write(environment, 'Stock_List', [{ 'stock_symbol': symbol } for symbol in additions], [{ 'stock_symbol': symbol } for symbol in deletions], args.workers)
+    print("Stock_List now has {} stocks.".format(len(the_stocks)))
     
-if __name__ == "__main__": main()
\ No newline at end of file
+if __name__ == "__main__": main()
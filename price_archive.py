@@ -0,0 +1,285 @@
+#!/usr/bin/python
+
+import argparse
+import datetime
+import json
+import logging
+import os
+
+import numpy as np
+
+from price_cache import PriceCache
+
+
+    # Memory mapped binary archive of daily prices for research and backtesting.
+    #
+    # The archive is a directory with one file per price column (open, high, low, close, adjusted
+    # close and volume), a date axis file and a small JSON index.  Every column file is a
+    # (days x slots) table of fixed width little endian values, float64 for prices and int64 for
+    # volume, and the index maps each symbol to its slot along with the first day it has prices.
+    # A day a symbol didn't trade is NaN (volume 0).  The dates are int64 days since 1970-01-01 so they
+    # can be viewed as datetime64[D] without a copy.
+    #
+    # Readers memory map the files, a symbol's history is a strided view of its slot and the whole
+    # universe is the transposed table, so nothing is parsed or copied and a cold start only costs
+    # the page faults for the data that is actually touched.
+    #
+    # Appending a day adds one row to the end of each file and then replaces the index, readers go by
+    # the day count in the index so they never see a half written row.  The only time the files are
+    # rewritten is when new symbols don't fit in the slots any more, the slots double each time.
+    ##################################################
+
+
+# (archive column, quote key, dtype)
+COLUMNS = (('open', 'Open', '<f8'), ('high', 'High', '<f8'), ('low', 'Low', '<f8'), ('close', 'Close', '<f8'), ('adj_close', 'Adj_Close', '<f8'), ('volume', 'Volume', '<i8'))
+_MISSING = { '<f8': np.nan, '<i8': 0 }
+
+
+def _day_number(date = None):
+    return int(np.datetime64(str(date), 'D').astype(np.int64))
+
+
+# Yahoo hands the prices back as strings.
+def _value(quote = None, key = '', dtype = '<f8'):
+    if dtype == '<i8': return int(float(quote[key]))
+    return float(quote[key])
+
+
+class PriceArchive:
+    def __init__(self, archive_dir = 'price_archive'):
+        self._archive_dir = archive_dir
+        self._index = { 'symbols': [], 'first_days': [], 'slot_count': 0, 'day_count': 0 }
+        self._views = None
+
+        if not os.path.isdir(self._archive_dir): os.makedirs(self._archive_dir)
+        try:
+            with open(self._index_path()) as index_file: self._index = json.load(index_file)
+        except FileNotFoundError: pass
+        self._slots = {symbol: slot for slot, symbol in enumerate(self._index['symbols'])}
+
+    def _index_path(self):
+        return os.path.join(self._archive_dir, 'index.json')
+
+    def _column_path(self, name = ''):
+        return os.path.join(self._archive_dir, "{}.bin".format(name))
+
+    def _save_index(self):
+        # Write to a temporary file first so that a crash never leaves a half written index behind.
+        temp_path = self._index_path() + '.tmp'
+        with open(temp_path, 'w') as index_file: json.dump(self._index, index_file)
+        os.replace(temp_path, self._index_path())
+        self._views = None
+
+    # Memory maps every column, only the rows the index knows about.
+    def _get_views(self):
+        if self._views is None:
+            day_count, slot_count = self._index['day_count'], self._index['slot_count']
+            self._views = {}
+            for name, key, dtype in COLUMNS:
+                if day_count == 0 or slot_count == 0: self._views[name] = np.zeros((day_count, slot_count), dtype=dtype)
+                else: self._views[name] = np.memmap(self._column_path(name), dtype=dtype, mode='r', shape=(day_count, slot_count))
+            if day_count == 0: self._views['date'] = np.zeros(0, dtype='datetime64[D]')
+            else: self._views['date'] = np.memmap(self._column_path('date'), dtype='<i8', mode='r', shape=(day_count,)).view('datetime64[D]')
+        return self._views
+
+    def get_symbols(self):
+        return self._index['symbols']
+
+    def get_day_count(self):
+        return self._index['day_count']
+
+    def get_dates(self):
+        return self._get_views()['date']
+
+    def get_last_date(self):
+        if self._index['day_count'] == 0: return None
+        return self.get_dates()[-1].astype(datetime.date)
+
+    # The (days x slots) table of a column, read only.
+    def get_column(self, name = 'close'):
+        return self._get_views()[name]
+
+    # Returns {column: array} of a symbol's history from its first day, including 'date'.  These are views
+    # of the memory mapped files, not copies, so treat them as read only.  Days the symbol didn't trade are NaN,
+    # or left out with trading_days_only (which copies the history, but only when there are such days).
+    def get_history(self, symbol = '', trading_days_only = False):
+        slot = self._slots[symbol]
+        first_day = self._index['first_days'][slot]
+        views = self._get_views()
+        history = {name: views[name][first_day:, slot] for name, key, dtype in COLUMNS}
+        history['date'] = views['date'][first_day:]
+
+        if trading_days_only:
+            traded = ~np.isnan(history['close'])
+            if not traded.all(): history = {name: values[traded] for name, values in history.items()}
+        return history
+
+    # The slots of symbols, all of the archive's symbols in slot order when symbols is None.
+    def _get_slots(self, symbols = None):
+        if symbols is None: return np.arange(len(self._index['symbols']), dtype=np.int64)
+        return np.array([self._slots[symbol] for symbol in symbols], dtype=np.int64)
+
+    # The (symbols x days) rows of a column.  Symbols in consecutive slots (e.g. a chunk of get_symbols()) are a
+    # transposed view of the file, any other selection is gathered into a new array.
+    def _get_rows(self, name = 'close', slots = None):
+        views = self._get_views()
+        if len(slots) > 0 and (slots == slots[0] + np.arange(len(slots))).all(): return views[name][:, slots[0]:slots[0] + len(slots)].T
+        return views[name].T[slots]
+
+    # Right aligned (symbols x days) matrices for the indicator engine, see indicator_engine.build_price_matrices.
+    # Returns (closes, highs, lows, volumes, lengths), the volumes are int64 with 0 on the days without prices.
+    # When the symbols are in consecutive slots (e.g. all of them, or a chunk of get_symbols()) and every one has traded
+    # every day since it was added, the usual case for a live universe, the matrices are transposed views of the files.
+    # Otherwise the days a symbol didn't trade are squeezed out into new arrays.
+    def get_price_matrices(self, symbols = None):
+        views = self._get_views()
+        day_count = self._index['day_count']
+        slots = self._get_slots(symbols)
+        first_days = np.array(self._index['first_days'], dtype=np.int64)[slots]
+
+        closes = self._get_rows('close', slots)
+        traded = ~np.isnan(closes)
+        if (traded | (np.arange(day_count)[None, :] < first_days[:, None])).all():
+            return closes, self._get_rows('high', slots), self._get_rows('low', slots), self._get_rows('volume', slots), day_count - first_days
+
+        lengths = traded.sum(axis=1)
+        squeezed = { name: np.full((len(slots), day_count), _MISSING[dtype], dtype=dtype) for name, key, dtype in COLUMNS if name in ('close', 'high', 'low', 'volume') }
+        for row, slot in enumerate(slots):
+            days = np.nonzero(traded[row])[0]
+            for name, matrix in squeezed.items(): matrix[row, day_count - len(days):] = views[name][days, slot]
+        return squeezed['close'], squeezed['high'], squeezed['low'], squeezed['volume'], lengths
+
+    # The date of every column of the get_price_matrices matrices, NaT in the padding.
+    def get_date_matrix(self, symbols = None):
+        dates = self.get_dates()
+        day_count = self._index['day_count']
+        traded = ~np.isnan(self._get_rows('close', self._get_slots(symbols)))
+
+        date_matrix = np.full(traded.shape, np.datetime64('NaT'), dtype='datetime64[D]')
+        for row in range(len(traded)):
+            row_dates = dates[traded[row]]
+            date_matrix[row, day_count - len(row_dates):] = row_dates
+        return date_matrix
+
+    # Gives each new symbol a slot, doubling the slots (the one time the files are rewritten) when they run out.
+    def _add_symbols(self, symbols = ()):
+        new_symbols = [symbol for symbol in symbols if symbol not in self._slots]
+        if len(new_symbols) == 0: return
+
+        symbol_count = len(self._index['symbols']) + len(new_symbols)
+        if symbol_count > self._index['slot_count']:
+            slot_count = max(self._index['slot_count'], 64)
+            while slot_count < symbol_count: slot_count *= 2
+            self._resize(slot_count)
+
+        for symbol in new_symbols:
+            self._slots[symbol] = len(self._index['symbols'])
+            self._index['symbols'].append(symbol)
+            self._index['first_days'].append(self._index['day_count'])
+
+    def _resize(self, slot_count = 0):
+        day_count, old_slot_count = self._index['day_count'], self._index['slot_count']
+        logging.info("Growing the price archive from {} to {} slots.".format(old_slot_count, slot_count))
+        for name, key, dtype in COLUMNS:
+            temp_path = self._column_path(name) + '.tmp'
+            if day_count > 0:
+                resized = np.memmap(temp_path, dtype=dtype, mode='w+', shape=(day_count, slot_count))
+                resized[:, old_slot_count:] = _MISSING[dtype]
+                if old_slot_count > 0: resized[:, :old_slot_count] = np.memmap(self._column_path(name), dtype=dtype, mode='r', shape=(day_count, old_slot_count))
+                resized.flush()
+                del resized
+            else: open(temp_path, 'wb').close()
+            os.replace(temp_path, self._column_path(name))
+        self._index['slot_count'] = slot_count
+        self._save_index()
+
+    # Drops anything past the rows the index knows about, left behind if an append died part way through.
+    def _truncate_files(self):
+        for name, key, dtype in COLUMNS:
+            path = self._column_path(name)
+            if os.path.exists(path): os.truncate(path, self._index['day_count'] * self._index['slot_count'] * np.dtype(dtype).itemsize)
+        if os.path.exists(self._column_path('date')): os.truncate(self._column_path('date'), self._index['day_count'] * 8)
+
+    # Appends one trading day, quotes is {symbol: Yahoo quote dictionary}.  The days have to be appended in order.
+    def append_day(self, date = None, quotes = None):
+        last_date = self.get_last_date()
+        if last_date is not None and str(date) <= str(last_date): raise ValueError("{} is not after the last day in the price archive, {}.".format(date, last_date))
+
+        self._add_symbols(sorted(quotes))
+        self._truncate_files()
+
+        slot_count = self._index['slot_count']
+        for name, key, dtype in COLUMNS:
+            row = np.full(slot_count, _MISSING[dtype], dtype=dtype)
+            for symbol, quote in quotes.items(): row[self._slots[symbol]] = _value(quote, key, dtype)
+            with open(self._column_path(name), 'ab') as column_file:
+                row.tofile(column_file)
+                column_file.flush()
+                os.fsync(column_file.fileno())
+        with open(self._column_path('date'), 'ab') as date_file:
+            np.array([_day_number(date)], dtype='<i8').tofile(date_file)
+            date_file.flush()
+            os.fsync(date_file.fileno())
+
+        self._index['day_count'] += 1
+        self._save_index()
+
+    # Builds a new archive from quote lists in one go, quote_lists is {symbol: list of Yahoo quote dictionaries}.
+    # Much faster than appending day by day when converting years of history.
+    def build(self, quote_lists = None):
+        symbols = sorted(symbol for symbol, quote_list in quote_lists.items() if len(quote_list) > 0)
+        dates = sorted(set(quote['Date'] for symbol in symbols for quote in quote_lists[symbol]))
+        day_index = {date: i for i, date in enumerate(dates)}
+        slot_count = max(64, 1 << max(len(symbols) - 1, 0).bit_length())
+
+        first_days = []
+        for name, key, dtype in COLUMNS:
+            temp_path = self._column_path(name) + '.tmp'
+            table = np.memmap(temp_path, dtype=dtype, mode='w+', shape=(max(len(dates), 1), slot_count))
+            table[:] = _MISSING[dtype]
+            for slot, symbol in enumerate(symbols):
+                days = [day_index[quote['Date']] for quote in quote_lists[symbol]]
+                table[days, slot] = [_value(quote, key, dtype) for quote in quote_lists[symbol]]
+                if name == 'close': first_days.append(min(days))
+            table.flush()
+            del table
+            os.truncate(temp_path, len(dates) * slot_count * np.dtype(dtype).itemsize)
+            os.replace(temp_path, self._column_path(name))
+
+        temp_path = self._column_path('date') + '.tmp'
+        np.array([_day_number(date) for date in dates], dtype='<i8').tofile(temp_path)
+        os.replace(temp_path, self._column_path('date'))
+
+        self._index = { 'symbols': symbols, 'first_days': first_days, 'slot_count': slot_count, 'day_count': len(dates) }
+        self._slots = {symbol: slot for slot, symbol in enumerate(symbols)}
+        self._save_index()
+
+
+def main():
+    # build     converts the whole local price cache into a new archive.
+    # update    appends the days in the price cache that are newer than the last day in the archive.
+    parser = argparse.ArgumentParser(description="Builds and updates the memory mapped price archive from the local price cache.")
+    parser.add_argument('command', choices=('build', 'update'))
+    args = parser.parse_args()
+
+    price_cache = PriceCache(os.getenv('PRICE_CACHE_DIR', 'price_cache'))
+    archive = PriceArchive(os.getenv('PRICE_ARCHIVE_DIR', 'price_archive'))
+
+    if args.command == 'build':
+        quote_lists = {}
+        for k in price_cache.get_cached_symbols():
+            quote_lists[k] = price_cache.get_quotes(k, datetime.date.min, datetime.date.max)
+            price_cache.release(k)
+        archive.build(quote_lists)
+    else:
+        after = archive.get_last_date() or datetime.date.min
+        quotes_by_date = {}
+        for k in price_cache.get_cached_symbols():
+            for quote in price_cache.get_quotes(k, after + datetime.timedelta(days=1), datetime.date.max): quotes_by_date.setdefault(quote['Date'], {})[k] = quote
+            price_cache.release(k)
+        for date in sorted(quotes_by_date): archive.append_day(date, quotes_by_date[date])
+
+    print("The price archive has {} symbols and {} trading days up to {}.".format(len(archive.get_symbols()), archive.get_day_count(), archive.get_last_date()))
+
+
+if __name__ == "__main__": main()
@@ -0,0 +1,94 @@
+#!/usr/bin/python
+
+import datetime
+import json
+import logging
+import os
+
+
+    # Local on-disk store of the daily quotes we have already downloaded.
+    #
+    # There is one JSON file per stock symbol holding the Yahoo quote dictionaries keyed by date
+    # along with the date range that we have already asked Yahoo for.  Each night we only need to
+    # request the days after the last cached day and the Security object is built from the cached series.
+    ##################################################
+
+
+def parse_date(date_string = ''):
+    return datetime.datetime.strptime(date_string, '%Y-%m-%d').date()
+
+
+class PriceCache:
+    def __init__(self, cache_dir = 'price_cache'):
+        self._cache_dir = cache_dir
+        self._entries = {}
+
+        if not os.path.isdir(self._cache_dir): os.makedirs(self._cache_dir)
+
+    def _path(self, symbol = ''):
+        return os.path.join(self._cache_dir, "{}.json".format(symbol))
+
+    def _load(self, symbol = ''):
+        if symbol not in self._entries:
+            entry = { 'covered_from': None, 'covered_to': None, 'quotes': {} }
+            try:
+                with open(self._path(symbol)) as cache_file: entry = json.load(cache_file)
+            except FileNotFoundError: pass
+            except ValueError: logging.warn("The price cache for {} is corrupt, it will be downloaded again.".format(symbol))
+            self._entries[symbol] = entry
+        return self._entries[symbol]
+
+    def _save(self, symbol = ''):
+        # Write to a temporary file first so that a crash never leaves a half written cache file behind.
+        temp_path = self._path(symbol) + '.tmp'
+        with open(temp_path, 'w') as cache_file: json.dump(self._entries[symbol], cache_file)
+        os.replace(temp_path, self._path(symbol))
+
+    def get_last_cached_date(self, symbol = ''):
+        covered_to = self._load(symbol)['covered_to']
+        if covered_to is None: return None
+        return parse_date(covered_to)
+
+    # Works out which dates still have to be requested from Yahoo in order to cover start_date to end_date.
+    # Returns a (fetch_start, fetch_end) tuple or None if the cache already covers the whole range.
+    def get_missing_range(self, symbol = '', start_date = None, end_date = None):
+        entry = self._load(symbol)
+
+        # Nothing cached yet, or we need history from before what we have cached, so grab the whole range.
+        if entry['covered_from'] is None or start_date < parse_date(entry['covered_from']):
+            return (start_date, end_date)
+
+        last_cached_date = parse_date(entry['covered_to'])
+        if end_date > last_cached_date: return (last_cached_date + datetime.timedelta(days=1), end_date)
+
+        return None
+
+    # Merges newly downloaded quotes into the cache and records the range they covered.
+    def add_quotes(self, symbol = '', quote_list = None, fetch_start = None):
+        entry = self._load(symbol)
+
+        if quote_list:
+            for quote in quote_list: entry['quotes'][quote['Date']] = quote
+
+            # We only mark the cache as covered up to the last day Yahoo actually gave us.
+            # That way a day that hasn't been published yet gets requested again on the next run.
+            last_quote_date = max(quote['Date'] for quote in quote_list)
+            if entry['covered_to'] is None or last_quote_date > entry['covered_to']: entry['covered_to'] = last_quote_date
+
+            if entry['covered_from'] is None or str(fetch_start) < entry['covered_from']: entry['covered_from'] = str(fetch_start)
+
+            self._save(symbol)
+
+    # Returns the cached quote dictionaries between start_date and end_date inclusive, sorted by date.
+    def get_quotes(self, symbol = '', start_date = None, end_date = None):
+        quotes = self._load(symbol)['quotes']
+        first, last = str(start_date), str(end_date)
+        return [quotes[d] for d in sorted(quotes) if first <= d <= last]
+
+    # Every symbol that has a cache file.
+    def get_cached_symbols(self):
+        return sorted(name[:-len('.json')] for name in os.listdir(self._cache_dir) if name.endswith('.json'))
+
+    # Drops the in memory copy of a symbol once we are done with it so the cache doesn't grow with the universe.
+    def release(self, symbol = ''):
+        self._entries.pop(symbol, None)
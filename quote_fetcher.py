@@ -0,0 +1,111 @@
+#!/usr/bin/python
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from fetch_client import FetchClient
+
+
+    # Fetch layer for the historical quote requests.
+    #
+    # Instead of requesting one symbol at a time and sleeping between requests we
+    # group the symbols into batches (see quote_sources.py) and hand the batch requests
+    # to a pool of worker threads.  The pool size caps how many requests are in flight
+    # at once and a shared token bucket caps the overall request rate so we stay under
+    # Yahoo's limit of 2000 requests per hour.
+    ##################################################
+
+
+class TokenBucket:
+    # rate is the number of tokens added per second and capacity is the largest burst we allow.
+    # A rate of zero (or less) turns the limiter off.
+    def __init__(self, rate = 0.0, capacity = 1):
+        self._rate = float(rate)
+        self._capacity = float(max(capacity, 1))
+        self._tokens = self._capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._last_refill) * self._rate)
+        self._last_refill = now
+
+    # Blocks until a token is available and then takes it.
+    def acquire(self):
+        if self._rate <= 0: return
+
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self._rate
+            time.sleep(wait_time)
+
+    def get_rate(self):
+        return self._rate
+
+
+class SymbolResult:
+    # The outcome of a batch request for one of its symbols.
+    # result() returns the symbol's quote list (None if the source had nothing for it) or raises whatever the batch request raised.
+    def __init__(self, quote_list = None, error = None):
+        self._quote_list = quote_list
+        self._error = error
+
+    def result(self):
+        if self._error is not None: raise self._error
+        return self._quote_list
+
+    # True when the whole batch failed, which says nothing about this symbol itself.
+    def is_batch_error(self):
+        return self._error is not None
+
+
+class QuoteFetcher:
+    # client is the shared FetchClient, by default one with a connection pool the size of max_concurrency.
+    def __init__(self, source = None, max_concurrency = 8, requests_per_second = 0.0, burst = 1, client = None):
+        self._source = source
+        self._max_concurrency = max(int(max_concurrency), 1)
+        self._rate_limiter = TokenBucket(requests_per_second, burst)
+        self._client = client or FetchClient(self._max_concurrency)
+
+    # The client takes a token from the rate limiter for each attempt, not just once per batch.
+    def _fetch_batch(self, symbols = (), start_date = None, end_date = None):
+        payload = self._client.get_json(self._source.build_query(symbols, start_date, end_date), self._source.is_valid_response, self._rate_limiter)
+        return self._source.split_response(payload, symbols)
+
+    # Groups the symbols that share a date range into batches of the source's batch size.
+    def _make_batches(self, symbol_ranges = ()):
+        by_range = {}
+        for symbol, start_date, end_date in symbol_ranges:
+            by_range.setdefault((start_date, end_date), []).append(symbol)
+
+        batch_size = self._source.get_batch_size()
+        for (start_date, end_date), symbols in by_range.items():
+            for i in range(0, len(symbols), batch_size):
+                yield symbols[i:i + batch_size], start_date, end_date
+
+    # symbol_ranges is an iterable of (symbol, start_date, end_date) tuples.
+    # This is a generator that yields (symbol, SymbolResult) pairs as the batch requests finish,
+    # so the caller can keep its own error handling around each symbol.
+    def fetch_all(self, symbol_ranges = ()):
+        with ThreadPoolExecutor(max_workers=self._max_concurrency) as executor:
+            pending = {}
+            for symbols, start_date, end_date in self._make_batches(symbol_ranges):
+                pending[executor.submit(self._fetch_batch, symbols, start_date, end_date)] = symbols
+
+            logging.info("Submitted {} batch quote requests with {} workers at {} requests per second.".format(len(pending), self._max_concurrency, self._rate_limiter.get_rate() or 'unlimited'))
+
+            for future in as_completed(pending):
+                try:
+                    quotes_by_symbol = future.result()
+                except Exception as e:
+                    for symbol in pending[future]: yield symbol, SymbolResult(error=e)
+                    continue
+
+                for symbol in pending[future]: yield symbol, SymbolResult(quotes_by_symbol.get(symbol))
@@ -0,0 +1,57 @@
+#!/usr/bin/python
+
+import urllib.parse
+
+
+    # Price sources for the quote fetcher.
+    #
+    # A source knows how to build one request for a batch of symbols that share a date range
+    # and how to split the combined response back into a quote list per symbol.  The quote lists
+    # are the same dictionaries the Security object has always been built from.
+    #
+    # To add another provider write a class with the same methods (get_batch_size, build_query,
+    # is_valid_response and split_response) and hand it to the QuoteFetcher.
+    ##################################################
+
+
+class YahooYQLSource:
+    # The YQL historicaldata table takes a list of symbols with "symbol in (...)".
+    # The symbol list (###), start date (SSSS) and end date (EEEE) are filled in for each batch.
+    query_url = 'https://query.yahooapis.com/v1/public/yql?q=select%20*%20from%20yahoo.finance.historicaldata%20where%20symbol%20in%20(###)%20and%20startDate%20%3D%20%22SSSS%22%20and%20endDate%20%3D%20%22EEEE%22&format=json&diagnostics=true&env=store%3A%2F%2Fdatatables.org%2Falltableswithkeys&callback='
+
+    def __init__(self, batch_size = 20):
+        self._batch_size = max(int(batch_size), 1)
+
+    def get_batch_size(self):
+        return self._batch_size
+
+    def build_query(self, symbols = (), start_date = None, end_date = None):
+        symbol_list = urllib.parse.quote(','.join('"{}"'.format(symbol) for symbol in symbols))
+        return self.query_url.replace('###', symbol_list).replace('SSSS', str(start_date)).replace('EEEE', str(end_date))
+
+    # Anything without a 'query' dictionary isn't a YQL response, so the fetch client retries it.
+    def is_valid_response(self, payload = None):
+        return isinstance(payload, dict) and isinstance(payload.get('query'), dict)
+
+    # Splits the parsed response for a batch into a dictionary of symbol -> quote list.
+    # Symbols that Yahoo didn't return anything for map to None.
+    #
+    # The YQL request returns a dictionary object of one entry 'query' and we are interested in its results
+    # dictionary which has a 'quote' key where the value is a list of dictionaries, one per symbol per trading day.
+    def split_response(self, payload = None, symbols = ()):
+        quotes_by_symbol = {symbol: None for symbol in symbols}
+
+        results_dict = payload['query']['results']
+        if results_dict is None: return quotes_by_symbol
+
+        quote_list = results_dict['quote']
+
+        # When a query only returns one trading day Yahoo returns a single dictionary instead of a list.
+        if isinstance(quote_list, dict): quote_list = [quote_list]
+
+        for quote in quote_list:
+            symbol = quote['Symbol']
+            if quotes_by_symbol.get(symbol) is None: quotes_by_symbol[symbol] = []
+            quotes_by_symbol[symbol].append(quote)
+
+        return quotes_by_symbol
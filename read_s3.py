@@ -2,6 +2,9 @@
 import boto3
 import datetime
 
+from input_loader import InputLoader
+from universe import load_universe
+
 
 
 
@@ -20,9 +23,11 @@ def main():
     results_file = 'results_2016-07-14.log'
     
     s3 = boto3.resource('s3')
-    bucket = s3.Bucket('rodell-screener-output')
-    s3_file = bucket.Object('NASDAQ.csv')
-    s3_file.download_file('NASDAQ.csv')
+    
+    # NASDAQ.csv comes from the output bucket like it always has, through the input loader so it is only
+    # downloaded when it has changed.  INPUT_BUCKET or INPUT_DIR point it somewhere else.
+    the_stocks = load_universe(('NASDAQ.csv',), None, True, InputLoader.from_environment('rodell-screener-output'))
+    print("Read {} stocks from NASDAQ.csv.".format(len(the_stocks)))
 
     s3.Object('rodell-screener-output', results_file).upload_file(results_file)        
     
@@ -1,75 +1,28 @@
 from __future__ import print_function # Python 2/3 compatibility
-import boto3
+import argparse
 
-dynamodb = boto3.resource('dynamodb', region_name='us-west-2', endpoint_url="http://localhost:8000")
-#dynamodb = boto3.resource('dynamodb', region_name='us-east-1', endpoint_url="http://dynamodb.us-east-1.amazonaws.com")
+from trend_store import open_trend_store
+
+# Drops and recreates the Current_Trend and Trend_History tables.
+# It resets the local store the screener uses in DEV (see trend_store.py): the SQLite database unless
+# TREND_STORE=dynamodb points it at DynamoDB Local.  ENV is ignored, so a shell left with ENV=PROD can't
+# wipe production by accident.  Resetting the production tables takes --prod and typing PROD at the prompt.
 #
-# Interesting thing to note is that when you create the tables you only define the keys.  Not the other attributes.
+# Interesting thing to note is that when you create the DynamoDB tables you only define the keys.  Not the other attributes.
 #
-
-current_trend_table = dynamodb.Table('Current_Trend')
-current_trend_table.delete()
-
-
-trend_history_table = dynamodb.Table('Trend_History')
-trend_history_table.delete()
-
-print("Tables Deleted.")
-
-
-
-# There is one entry per stock symbol in this table.
-new_current_trend_table = dynamodb.create_table(
-    TableName='Current_Trend',
-    KeySchema=[
-        {
-            'AttributeName': 'stock_symbol',
-            'KeyType': 'HASH'  #Partition key
-        },
-    ],
-    AttributeDefinitions=[
-        {         
-            'AttributeName': 'stock_symbol',
-            'AttributeType': 'S'
-        }
-
-    ],
-    ProvisionedThroughput={
-        'ReadCapacityUnits': 50,
-        'WriteCapacityUnits': 50
-    }
-)
-
-print("Current Trend Table status:", new_current_trend_table.table_status)
-
-# There will be many entries per stock symbol in this table.
-new_trend_history_table = dynamodb.create_table(
-    TableName='Trend_History',
-    KeySchema=[
-        {
-            'AttributeName': 'stock_symbol',
-            'KeyType': 'HASH'  #Partition key
-        },
-        {
-            'AttributeName': 'occurence_date',
-            'KeyType': 'RANGE'  #Partition key
-        },        
-    ],
-    AttributeDefinitions=[
-        {         
-            'AttributeName': 'stock_symbol',
-            'AttributeType': 'S'
-        },   
-        {
-            'AttributeName': 'occurence_date',
-            'AttributeType': 'S'
-        },
-    ],
-    ProvisionedThroughput={
-        'ReadCapacityUnits': 50,
-        'WriteCapacityUnits': 50
-    }
-)
-
-print("Trend History Table status:", new_trend_history_table.table_status)
-
+parser = argparse.ArgumentParser(description="Drops and recreates the Current_Trend and Trend_History tables.")
+parser.add_argument('--prod', action='store_true', help="Reset the production tables instead of the local ones, asks for confirmation.")
+args = parser.parse_args()
+
+environment = 'DEV'
+if args.prod:
+    if input("This deletes all of the production trend data.  Type PROD to go ahead: ").strip() != 'PROD':
+        print("Nothing was reset.")
+        raise SystemExit(1)
+    environment = 'PROD'
+
+trend_store = open_trend_store(environment)
+trend_store.reset()
+trend_store.close()
+
+print("Tables Reset.")
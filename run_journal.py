@@ -0,0 +1,120 @@
+#!/usr/bin/python
+
+import json
+import logging
+import os
+
+from screen_results import ScreenResult
+
+
+    # Checkpoint journal for a screening run.
+    #
+    # Every checkpoint appends one JSON line to the journal holding the symbols that were finished
+    # since the last checkpoint, what they added to the run's ScreenResult (notifications, trend
+    # counts, errors and unfetched stocks) and the trend items they save.  The trend items are held
+    # back until their checkpoint is written, so the db never has a change the journal doesn't know
+    # about and a resumed run makes the same new/existing trend decisions as the run that died.
+    #
+    # When a crashed run is started again with --resume the journal is replayed: the trend items are
+    # saved again (saving an item twice is harmless), the finished symbols are skipped and the
+    # accumulated results are rebuilt, so the results page comes out the same as if the run had
+    # never stopped.
+    ##################################################
+
+
+class RunJournal:
+    # checkpoint_every is the number of finished symbols after which mark_complete asks for a checkpoint.
+    def __init__(self, path = '', resume = False, checkpoint_every = 250):
+        self._path = path
+        self._checkpoint_every = max(int(checkpoint_every), 1)
+        self._completed = set()
+        self._pending = []
+        self._pending_current_trend_items = []
+        self._pending_trend_history_items = []
+        self._records = []
+
+        if resume:
+            try:
+                with open(self._path) as journal_file:
+                    for line in journal_file:
+                        try: record = json.loads(line)
+                        except ValueError:
+                            # Only the line that was being written when the run died can be cut short.
+                            logging.warn("Skipping an incomplete checkpoint at the end of {}.".format(self._path))
+                            break
+                        self._records.append(record)
+                        self._completed.update(record['completed'])
+                logging.info("Resuming from {} with {} stocks already finished.".format(self._path, len(self._completed)))
+            except FileNotFoundError: logging.info("There is no journal at {} to resume from, starting from the beginning.".format(self._path))
+
+        # Rewrite the journal with just the good checkpoints, that also drops a half written last line.
+        temp_path = self._path + '.tmp'
+        with open(temp_path, 'w') as journal_file:
+            for record in self._records: print(json.dumps(record), file=journal_file)
+        os.replace(temp_path, self._path)
+        self._journal_file = open(self._path, 'a')
+
+        # What has been written to the journal so far, checkpoints only write what was added since.
+        self._saved = self.replay()
+
+    # Rebuilds the accumulated results of the finished symbols.
+    def replay(self, label = ''):
+        result = ScreenResult(label)
+        for record in self._records: result.merge(ScreenResult.from_dict(record))
+        return result
+
+    # Returns the (current_trend_items, trend_history_items) saved by the finished symbols.
+    def get_trend_items(self):
+        current_trend_items, trend_history_items = [], []
+        for record in self._records:
+            current_trend_items.extend(record['current_trend_items'])
+            trend_history_items.extend(record['trend_history_items'])
+        return current_trend_items, trend_history_items
+
+    # Holds trend items back until the next checkpoint.
+    def add_trend_items(self, current_trend_items = (), trend_history_items = ()):
+        self._pending_current_trend_items.extend(current_trend_items)
+        self._pending_trend_history_items.extend(trend_history_items)
+
+    def is_complete(self, symbol = ''):
+        return symbol in self._completed
+
+    # Records that a symbol is finished, returns True when it is time for a checkpoint.
+    def mark_complete(self, symbol = ''):
+        self._completed.add(symbol)
+        self._pending.append(symbol)
+        return len(self._pending) >= self._checkpoint_every
+
+    # Appends the symbols finished since the last checkpoint and what they added to result.
+    # Returns the (current_trend_items, trend_history_items) that can now be saved to the db.
+    def checkpoint(self, result = None):
+        if len(self._pending) == 0: return [], []
+
+        saved_notifications = len(self._saved.get_notifications())
+        saved_errors = self._saved.get_error_counter()
+        record = {
+            'label': result.get_label(),
+            'completed': self._pending,
+            'notifications': [stock.to_dict() for stock in result.get_notifications()[saved_notifications:]],
+            'up_trend_count': result.get_up_trend_count() - self._saved.get_up_trend_count(),
+            'down_trend_count': result.get_down_trend_count() - self._saved.get_down_trend_count(),
+            'error_counter': {error_type: count - saved_errors.get(error_type, 0) for error_type, count in result.get_error_counter().items()},
+            'unfetched_stocks': result.get_unfetched_stocks()[len(self._saved.get_unfetched_stocks()):],
+            'current_trend_items': self._pending_current_trend_items,
+            'trend_history_items': self._pending_trend_history_items
+        }
+
+        # fsync so the checkpoint survives the machine going away, not just the process.
+        print(json.dumps(record), file=self._journal_file)
+        self._journal_file.flush()
+        os.fsync(self._journal_file.fileno())
+
+        self._records.append(record)
+        self._saved.merge(ScreenResult.from_dict(record))
+        self._pending = []
+        self._pending_current_trend_items = []
+        self._pending_trend_history_items = []
+        return record['current_trend_items'], record['trend_history_items']
+
+    def close(self):
+        self._journal_file.close()
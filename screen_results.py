@@ -0,0 +1,181 @@
+#!/usr/bin/python
+
+import json
+import zlib
+
+
+    # Results of screening one shard of the stock universe.
+    #
+    # The universe can be split into shards that are screened by separate worker processes on
+    # one machine or by separate machines (see main() in historical_price_screener.py).  Each shard
+    # hands back a ScreenResult holding everything the results page needs, the notified stocks,
+    # the up/down trend counts and the error counts, and the coordinator merges them into one page.
+    # Results are plain data so they can be pickled between processes or saved as JSON between machines.
+    ##################################################
+
+
+# crc32 rather than hash() since Python salts string hashes per process and the shards have to be the same everywhere.
+def _symbol_hash(symbol = ''):
+    return zlib.crc32(symbol.encode('utf-8'))
+
+
+# Returns the symbols that belong to shard shard_index of shard_count, keeping their order.
+# A symbol always lands in the same shard so the per shard indicator state stays valid from run to run.
+# stride is the number of shards the symbols were already split into, pass it when splitting a shard again
+# (e.g. a machine's shard across its worker processes) so the second split isn't lopsided.
+def shard_symbols(symbols = (), shard_index = 0, shard_count = 1, stride = 1):
+    if shard_count <= 1: return list(symbols)
+    return [symbol for symbol in symbols if (_symbol_hash(symbol) // stride) % shard_count == shard_index]
+
+
+class NotifiedStock:
+    # The values the results page shows for a stock that threw a signal.
+    # The getters match the Security ones so the report reads either.
+    # This is all a run keeps of a notified stock, the Security and its price history are let go as soon as the
+    # stock is screened.  __slots__ keeps each record to a few fixed fields so a busy day with thousands of
+    # notifications stays small.
+    __slots__ = ('_symbol', '_volume', '_close', '_yesterday_volume', '_yesterday_close', '_chaikin_money_flow', '_trend_type')
+
+    def __init__(self, symbol = '', volume = 0, close = 0.0, yesterday_volume = 0, yesterday_close = 0.0, chaikin_money_flow = 0.0, trend_type = ''):
+        self._symbol = symbol
+        self._volume = volume
+        self._close = close
+        self._yesterday_volume = yesterday_volume
+        self._yesterday_close = yesterday_close
+        self._chaikin_money_flow = chaikin_money_flow
+        self._trend_type = trend_type
+
+    @classmethod
+    def from_security(cls, security = None, trend_type = ''):
+        return cls(security.get_symbol(), security.get_volume(), security.get_close(), security.get_yesterday_volume(), security.get_yesterday_close(), security.get_chaikin_money_flow(), trend_type)
+
+    @classmethod
+    def from_dict(cls, record = None):
+        return cls(record['symbol'], record['volume'], record['close'], record['yesterday_volume'], record['yesterday_close'], record['chaikin_money_flow'], record['trend_type'])
+
+    def to_dict(self):
+        return {
+            'symbol': self._symbol,
+            'volume': self._volume,
+            'close': self._close,
+            'yesterday_volume': self._yesterday_volume,
+            'yesterday_close': self._yesterday_close,
+            'chaikin_money_flow': self._chaikin_money_flow,
+            'trend_type': self._trend_type
+        }
+
+    def get_symbol(self):
+        return self._symbol
+
+    def get_volume(self):
+        return self._volume
+
+    def get_close(self):
+        return self._close
+
+    def get_yesterday_volume(self):
+        return self._yesterday_volume
+
+    def get_yesterday_close(self):
+        return self._yesterday_close
+
+    def get_chaikin_money_flow(self):
+        return self._chaikin_money_flow
+
+    def get_trend_type(self):
+        return self._trend_type
+
+
+class ScreenResult:
+    def __init__(self, label = ''):
+        self._label = label
+        # symbol -> NotifiedStock, in the order the stocks were first notified.  A later notification for the
+        # same stock (e.g. a signal and a new trend on the same day) replaces the earlier one but keeps its place.
+        self._notifications = {}
+        self._up_trend_count = 0
+        self._down_trend_count = 0
+        self._error_counter = { 'Connection Error' : 0, 'Type Error' : 0, 'Index Error' : 0, 'Other Error' : 0 }
+        self._unfetched_stocks = []
+        # Stocks the negative cache skipped without a request.
+        self._skipped_stocks = []
+
+    def add_notification(self, stock = None):
+        self._notifications[stock.get_symbol()] = stock
+
+    def add_up_trend(self):
+        self._up_trend_count += 1
+
+    def add_down_trend(self):
+        self._down_trend_count += 1
+
+    def add_error(self, error_type = ''):
+        self._error_counter[error_type] = self._error_counter.get(error_type, 0) + 1
+        return self._error_counter[error_type]
+
+    def add_unfetched_stock(self, symbol = ''):
+        self._unfetched_stocks.append(symbol)
+
+    def add_skipped_stock(self, symbol = ''):
+        self._skipped_stocks.append(symbol)
+
+    # Folds another shard's results into this one.
+    def merge(self, other = None):
+        for stock in other.get_notifications(): self.add_notification(stock)
+        self._up_trend_count += other.get_up_trend_count()
+        self._down_trend_count += other.get_down_trend_count()
+        for error_type, count in other.get_error_counter().items():
+            self._error_counter[error_type] = self._error_counter.get(error_type, 0) + count
+        self._unfetched_stocks.extend(other.get_unfetched_stocks())
+        self._skipped_stocks.extend(other.get_skipped_stocks())
+        return self
+
+    def to_dict(self):
+        return {
+            'label': self._label,
+            'notifications': [stock.to_dict() for stock in self._notifications.values()],
+            'up_trend_count': self._up_trend_count,
+            'down_trend_count': self._down_trend_count,
+            'error_counter': self._error_counter,
+            'unfetched_stocks': self._unfetched_stocks,
+            'skipped_stocks': self._skipped_stocks
+        }
+
+    @classmethod
+    def from_dict(cls, record = None):
+        result = cls(record['label'])
+        for stock_record in record['notifications']: result.add_notification(NotifiedStock.from_dict(stock_record))
+        result._up_trend_count = record['up_trend_count']
+        result._down_trend_count = record['down_trend_count']
+        result._error_counter = record['error_counter']
+        result._unfetched_stocks = record['unfetched_stocks']
+        result._skipped_stocks = record.get('skipped_stocks', [])
+        return result
+
+    def save(self, path = ''):
+        with open(path, 'w') as result_file: json.dump(self.to_dict(), result_file)
+
+    @classmethod
+    def load(cls, path = ''):
+        with open(path) as result_file: return cls.from_dict(json.load(result_file))
+
+    def get_label(self):
+        return self._label
+
+    # The NotifiedStocks in the order they were first notified.
+    def get_notifications(self):
+        return list(self._notifications.values())
+
+    def get_up_trend_count(self):
+        return self._up_trend_count
+
+    def get_down_trend_count(self):
+        return self._down_trend_count
+
+    def get_error_counter(self):
+        return self._error_counter
+
+    def get_unfetched_stocks(self):
+        return self._unfetched_stocks
+
+    def get_skipped_stocks(self):
+        return self._skipped_stocks
@@ -0,0 +1,268 @@
+#!/usr/bin/python
+
+import ast
+import configparser
+import operator
+import os
+import re
+
+import numpy as np
+
+from indicator_engine import build_price_matrices, cmf_series, ema_series, latest_sma
+
+
+    # Screening rules from a config file.
+    #
+    # Each section of the screens file (SCREENS_FILE, default the screens.ini next to this file) is one screen:
+    #
+    #    [heavy volume reversal]
+    #    type = signal
+    #    min_volume = 250000
+    #    rule = volume >= {min_volume} and 5 <= close <= 20 and close > yesterday_close
+    #
+    # The rule is a Python style expression over indicator names with and/or/not, comparisons
+    # (chained ones too), + - * / and numbers.  The names are close, high, low, volume,
+    # yesterday_close, yesterday_volume and smaN, emaN and cmfN for any period N.
+    #
+    # Any other setting of a section is a parameter that the rule uses as {name}, the ones in the
+    # [DEFAULT] section apply to every screen.  The parameter sweep (sweep.py) tries other values for
+    # them, so the screens file is the only place the rules are written down.
+    #
+    # Each rule is compiled once into a function over indicator arrays, so a screen is evaluated for
+    # the whole universe in a few array operations and adding screens costs next to nothing next to
+    # calculating the indicators.  The compiler also works out which indicators the rules use and how
+    # many trading days of history they need.
+    #
+    # There are two types of screen.  The 'up' and 'down' trend screens drive Current_Trend the way
+    # they always have.  A signal screen saves a Trend_History entry and a notification named after
+    # the section every day it matches, and gets its own section in the results page unless report = no.
+    # The signals are saved in file order so a later one replaces an earlier one on the same day.
+    # enabled = no keeps a screen in the file without running it.
+    ##################################################
+
+
+PRICE_COLUMNS = ('close', 'high', 'low', 'volume', 'yesterday_close', 'yesterday_volume')
+INDICATOR_PATTERN = re.compile(r'^(sma|ema|cmf)(\d+)$')
+
+# The screens file that comes with the screener.
+DEFAULT_SCREENS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'screens.ini')
+
+# The settings of a section that aren't rule parameters.
+SCREEN_SETTINGS = ('type', 'rule', 'enabled', 'report')
+
+_COMPARISONS = { ast.Gt: operator.gt, ast.GtE: operator.ge, ast.Lt: operator.lt, ast.LtE: operator.le, ast.Eq: operator.eq, ast.NotEq: operator.ne }
+_ARITHMETIC = { ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv }
+
+
+# Trading days of history an indicator needs before it has a value.
+def indicator_lookback(name = ''):
+    if name.startswith('yesterday_'): return 2
+    match = INDICATOR_PATTERN.match(name)
+    if match is None: return 1
+    # The EMA is seeded with the SMA of its first period days and needs at least one more day after that.
+    if match.group(1) == 'ema': return int(match.group(2)) + 1
+    return int(match.group(2))
+
+
+class CompiledRule:
+    def __init__(self, expression = ''):
+        self._expression = expression
+        self._indicators = set()
+
+        try: tree = ast.parse(expression.strip(), mode='eval')
+        except SyntaxError as se: raise ValueError("Can't parse the rule {}: {}".format(expression, se))
+        self._evaluate = self._compile(tree.body)
+
+        if len(self._indicators) == 0: raise ValueError("The rule {} doesn't use any indicators.".format(expression))
+
+    # Turns the syntax tree into nested functions that take a dictionary of indicator name -> array.
+    def _compile(self, node = None):
+        if isinstance(node, ast.BoolOp):
+            parts = [self._compile(value) for value in node.values]
+            combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            def evaluate_bool(values):
+                result = parts[0](values)
+                for part in parts[1:]: result = combine(result, part(values))
+                return result
+            return evaluate_bool
+
+        if isinstance(node, ast.Compare):
+            # a < b < c is (a < b) and (b < c), like in Python.
+            operands = [self._compile(node.left)] + [self._compile(comparator) for comparator in node.comparators]
+            comparisons = []
+            for op in node.ops:
+                if type(op) not in _COMPARISONS: raise ValueError("{} isn't allowed in the rule {}.".format(type(op).__name__, self._expression))
+                comparisons.append(_COMPARISONS[type(op)])
+            def evaluate_compare(values):
+                sides = [operand(values) for operand in operands]
+                result = comparisons[0](sides[0], sides[1])
+                for i in range(1, len(comparisons)): result = np.logical_and(result, comparisons[i](sides[i], sides[i + 1]))
+                return result
+            return evaluate_compare
+
+        if isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC:
+            left, right, op = self._compile(node.left), self._compile(node.right), _ARITHMETIC[type(node.op)]
+            return lambda values: op(left(values), right(values))
+
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            operand = self._compile(node.operand)
+            return lambda values: np.logical_not(operand(values))
+
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            operand = self._compile(node.operand)
+            return lambda values: np.negative(operand(values))
+
+        if isinstance(node, ast.Name):
+            name = node.id
+            if name not in PRICE_COLUMNS and INDICATOR_PATTERN.match(name) is None:
+                raise ValueError("Unknown indicator {} in the rule {}.".format(name, self._expression))
+            self._indicators.add(name)
+            return lambda values: values[name]
+
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            number = node.value
+            return lambda values: number
+
+        raise ValueError("{} isn't allowed in the rule {}.".format(type(node).__name__, self._expression))
+
+    # values is a dictionary of indicator name -> array, all of the same shape.
+    # Days where an indicator is NaN never match.
+    def evaluate(self, values = None):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.asarray(self._evaluate(values), dtype=bool)
+
+    def get_expression(self):
+        return self._expression
+
+    def get_indicators(self):
+        return self._indicators
+
+    def get_lookback(self):
+        return max(indicator_lookback(name) for name in self._indicators)
+
+
+class Screen:
+    # rule can use the parameters as {name}, see with_parameters for trying other values.
+    def __init__(self, name = '', screen_type = 'signal', rule = '', enabled = True, report = True, parameters = None):
+        self._name = name
+        self._type = screen_type
+        self._template = rule
+        self._parameters = dict(parameters or {})
+        self._enabled = enabled
+        self._report = report
+
+        try: expression = rule.format_map(self._parameters)
+        except KeyError as ke: raise ValueError("The rule of the screen {} uses the parameter {} but the screen doesn't set it.".format(name, ke))
+        self._rule = CompiledRule(expression)
+
+    # A copy of the screen with some of its parameters changed, the ones it doesn't have are ignored.
+    def with_parameters(self, overrides = None):
+        parameters = dict(self._parameters)
+        parameters.update((name, value) for name, value in overrides.items() if name in parameters)
+        return Screen(self._name, self._type, self._template, self._enabled, self._report, parameters)
+
+    def evaluate(self, values = None):
+        return self._rule.evaluate(values)
+
+    def get_name(self):
+        return self._name
+
+    def get_type(self):
+        return self._type
+
+    def get_rule(self):
+        return self._rule
+
+    def get_parameters(self):
+        return self._parameters
+
+    def is_enabled(self):
+        return self._enabled
+
+    def is_reported(self):
+        return self._report
+
+
+class ScreenSet:
+    def __init__(self, screens = ()):
+        self._screens = list(screens)
+
+        trend_names = sorted(s.get_name() for s in self._screens if s.get_type() == 'trend')
+        if trend_names != ['down', 'up']: raise ValueError("There have to be exactly two trend screens, 'up' and 'down'.")
+
+    # include_disabled also returns the screens switched off with enabled = no, the backfill and backtester can ask for them.
+    def get_signals(self, include_disabled = False):
+        return [s for s in self._screens if s.get_type() == 'signal' and (include_disabled or s.is_enabled())]
+
+    def get_trend(self, name = 'up'):
+        return [s for s in self._screens if s.get_type() == 'trend' and s.get_name() == name][0]
+
+    def get_active_screens(self, include_disabled = False):
+        return [self.get_trend('up'), self.get_trend('down')] + self.get_signals(include_disabled)
+
+    # The indicator names the active rules use.
+    def get_indicators(self, include_disabled = False):
+        names = set()
+        for screen in self.get_active_screens(include_disabled): names |= screen.get_rule().get_indicators()
+        return sorted(names)
+
+    # The trading days of history the active rules need.
+    def get_lookback(self, include_disabled = False):
+        return max(screen.get_rule().get_lookback() for screen in self.get_active_screens(include_disabled))
+
+    # The parameters the screens use and their values, a parameter the screens give different values is left out.
+    def get_parameters(self):
+        parameters, conflicting = {}, set()
+        for screen in self._screens:
+            for name, value in screen.get_parameters().items():
+                if name in parameters and parameters[name] != value: conflicting.add(name)
+                parameters[name] = value
+        return {name: value for name, value in parameters.items() if name not in conflicting}
+
+    # A copy of the screens with parameters changed in every screen that has them.
+    def with_parameters(self, overrides = None):
+        known = set()
+        for screen in self._screens: known.update(screen.get_parameters())
+        unknown = sorted(set(overrides) - known)
+        if len(unknown) > 0: raise ValueError("None of the screens have the parameters {}.".format(', '.join(unknown)))
+        return ScreenSet(screen.with_parameters(overrides) for screen in self._screens)
+
+
+# Reads the screens file.
+def load_screens(path = DEFAULT_SCREENS_FILE):
+    config = configparser.ConfigParser(interpolation=None)
+    if len(config.read(path)) == 0: raise FileNotFoundError("There is no screens file at {}.".format(path))
+
+    screens = []
+    for name in config.sections():
+        section = config[name]
+        screen_type = section.get('type', 'signal')
+        if screen_type not in ('trend', 'signal'): raise ValueError("The screen {} has an unknown type {}, use trend or signal.".format(name, screen_type))
+        parameters = {key: section[key] for key in section if key not in SCREEN_SETTINGS}
+        screens.append(Screen(name, screen_type, section['rule'], section.getboolean('enabled', True), section.getboolean('report', True), parameters))
+    return ScreenSet(screens)
+
+
+# The latest value of each named indicator for every security, as arrays that line up with securities.
+# known holds arrays that have already been calculated (e.g. the saved indicator state), the rest are
+# calculated here for all of the securities at once.
+def latest_indicator_values(names = (), securities = (), known = None):
+    values = {}
+    matrices = None
+    for name in names:
+        if known is not None and name in known: values[name] = np.asarray(known[name], dtype=float)
+        elif name == 'close': values[name] = np.array([s.get_close() for s in securities], dtype=float)
+        elif name == 'volume': values[name] = np.array([s.get_volume() for s in securities], dtype=float)
+        elif name == 'yesterday_close': values[name] = np.array([s.get_yesterday_close() for s in securities], dtype=float)
+        elif name == 'yesterday_volume': values[name] = np.array([s.get_yesterday_volume() for s in securities], dtype=float)
+        elif name == 'high': values[name] = np.array([s.get_highs()[-1] for s in securities], dtype=float)
+        elif name == 'low': values[name] = np.array([s.get_lows()[-1] for s in securities], dtype=float)
+        else:
+            if matrices is None: matrices = build_price_matrices(securities)
+            closes, highs, lows, volumes, lengths = matrices
+            kind, period = INDICATOR_PATTERN.match(name).group(1), int(INDICATOR_PATTERN.match(name).group(2))
+            if len(securities) == 0: values[name] = np.zeros(0)
+            elif kind == 'sma': values[name] = latest_sma(closes, lengths, period)
+            elif kind == 'ema': values[name] = np.nan_to_num(ema_series(closes, lengths, period)[:, -1])
+            else: values[name] = np.nan_to_num(cmf_series(highs, lows, closes, volumes, lengths, period)[0][:, -1])
+    return values
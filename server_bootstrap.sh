@@ -8,6 +8,7 @@ sudo yum -y install dos2unix
 sudo pip install boto3
 sudo pip install botocore
 sudo pip install requests
+sudo pip install numpy
 cd /home/ec2-user
 git init
 git clone https://github.com/alirodell/screener.git
@@ -0,0 +1,122 @@
+#!/usr/bin/python
+
+import numpy as np
+
+from indicator_engine import cmf_series, cumulative_sums, ema_series, sma_series
+from screen_rules import INDICATOR_PATTERN
+
+
+    # The screens over a whole date range.
+    #
+    # The nightly run evaluates the screens (see screen_rules.py) on one value per stock, the latest
+    # trading day.  The backfill, the backtester and the parameter sweep evaluate the same screens on
+    # (symbols x days) matrices to cover a whole date range at once.  Comparisons against NaN are False
+    # so days without enough history never throw a signal.
+    ##################################################
+
+
+# Replays the nightly Current_Trend bookkeeping along the days (axis 1) of up/down signal matrices.
+# Returns (new_up_trends, new_down_trends), the days that get an 'up' or 'down' Trend_History entry.
+#
+# Like the nightly run: an up signal is a new trend unless the stock was already in an up-trend, a day
+# without either signal leaves the trend alone, and a down signal only gets a history entry when the
+# stock had no trend at all before.  A flip from up to down only updates Current_Trend (save_down_trend(k, False)).
+def new_trend_signals(up_signals = None, down_signals = None):
+    n_rows, width = up_signals.shape
+    codes = np.where(up_signals, 1, np.where(down_signals, -1, 0))
+
+    # Carry the last signal forward over the days without one.
+    last_signal_col = np.where(codes != 0, np.arange(width)[None, :], 0)
+    np.maximum.accumulate(last_signal_col, axis=1, out=last_signal_col)
+    trends = np.take_along_axis(codes, last_signal_col, axis=1)
+
+    previous_trends = np.zeros((n_rows, width), dtype=trends.dtype)
+    previous_trends[:, 1:] = trends[:, :-1]
+
+    return (codes == 1) & (previous_trends != 1), (codes == -1) & (previous_trends == 0)
+
+
+class SignalSeries:
+    # Evaluates the rules for every day of right aligned (symbols x days) price matrices (see indicator_engine.py),
+    # with the nightly run's minimum of min_days trading days before a stock is screened (screen_days can ask for another).
+    #
+    # Everything that doesn't depend on the screen parameters is worked out once so the rules can be evaluated over
+    # and over with different parameters: the running close sums give the SMA for any period, each EMA
+    # period is only walked once, and the previous day's closes and volumes are shifted once.
+    # highs and lows are only needed by screens that use the CMF.
+    def __init__(self, closes = None, volumes = None, lengths = None, highs = None, lows = None, min_days = 50):
+        self._closes = closes
+        self._volumes = volumes
+        self._lengths = lengths
+        self._highs = highs
+        self._lows = lows
+
+        self._min_days = min_days
+        self._screened = {}
+
+        self._yesterday_closes = np.full(closes.shape, np.nan)
+        self._yesterday_closes[:, 1:] = closes[:, :-1]
+        self._yesterday_volumes = np.full(volumes.shape, np.nan)
+        self._yesterday_volumes[:, 1:] = volumes[:, :-1]
+
+        self._close_sums = cumulative_sums(closes)
+        self._smas = {}
+        self._emas = {}
+        self._cmfs = {}
+        self._new_trends = {}
+
+    # The days each stock has at least min_days trading days of history.
+    def get_screened(self, min_days = 50):
+        if min_days not in self._screened:
+            width = self._closes.shape[1]
+            self._screened[min_days] = np.arange(width)[None, :] >= (width - self._lengths + min_days - 1)[:, None]
+        return self._screened[min_days]
+
+    def get_sma(self, period = 10):
+        if period not in self._smas: self._smas[period] = sma_series(self._closes, self._lengths, period, self._close_sums)
+        return self._smas[period]
+
+    def get_ema(self, period = 20):
+        if period not in self._emas: self._emas[period] = ema_series(self._closes, self._lengths, period)
+        return self._emas[period]
+
+    def get_cmf(self, period = 15):
+        if period not in self._cmfs: self._cmfs[period] = cmf_series(self._highs, self._lows, self._closes, self._volumes, self._lengths, period)[0]
+        return self._cmfs[period]
+
+    # The matrix of each named screen indicator, see screen_rules.py for the names.
+    def get_values(self, names = ()):
+        columns = { 'close': self._closes, 'high': self._highs, 'low': self._lows, 'volume': self._volumes,
+                    'yesterday_close': self._yesterday_closes, 'yesterday_volume': self._yesterday_volumes }
+        values = {}
+        for name in names:
+            if name in columns: values[name] = columns[name]
+            else:
+                match = INDICATOR_PATTERN.match(name)
+                kind, period = match.group(1), int(match.group(2))
+                if kind == 'sma': values[name] = self.get_sma(period)
+                elif kind == 'ema': values[name] = self.get_ema(period)
+                else: values[name] = self.get_cmf(period)
+        return values
+
+    # Returns a list of (trend_type, days) pairs for the screens of a ScreenSet (see screen_rules.py), where days is a
+    # boolean matrix of the days that get a Trend_History entry.  The list is in the order the nightly run saves the
+    # entries, so a later one replaces an earlier one on the same day.
+    #
+    # The indicators the screens use are calculated once and shared, every screen after that is just its compiled
+    # rule's array operations.  The new trends are kept by rule, so a sweep over the signal thresholds reuses them.
+    # min_days overrides the minimum history the series was made with, e.g. for screens that need a longer one.
+    def screen_days(self, screens = None, include_disabled = False, min_days = None):
+        if min_days is None: min_days = self._min_days
+        screened = self.get_screened(min_days)
+        values = self.get_values(screens.get_indicators(include_disabled))
+
+        days = [(screen.get_name(), screen.evaluate(values) & screened) for screen in screens.get_signals(include_disabled)]
+        up_screen, down_screen = screens.get_trend('up'), screens.get_trend('down')
+        trend_key = (up_screen.get_rule().get_expression(), down_screen.get_rule().get_expression(), min_days)
+        if trend_key not in self._new_trends:
+            self._new_trends[trend_key] = new_trend_signals(up_screen.evaluate(values) & screened, down_screen.evaluate(values) & screened)
+        new_up_trends, new_down_trends = self._new_trends[trend_key]
+        days.append(('up', new_up_trends))
+        days.append(('down', new_down_trends))
+        return days
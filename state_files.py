@@ -0,0 +1,79 @@
+#!/usr/bin/python
+
+import glob
+import json
+import logging
+import os
+import re
+
+
+    # Per-symbol state files shared by the worker processes of a run.
+    #
+    # The nightly run keeps some state per symbol between runs (the indicator state and the negative
+    # cache).  Each machine shard has one state file, whatever the number of worker processes.  The
+    # workers of a run each screen their own symbols but go at the same time, so each one writes the
+    # records it changed to a worker file next to the state file (a record of None is a symbol it
+    # dropped), and once the workers are done the coordinator folds those back into the state file.
+    #
+    # Loading a state file always folds in any worker files that are still lying around, e.g. after a
+    # run died before its workers' files were merged, so changing --workers never loses any state.
+    ##################################################
+
+
+# The path with label added before the extension, e.g. indicator_state.0-of-2.json.
+def labelled_path(path = '', label = ''):
+    if len(label) == 0: return path
+    root, extension = os.path.splitext(path)
+    return "{}.{}{}".format(root, label, extension)
+
+
+# The process id keeps a worker from overwriting a file an earlier run left behind before it was folded in.
+def worker_path(path = '', worker_label = ''):
+    return labelled_path(path, "worker-{}-{}".format(worker_label, os.getpid()))
+
+
+# The worker files of the state file at path, oldest first so a newer record wins.
+def find_worker_files(path = ''):
+    root, extension = os.path.splitext(path)
+    pattern = re.compile(re.escape(os.path.basename(root)) + r'\.worker-\d+-of-\d+-\d+' + re.escape(extension) + '$')
+    paths = [p for p in glob.glob(glob.escape(root) + '.worker-*' + extension) if pattern.match(os.path.basename(p))]
+    return sorted(paths, key=os.path.getmtime)
+
+
+def _load_json(path = ''):
+    try:
+        with open(path) as state_file: return json.load(state_file)
+    except FileNotFoundError: return {}
+
+
+# Returns (records, worker_files): {symbol: record} from the state file with its worker files folded in,
+# and the worker files that were read.  A corrupt file raises ValueError.
+def load_records(path = ''):
+    records = _load_json(path)
+    worker_files = find_worker_files(path)
+    for worker_file in worker_files:
+        for symbol, record in _load_json(worker_file).items():
+            if record is None: records.pop(symbol, None)
+            else: records[symbol] = record
+    return records, worker_files
+
+
+def save_json(path = '', records = None):
+    # Write to a temporary file first so that a crash never leaves a half written file behind.
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as state_file: json.dump(records, state_file)
+    os.replace(temp_path, path)
+
+
+# Saves the whole state file, the worker files that were folded into records aren't needed any more.
+def save_records(path = '', records = None, worker_files = ()):
+    save_json(path, records)
+    if len(worker_files) > 0: logging.info("Folded {} worker files into {}.".format(len(worker_files), path))
+    for worker_file in worker_files:
+        try: os.remove(worker_file)
+        except FileNotFoundError: pass
+
+
+# Saves a worker's changes, {symbol: record or None} for the symbols it changed.
+def save_worker_records(path = '', worker_label = '', changes = None):
+    save_json(worker_path(path, worker_label), changes)
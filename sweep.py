@@ -0,0 +1,186 @@
+#!/usr/bin/python
+
+import argparse
+import csv
+import itertools
+import logging
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from backtest import days_in_range, forward_returns, get_source_symbols, load_price_matrices, merge_stats, parse_date_argument, score_days
+from screen_rules import DEFAULT_SCREENS_FILE, load_screens
+from signals import SignalSeries
+
+
+    # Parameter sweep for the screen parameters.
+    #
+    # Backtests every combination of a grid of values for the parameters of the screens file (see
+    # screen_rules.py) or a random sample of them over the local price cache, and reports the hit
+    # rate and average return of each combination, see backtest.py for how a signal is scored.
+    # The rules themselves only live in the screens file, so a change there is what gets swept.
+    #
+    # The work is split by stocks, not by combinations: each worker process loads a chunk of stocks
+    # once and builds one SignalSeries for it, so the running sums, EMAs, previous day shifts and
+    # forward returns are shared by every combination and only the compiled rules are redone.
+    #
+    # The grid values can be changed on the command line, parameters that go together are written
+    # as a/b, e.g.
+    #    --param sma_period=5,10 --param ema_fast/ema_slow=20/30,15/25 --param min_price/max_price=5/20,2/40
+    ##################################################
+
+
+# The values to try besides the screens file's own, which always comes first.
+PARAMETER_GRID = {
+    'sma_period': ['5', '15'],
+    'ema_fast/ema_slow': ['15/25', '30/50'],
+    'min_volume': ['100000', '500000'],
+    'min_price/max_price': ['2/20', '5/40'],
+    'close_ratio': ['.8', '.95'],
+    'volume_ratio': ['.5', '.75']
+}
+
+
+# Returns (name, values) for a --param setting, the values are lists of one value per parameter in the name.
+def parse_parameter(setting = ''):
+    name, values = setting.split('=', 1)
+    parameter_count = len(name.split('/'))
+
+    parsed = []
+    for value in values.split(','):
+        parts = value.split('/')
+        if len(parts) != parameter_count: raise ValueError("{} needs {} values written as a/b, got {}.".format(name, parameter_count, value))
+        parsed.append(parts)
+    return name, parsed
+
+
+# The default grid for the screens: each axis starts with the screens file's values.
+# An axis whose parameters the screens don't have (or don't agree on) is left out.
+def default_grid(screens = None):
+    current = screens.get_parameters()
+    grid = {}
+    for name, values in PARAMETER_GRID.items():
+        parameter_names = name.split('/')
+        missing = [p for p in parameter_names if p not in current]
+        if len(missing) > 0:
+            logging.warn("The screens have no single value for {}, leaving {} out of the sweep.".format(', '.join(missing), name))
+            continue
+        axis = [[current[p] for p in parameter_names]]
+        for value in values:
+            parts = value.split('/')
+            if parts not in axis: axis.append(parts)
+        grid[name] = axis
+    return grid
+
+
+# Turns the grid into a list of combinations, each one a dict of parameter -> value for ScreenSet.with_parameters.
+def grid_combinations(grid = None):
+    axes = list(grid)
+    combinations = []
+    for values in itertools.product(*(grid[name] for name in axes)):
+        combination = {}
+        for name, parts in zip(axes, values): combination.update(zip(name.split('/'), parts))
+        combinations.append(combination)
+    return combinations
+
+
+# Backtests one chunk of stocks for every combination.
+# Returns a list with the backtest_symbols style stats of each combination.
+# The screens are read from screens_file in the worker since compiled rules can't be pickled.
+def sweep_symbols(symbols = (), cache_dir = 'price_cache', start_date = None, end_date = None, horizons = (), combinations = (), screens_file = DEFAULT_SCREENS_FILE, include_disabled = False, archive_dir = None, history_dir = None):
+    screens = load_screens(screens_file)
+    # Each combination needs as much history as the backtester would ask for with its values.  Loading with the
+    # shortest of them keeps every stock some combination screens, the others skip the days they have too little for.
+    screen_sets = [screens.with_parameters(combination) for combination in combinations]
+    windows = [max(50, screen_set.get_lookback(include_disabled)) for screen_set in screen_sets]
+    matrices = load_price_matrices(symbols, cache_dir, min(windows, default=50), archive_dir, history_dir)
+    if matrices is None: return [{} for combination in combinations]
+
+    closes, highs, lows, volumes, lengths, dates = matrices
+    in_range = days_in_range(dates, start_date, end_date)
+    returns = forward_returns(closes, horizons)
+    signal_series = SignalSeries(closes, volumes, lengths, highs, lows)
+
+    stats = []
+    for screen_set, window in zip(screen_sets, windows):
+        screen_days = signal_series.screen_days(screen_set, include_disabled, window)
+        stats.append({trend_type: score_days(trend_type, days & in_range, returns) for trend_type, days in screen_days})
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtests a grid of screen parameters over the local price cache.")
+    parser.add_argument('--param', action='append', default=[], help="Values to try for a parameter as name=v1,v2,... (parameters that go together as a/b).")
+    parser.add_argument('--random', type=int, default=0, help="Try this many random combinations from the grid instead of all of them.")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--from', dest='start_date', default=None, help="First signal day to score as dd-mm-yyyy.")
+    parser.add_argument('--to', dest='end_date', default=None, help="Last signal day to score as dd-mm-yyyy.")
+    parser.add_argument('--horizon', type=int, action='append', default=None, help="Trading days to score the returns over, defaults to 30.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=250, help="Stocks per work item.")
+    parser.add_argument('--all-screens', action='store_true', help="Also sweep the screens switched off in the screens file.")
+    parser.add_argument('--csv', default=None, help="Also write every result to this CSV file.")
+    args = parser.parse_args()
+
+    screens_file = os.getenv('SCREENS_FILE', DEFAULT_SCREENS_FILE)
+    screens = load_screens(screens_file)
+    grid = default_grid(screens)
+    for setting in args.param:
+        name, values = parse_parameter(setting)
+        grid[name] = values
+
+    combinations = grid_combinations(grid)
+    names = list(combinations[0])
+    # Fail here rather than in every worker when a --param isn't one of the screens' parameters.
+    screens.with_parameters(combinations[0])
+    if args.random > 0 and args.random < len(combinations):
+        combinations = random.Random(args.seed).sample(combinations, args.random)
+
+    horizons = tuple(args.horizon or [30])
+    start_date = parse_date_argument(args.start_date) if args.start_date is not None else None
+    end_date = parse_date_argument(args.end_date) if args.end_date is not None else None
+
+    # Like the backtester the prices come from the price archive when PRICE_ARCHIVE_DIR is set
+    # and from the history archive when HISTORY_ARCHIVE_DIR is set.
+    cache_dir = os.getenv('PRICE_CACHE_DIR', 'price_cache')
+    archive_dir = os.getenv('PRICE_ARCHIVE_DIR')
+    history_dir = os.getenv('HISTORY_ARCHIVE_DIR')
+    symbols = get_source_symbols(cache_dir, archive_dir, history_dir)
+    chunks = [symbols[i:i + args.chunk_size] for i in range(0, len(symbols), args.chunk_size)]
+    print("Sweeping {} combinations over {} stocks from the price cache in {} chunks.".format(len(combinations), len(symbols), len(chunks)))
+
+    stats = [{} for combination in combinations]
+    with ProcessPoolExecutor(max_workers=max(args.workers, 1)) as executor:
+        pending = [executor.submit(sweep_symbols, chunk, cache_dir, start_date, end_date, horizons, combinations, screens_file, args.all_screens, archive_dir, history_dir) for chunk in chunks]
+        for future in pending:
+            try:
+                for total, chunk_stats in zip(stats, future.result()): merge_stats(total, chunk_stats)
+            except: logging.exception("Had an issue sweeping one of the chunks, its stocks are left out.")
+
+    # One row per combination, signal and horizon.
+    rows = []
+    for combination, combination_stats in zip(combinations, stats):
+        for trend_type, trend_stats in combination_stats.items():
+            for horizon in horizons:
+                count, hits, return_sum = trend_stats[horizon]
+                rows.append((trend_type, horizon, combination, trend_stats['signals'], count, hits / count if count > 0 else None, return_sum / count if count > 0 else None))
+
+    # The combinations for each signal from the best average return down.
+    header = "{:<24}{:>8}  {:<100}{:>9}{:>10}{:>12}".format('Signal', 'Horizon', 'Parameters', 'Signals', 'Hit rate', 'Avg return')
+    for trend_type in sorted(set(row[0] for row in rows)):
+        print("\n" + header)
+        for row in sorted((r for r in rows if r[0] == trend_type), key=lambda r: (r[1], -(r[6] if r[6] is not None else float('-inf')))):
+            parameters = ' '.join("{}={}".format(name, value) for name, value in row[2].items())
+            if row[4] > 0: print("{:<24}{:>8}  {:<100}{:>9}{:>10.1%}{:>12.2%}".format(row[0], row[1], parameters, row[3], row[5], row[6]))
+            else: print("{:<24}{:>8}  {:<100}{:>9}{:>10}{:>12}".format(row[0], row[1], parameters, row[3], '-', '-'))
+
+    if args.csv is not None:
+        with open(args.csv, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(['trend_type', 'horizon'] + names + ['signals', 'scored', 'hit_rate', 'average_return'])
+            for trend_type, horizon, combination, signal_count, count, hit_rate, average_return in rows:
+                writer.writerow([trend_type, horizon] + [combination[name] for name in names] + [signal_count, count, hit_rate, average_return])
+        print("\nWrote {} results to {}.".format(len(rows), args.csv))
+
+
+if __name__ == "__main__": main()
@@ -1,24 +1,15 @@
 #!/usr/bin/python
 
-import boto3
-import requests
-from boto3.dynamodb.conditions import Key, Attr
+import os
+
+from trend_store import open_trend_store
 
 def main():
     
-    #print("Attempting to connect to the local db.")
-    #dynamodb = boto3.resource('dynamodb', region_name='us-west-2', endpoint_url="http://localhost:8000")
-    
-    print("Attempting to connect to the db in AWS.")
-    dynamodb = boto3.resource('dynamodb', region_name='us-east-1', endpoint_url="http://dynamodb.us-east-1.amazonaws.com")
-                        
-                        
-    #current_trend_table = dynamodb.Table('Current_Trend')
-    print("Opening the current trend table.")    
-    table = dynamodb.Table('Current_Trend')
+    # This has always looked at the PROD trends, set ENV=DEV to look at the local ones.
+    print("Attempting to connect to the trend store.")
+    trend_store = open_trend_store(os.getenv('ENV', 'PROD'))
     
-    print("Opening the trend history table.")
-    trend_history_table = dynamodb.Table('Trend_History') 
     #table.put_item(
     #        Item={
     #              'stock_symbol': 'AMD',
@@ -43,10 +34,10 @@ def main():
     
     #print(other_response)
     
-    yet_another_response = trend_history_table.query(
-        KeyConditionExpression=Key('stock_symbol').eq('JNPR')                               
-                                                     
-    )
+    #response = trend_store.get_current_trend('FIT')
+    #print(response)
+    
+    yet_another_response = trend_store.query_trend_history('JNPR')
     
     print(yet_another_response)
     
@@ -17,6 +17,7 @@ def main():
     boto3_installed = False
     botocore_installed = False
     requests_installed = False
+    numpy_installed = False
     
     if sys.version_info.major >= 3: 
         print("You are running on Python 3.")
@@ -34,8 +35,12 @@ def main():
         if(x.project_name == 'requests'): 
             print("requests is installed.")
             requests_installed = True
+        
+        if(x.project_name == 'numpy'): 
+            print("numpy is installed.")
+            numpy_installed = True
             
-    if(python_version_correct and boto3_installed and botocore_installed and requests_installed): print("\nBase configs are all installed, you are on the correct version of Python and you have the correct packages installed.")
+    if(python_version_correct and boto3_installed and botocore_installed and requests_installed and numpy_installed): print("\nBase configs are all installed, you are on the correct version of Python and you have the correct packages installed.")
     
     dynamodb_ok = False
     s3_ok = False
@@ -0,0 +1,62 @@
+import datetime
+import math
+
+from historical_price_screener import backfill_stocks, screen_stocks
+from price_cache import PriceCache
+from trend_store import SqliteTrendStore
+
+
+FIRST_DAY = datetime.date(2016, 1, 1)
+DAYS = 110
+SYMBOLS = ['AAA', 'BBB', 'CCC']
+
+
+# Waves of different lengths so the stocks flip between up and down trends a few times.
+# CCC more than doubles on day 70 on higher volume, which is a heavy volume reversal.
+def price_on(symbol = '', i = 0):
+    if symbol == 'AAA': return 12.0 + 3 * math.sin(i / 6.0)
+    if symbol == 'BBB': return 40.0 + 5 * math.sin(i / 11.0) + i * 0.05
+    return (8.0 if i < 70 else 17.0) + math.sin(i / 4.0)
+
+
+def fill_price_cache(cache_dir = ''):
+    cache = PriceCache(cache_dir)
+    for symbol in SYMBOLS:
+        quotes = []
+        for i in range(DAYS):
+            close = round(price_on(symbol, i), 4)
+            volume = 600000 if (symbol, i) == ('CCC', 70) else 300000 + (i % 7) * 1000
+            quotes.append({ 'Symbol': symbol, 'Date': str(FIRST_DAY + datetime.timedelta(days=i)), 'Open': close, 'High': close + 0.5,
+                            'Low': close - 0.5, 'Close': close, 'Adj_Close': close, 'Volume': volume })
+        cache.add_quotes(symbol, quotes, datetime.date(2015, 1, 1))
+
+
+def trend_history(path = ''):
+    store = SqliteTrendStore(path)
+    entries = [(item['stock_symbol'], item['occurence_date'], item['trend_type']) for symbol in SYMBOLS for item in store.query_trend_history(symbol)]
+    store.close()
+    return entries
+
+
+# Backfilling a range writes the same Trend_History entries that running the screener on each of its days would have.
+def test_backfill_matches_the_daily_runs(tmp_path, monkeypatch):
+    monkeypatch.setenv('PRICE_CACHE_DIR', str(tmp_path / 'price_cache'))
+    monkeypatch.setenv('JOURNAL_DIR', str(tmp_path))
+    monkeypatch.setenv('INDICATOR_STATE_FILE', str(tmp_path / 'indicator_state.json'))
+    monkeypatch.setenv('NEGATIVE_CACHE_FILE', str(tmp_path / 'negative_cache.json'))
+    monkeypatch.delenv('TREND_STORE', raising=False)
+    fill_price_cache(str(tmp_path / 'price_cache'))
+    last_day = FIRST_DAY + datetime.timedelta(days=DAYS - 1)
+
+    monkeypatch.setenv('TREND_DB_PATH', str(tmp_path / 'daily.db'))
+    for i in range(DAYS):
+        day = FIRST_DAY + datetime.timedelta(days=i)
+        screen_stocks(SYMBOLS, (), day - datetime.timedelta(days=300), day, 'DEV')
+    daily_entries = trend_history(str(tmp_path / 'daily.db'))
+
+    monkeypatch.setenv('TREND_DB_PATH', str(tmp_path / 'backfill.db'))
+    assert backfill_stocks(SYMBOLS, FIRST_DAY, last_day, 'DEV') == len(daily_entries)
+
+    assert trend_history(str(tmp_path / 'backfill.db')) == daily_entries
+    trend_types = set(trend_type for symbol, date, trend_type in daily_entries)
+    assert trend_types == {'up', 'down', 'heavy volume reversal'}
@@ -0,0 +1,63 @@
+import datetime
+
+import numpy as np
+import pytest
+
+import backtest
+from backtest import backtest_symbols, merge_stats
+from price_cache import PriceCache
+
+
+FIRST_DAY = datetime.date(2016, 1, 1)
+
+
+# AAA climbs a dollar a day from 10 and BBB falls a dollar a day from 100, over 60 days.
+@pytest.fixture
+def cache_dir(tmp_path):
+    cache = PriceCache(str(tmp_path))
+    for symbol, first_close, step in (('AAA', 10.0, 1.0), ('BBB', 100.0, -1.0)):
+        quotes = []
+        for i in range(60):
+            close = first_close + step * i
+            quotes.append({ 'Symbol': symbol, 'Date': str(FIRST_DAY + datetime.timedelta(days=i)), 'Open': close, 'High': close,
+                            'Low': close, 'Close': close, 'Adj_Close': close, 'Volume': 1000 })
+        cache.add_quotes(symbol, quotes, FIRST_DAY)
+    return str(tmp_path)
+
+
+# Up signals on AAA day 50 (60 -> 65, a hit), BBB day 50 (50 -> 45, a miss) and AAA day 57 (too late to score),
+# and a down signal on BBB day 52 (48 -> 43, a hit).
+def fake_screen_days(self, screens = None, include_disabled = False):
+    up_days, down_days = np.zeros((2, 60), dtype=bool), np.zeros((2, 60), dtype=bool)
+    up_days[0, 50] = up_days[1, 50] = up_days[0, 57] = True
+    down_days[1, 52] = True
+    return [('up', up_days), ('down', down_days)]
+
+
+def test_signals_are_scored_by_the_forward_return(cache_dir, monkeypatch):
+    monkeypatch.setattr(backtest.SignalSeries, 'screen_days', fake_screen_days)
+    stats = backtest_symbols(['AAA', 'BBB'], cache_dir, None, None, (5,))
+
+    assert stats['up']['signals'] == 3
+    count, hits, return_sum = stats['up'][5]
+    assert (count, hits) == (2, 1)
+    assert return_sum == pytest.approx(5 / 60 - 5 / 50)
+
+    # A down-trend is a hit when the stock falls.
+    count, hits, return_sum = stats['down'][5]
+    assert (stats['down']['signals'], count, hits) == (1, 1, 1)
+    assert return_sum == pytest.approx(-5 / 48)
+
+
+def test_only_the_signals_in_the_range_are_scored(cache_dir, monkeypatch):
+    monkeypatch.setattr(backtest.SignalSeries, 'screen_days', fake_screen_days)
+    stats = backtest_symbols(['AAA', 'BBB'], cache_dir, FIRST_DAY, FIRST_DAY + datetime.timedelta(days=51), (5, 9))
+
+    assert stats['up']['signals'] == 2 and stats['up'][9][:2] == [2, 1]
+    assert stats['down'] == { 'signals': 0, 5: [0, 0, 0.0], 9: [0, 0, 0.0] }
+
+
+def test_merge_stats_adds_up_the_chunks():
+    total = merge_stats({}, { 'up': { 'signals': 2, 5: [2, 1, 0.5] } })
+    merge_stats(total, { 'up': { 'signals': 1, 5: [1, 1, 0.25] }, 'down': { 'signals': 1, 5: [0, 0, 0.0] } })
+    assert total == { 'up': { 'signals': 3, 5: [3, 2, 0.75] }, 'down': { 'signals': 1, 5: [0, 0, 0.0] } }
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from extended_indicators import EXTENDED_INDICATORS, extended_indicator_series, latest_extended_indicators
+from historical_price_screener import Security
+
+
+# Short periods so the reference values can be worked out by hand:
+# RSI 3, MACD 2/3/2, Bollinger 3 with 2 deviations and ATR 3.
+PERIODS = { 'rsi_period': 3, 'macd_periods': (2, 3, 2), 'bollinger_period': 3, 'atr_period': 3 }
+
+CLOSES = [10.0, 11.0, 10.5, 12.0, 11.0, 13.0]
+VOLUMES = [100.0, 200.0, 300.0, 400.0, 500.0, 600.0]
+
+
+# The first row is six days of CLOSES with a dollar range around each close, the second row is a stock with
+# only two days of history, right aligned and padded with NaN like in indicator_engine.py.
+def series(indicators = EXTENDED_INDICATORS):
+    closes = np.array([CLOSES, [np.nan] * 4 + [20.0, 21.0]])
+    volumes = np.array([VOLUMES, [np.nan] * 4 + [50.0, 60.0]])
+    return extended_indicator_series(closes, closes + 0.5, closes - 0.5, volumes, np.array([6, 2]), indicators, **PERIODS)
+
+
+def assert_row(values = None, expected = ()):
+    assert np.isnan(values[:len(values) - len(expected)]).all()
+    assert values[len(values) - len(expected):] == pytest.approx(expected)
+
+
+# Wilder's average gain and loss, seeded with the mean of the first 3 changes.
+def test_rsi():
+    rsi = series(['rsi14'])['rsi14']
+    # Gains 1, 0, 1.5 and losses 0, .5, 0 to start with, then a loss of 1 and a gain of 2.
+    gain, loss = 2.5 / 3, 0.5 / 3
+    expected = [100 * gain / (gain + loss)]
+    for change in (-1.0, 2.0):
+        gain += (max(change, 0) - gain) / 3
+        loss += (max(-change, 0) - loss) / 3
+        expected.append(100 * gain / (gain + loss))
+    assert expected == pytest.approx([250 / 3, 500 / 9, 700 / 9])
+    assert_row(rsi[0], expected)
+
+
+def test_macd():
+    values = series(['macd', 'macd_signal', 'macd_histogram'])
+    # Fast EMA(2) from day 2: 10.5, 11.5, 67/6, 223/18.  Slow EMA(3) from day 3: 11.25, 11.125, 12.0625.
+    macd = [11.5 - 11.25, 67 / 6 - 11.125, 223 / 18 - 12.0625]
+    assert_row(values['macd'][0], macd)
+    # The signal line is an EMA(2) of the MACD, seeded with the mean of its first two values.
+    signal = (macd[0] + macd[1]) / 2 + (macd[2] - (macd[0] + macd[1]) / 2) * 2 / 3
+    assert_row(values['macd_signal'][0], [signal])
+    assert_row(values['macd_histogram'][0], [macd[2] - signal])
+
+
+def test_bollinger_bands():
+    values = series(['bollinger_upper', 'bollinger_middle', 'bollinger_lower'])
+    middle = [10.5, 33.5 / 3, 33.5 / 3, 12.0]
+    # The population standard deviation of the last 3 closes.
+    deviation = [np.std(CLOSES[i:i + 3]) for i in range(4)]
+    assert deviation[0] == pytest.approx(np.sqrt(1 / 6)) and deviation[3] == pytest.approx(np.sqrt(2 / 3))
+
+    assert_row(values['bollinger_middle'][0], middle)
+    assert_row(values['bollinger_upper'][0], [m + 2 * d for m, d in zip(middle, deviation)])
+    assert_row(values['bollinger_lower'][0], [m - 2 * d for m, d in zip(middle, deviation)])
+
+
+# The true ranges are 1, 1.5, 1, 2, 1.5 and 2.5 (the gaps from yesterday's close win from day 2 on).
+def test_atr():
+    atr = [3.5 / 3]
+    for true_range in (2.0, 1.5, 2.5): atr.append(atr[-1] + (true_range - atr[-1]) / 3)
+    assert atr == pytest.approx([7 / 6, 13 / 9, 79 / 54, 293 / 162])
+    assert_row(series(['atr14'])['atr14'][0], atr)
+
+
+def test_obv():
+    values = series(['obv'])['obv']
+    assert list(values[0]) == [0.0, 200.0, -100.0, 300.0, -200.0, 400.0]
+    assert_row(values[1], [0.0, 60.0])
+
+
+# A stock with less history than a period gets NaN for that indicator rather than a partial value.
+def test_shorter_than_the_period():
+    values = series()
+    for name in EXTENDED_INDICATORS:
+        if name != 'obv': assert np.isnan(values[name][1]).all(), name
+
+
+# Only the asked for indicators are returned.
+def test_only_the_requested_indicators():
+    assert sorted(series(['obv', 'rsi14'])) == ['obv', 'rsi14']
+
+
+# With the default periods ten days isn't enough for anything but the OBV.
+def test_latest_values_of_a_new_stock():
+    quotes = [{ 'Symbol': 'NEW', 'Date': '2016-06-{:02d}'.format(i + 1), 'Open': 5.0 + i, 'High': 5.5 + i, 'Low': 4.5 + i, 'Close': 5.0 + i,
+                'Adj_Close': 5.0 + i, 'Volume': 1000 } for i in range(10)]
+    latest = latest_extended_indicators([Security(quotes)])
+    assert latest['obv'][0] == 9000.0
+    assert all(np.isnan(latest[name][0]) for name in EXTENDED_INDICATORS if name != 'obv')
@@ -0,0 +1,69 @@
+import pytest
+
+from fetch_client import CircuitBreaker, FetchClient, FetchError
+
+
+class FakeResponse:
+    def __init__(self, status_code = 200, payload = None):
+        self.status_code = status_code
+        self._payload = payload
+
+    def json(self):
+        if self._payload is None: raise ValueError("No JSON object could be decoded")
+        return self._payload
+
+
+class CountingLimiter:
+    def __init__(self):
+        self.tokens = 0
+
+    def acquire(self):
+        self.tokens += 1
+
+
+# The requests get the responses in order, and there are no backoff sleeps.
+def client_replying(monkeypatch, responses = (), max_retries = 4, circuit_breaker = None):
+    client = FetchClient(1, 1.0, max_retries, 0.0, 0.0, circuit_breaker or CircuitBreaker(100))
+    responses = list(responses)
+    monkeypatch.setattr(client._session, 'get', lambda url, timeout=None: responses.pop(0))
+    return client
+
+
+def test_retries_until_a_good_response(monkeypatch):
+    client = client_replying(monkeypatch, [FakeResponse(500), FakeResponse(200), FakeResponse(200, { 'count': 0 }), FakeResponse(200, { 'count': 1 })])
+    assert client.get_json('http://quotes', lambda payload: payload['count'] > 0) == { 'count': 1 }
+
+
+def test_gives_up_after_max_retries(monkeypatch):
+    client = client_replying(monkeypatch, [FakeResponse(503)] * 3, 2)
+    with pytest.raises(FetchError): client.get_json('http://quotes')
+
+
+# The retries go through the rate limiter as well, not just the first attempt.
+def test_every_attempt_takes_a_token(monkeypatch):
+    limiter = CountingLimiter()
+    client = client_replying(monkeypatch, [FakeResponse(500), FakeResponse(500), FakeResponse(200, {})])
+    client.get_json('http://quotes', None, limiter)
+    assert limiter.tokens == 3
+
+
+def test_circuit_breaker_opens_and_closes():
+    breaker = CircuitBreaker(2, 0.0, 0.0, 10.0)
+    breaker.record_failure()
+    assert not breaker.is_open()
+    breaker.record_failure()
+    assert breaker.is_open()
+
+    # The cooldown is over so one trial request goes through, and it working closes the breaker.
+    breaker.before_request()
+    breaker.record_success()
+    assert not breaker.is_open()
+
+
+def test_circuit_breaker_gives_up_after_max_pause():
+    breaker = CircuitBreaker(1, 0.05, 0.05, 0.05)
+    breaker.record_failure()
+    # Waits out the cooldown, then the trial request fails too.
+    breaker.before_request()
+    breaker.record_failure()
+    with pytest.raises(FetchError): breaker.before_request()
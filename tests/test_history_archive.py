@@ -0,0 +1,98 @@
+import datetime
+import os
+
+import numpy as np
+import pytest
+
+import history_archive
+from history_archive import HistoryArchive, decode_block, decode_varints, encode_block, encode_varints, quotes_to_columns
+
+
+# Yahoo style quotes for a symbol, one per calendar day from start, rounded like Yahoo's.
+def yahoo_quotes(symbol = 'AAA', start = datetime.date(2015, 12, 20), days = 30, base = 10.0):
+    quotes = []
+    for i in range(days):
+        close = round(base + (i % 7) * 0.37 - (i % 3) * 0.11, 4)
+        quotes.append({ 'Symbol': symbol, 'Date': str(start + datetime.timedelta(days=i)), 'Open': round(close - 0.05, 4), 'High': round(close + 0.25, 4),
+                        'Low': round(close - 0.3, 4), 'Close': close, 'Adj_Close': close, 'Volume': 100000 + 1234 * i })
+    return quotes
+
+
+def test_varints_round_trip():
+    values = np.array([0, 1, -1, 63, -64, 64, -65, 127, 128, 300, -300, 2 ** 31, -2 ** 31, 2 ** 62, -2 ** 63, 2 ** 63 - 1], dtype=np.int64)
+    assert np.array_equal(decode_varints(encode_varints(values)), values)
+
+
+# Zigzag keeps small negative numbers to one byte and each 7 bits more takes another byte.
+def test_varints_sizes():
+    assert encode_varints([0]) == b'\x00'
+    assert encode_varints([-1]) == b'\x01'
+    assert encode_varints([1]) == b'\x02'
+    assert encode_varints([63, -64]) == b'\x7e\x7f'
+    assert encode_varints([64]) == b'\x80\x01'
+    assert len(encode_varints([2 ** 63 - 1])) == 10
+
+
+def test_varints_empty():
+    assert encode_varints([]) == b''
+    assert len(decode_varints(b'')) == 0
+
+
+def test_block_round_trip():
+    columns = quotes_to_columns(yahoo_quotes())
+    decoded = decode_block(encode_block(columns))
+
+    assert np.array_equal(decoded['date'], columns['date'])
+    assert np.array_equal(decoded['volume'], columns['volume'])
+    for name in ('open', 'high', 'low', 'close', 'adj_close'): assert np.allclose(decoded[name], columns[name], rtol=0, atol=1e-9)
+
+
+def test_archive_round_trip_across_years(tmp_path):
+    archive = HistoryArchive(str(tmp_path))
+    archive.add_quotes({ 'AAA': yahoo_quotes('AAA'), 'BBB': yahoo_quotes('BBB', base=42.5) })
+
+    assert archive.get_years() == [2015, 2016]
+    assert archive.get_symbols() == ['AAA', 'BBB']
+    assert HistoryArchive(str(tmp_path)).get_quotes('BBB') == yahoo_quotes('BBB', base=42.5)
+
+    january = HistoryArchive(str(tmp_path)).get_quotes('AAA', datetime.date(2016, 1, 1), datetime.date(2016, 1, 5))
+    assert [quote['Date'] for quote in january] == ['2016-01-01', '2016-01-02', '2016-01-03', '2016-01-04', '2016-01-05']
+
+
+def test_add_quotes_merges_into_the_year(tmp_path):
+    archive = HistoryArchive(str(tmp_path))
+    quotes = yahoo_quotes(start=datetime.date(2016, 1, 1), days=20)
+    archive.add_quotes({ 'AAA': quotes[:10] })
+    archive.add_quotes({ 'AAA': quotes[8:] })
+
+    assert HistoryArchive(str(tmp_path)).get_quotes('AAA') == quotes
+    # Only the newest data file of the year is kept.
+    assert sorted(name for name in os.listdir(str(tmp_path)) if name.endswith('.bin')) == ['2016.2.bin']
+
+
+# A crash between writing the new data file and swapping in its index leaves the old year readable.
+def test_write_year_crash_keeps_the_old_year(tmp_path, monkeypatch):
+    quotes = yahoo_quotes(start=datetime.date(2016, 1, 1), days=20)
+    HistoryArchive(str(tmp_path)).add_quotes({ 'AAA': quotes })
+
+    real_replace = os.replace
+    def crashing_replace(source, destination):
+        if destination.endswith('.index.json'): raise KeyboardInterrupt()
+        real_replace(source, destination)
+    monkeypatch.setattr(history_archive.os, 'replace', crashing_replace)
+    with pytest.raises(KeyboardInterrupt): HistoryArchive(str(tmp_path)).write_year(2016, { 'AAA': yahoo_quotes(start=datetime.date(2016, 1, 1), days=20, base=99.0) })
+    monkeypatch.setattr(history_archive.os, 'replace', real_replace)
+
+    assert HistoryArchive(str(tmp_path)).get_quotes('AAA') == quotes
+
+
+# A reader that read the index before the year was rewritten picks up the new data file.
+def test_reader_follows_a_rewrite(tmp_path):
+    HistoryArchive(str(tmp_path)).add_quotes({ 'AAA': yahoo_quotes(start=datetime.date(2016, 1, 1), days=20) })
+    reader = HistoryArchive(str(tmp_path))
+    reader.get_index(2016)
+
+    new_quotes = yahoo_quotes(start=datetime.date(2016, 1, 1), days=20, base=99.0)
+    HistoryArchive(str(tmp_path)).write_year(2016, { 'AAA': new_quotes })
+
+    assert reader.get_quotes('AAA') == new_quotes
@@ -0,0 +1,60 @@
+import datetime
+
+import numpy as np
+
+from historical_price_screener import Security
+from indicator_engine import UNIVERSE_INDICATORS, UniverseIndicators, build_price_matrices, ema_series, rolling_sum, sma_series
+
+
+# A wavy price history with a flat day (high == low) every 13 days.
+def wavy_quotes(symbol = 'AAA', days = 80, base = 20.0):
+    quotes = []
+    for i in range(days):
+        close = base + np.cos(i / 4.0) * 3 + i * 0.02
+        spread = 0.0 if i % 13 == 5 else 0.3 + (i % 5) * 0.1
+        quotes.append({ 'Symbol': symbol, 'Date': str(datetime.date(2016, 1, 1) + datetime.timedelta(days=i)), 'Open': close, 'High': close + spread,
+                        'Low': close - spread, 'Close': close, 'Adj_Close': close, 'Volume': 50000 + (i * 3571) % 40000 })
+    return quotes
+
+
+# The universe wide pass gives the same values as each Security working out its own, for stocks of different lengths.
+def test_universe_indicators_match_the_securities():
+    securities = [Security(wavy_quotes('AAA')), Security(wavy_quotes('BBB', 60, 8.0)), Security(wavy_quotes('CCC', 35, 100.0))]
+    values = UniverseIndicators.from_securities(securities).get_values()
+
+    for row, security in enumerate(securities):
+        for name in UNIVERSE_INDICATORS: assert np.isclose(values[name][row], security.get_indicator(name)), (security.get_symbol(), name)
+
+
+def test_only_the_asked_for_indicators_are_computed():
+    universe = UniverseIndicators.from_securities([Security(wavy_quotes())], ['sma10', 'ema20'])
+    assert sorted(universe.get_values()) == ['ema20', 'sma10']
+    assert universe.get_50_day_sma() is None
+
+
+def test_price_matrices_are_right_aligned():
+    securities = [Security(wavy_quotes('AAA', 5)), Security(wavy_quotes('BBB', 3))]
+    closes, highs, lows, volumes, lengths = build_price_matrices(securities)
+
+    assert list(lengths) == [5, 3]
+    assert np.isnan(closes[1, :2]).all()
+    assert np.array_equal(closes[1, 2:], securities[1].get_closes())
+
+
+# Every column of the SMA and EMA series matches the Security's value as of that day.
+def test_series_match_day_by_day():
+    security = Security(wavy_quotes('AAA', 60))
+    closes, highs, lows, volumes, lengths = build_price_matrices([security])
+    smas, emas = sma_series(closes, lengths, 10), ema_series(closes, lengths, 20)
+
+    for day in range(60):
+        if day >= 9: assert np.isclose(smas[0, day], security.calc_simple_moving_average(10, day + 1))
+        else: assert np.isnan(smas[0, day])
+        if day >= 20: assert np.isclose(emas[0, day], security.calc_exp_moving_average(20, day + 1))
+
+
+def test_rolling_sum_blanks_the_padding():
+    values = np.array([[np.nan, 1.0, 2.0, 3.0], [1.0, 1.0, 1.0, 1.0]])
+    sums = rolling_sum(values, np.array([3, 4]), 2)
+    assert np.isnan(sums[0, :2]).all() and list(sums[0, 2:]) == [3.0, 5.0]
+    assert np.isnan(sums[1, 0]) and list(sums[1, 1:]) == [2.0, 2.0, 2.0]
@@ -0,0 +1,82 @@
+import datetime
+import json
+
+import numpy as np
+
+from historical_price_screener import Security
+from indicator_engine import UniverseIndicators
+from indicator_state import IndicatorStateStore
+
+
+# One quote per calendar day from 2016-01-01, with a flat day (high == low) every 11 days.
+def sine_quotes(symbol = 'AAA', days = 120, base = 20.0, step = 0.0):
+    quotes = []
+    for i in range(days):
+        close = base + np.sin(i / 5.0) * 2 + i * step
+        spread = 0.0 if i % 11 == 0 else 0.4 + (i % 4) * 0.1
+        quotes.append({ 'Symbol': symbol, 'Date': str(datetime.date(2016, 1, 1) + datetime.timedelta(days=i)), 'Open': close, 'High': close + spread,
+                        'Low': close - spread, 'Close': close, 'Adj_Close': close, 'Volume': 100000 + (i * 7919) % 50000 })
+    return quotes
+
+
+def securities_through(quote_lists = None, days = 0):
+    return [Security(quote_list[:days]) for quote_list in quote_lists]
+
+
+GETTERS = ('get_10_day_sma', 'get_50_day_sma', 'get_20_day_ema', 'get_30_day_ema', 'get_chaikin_money_flow')
+
+
+def assert_matches_full_recompute(indicators = None, securities = ()):
+    expected = UniverseIndicators.from_securities(securities)
+    for getter in GETTERS: assert np.allclose(getattr(indicators, getter)(), getattr(expected, getter)(), rtol=1e-9, atol=1e-9), getter
+
+
+# Advancing the saved state day by day gives the same indicators as calculating them from the whole history.
+def test_advancing_matches_full_recompute(tmp_path, caplog):
+    path = str(tmp_path / 'indicator_state.json')
+    quote_lists = [sine_quotes('AAA'), sine_quotes('BBB', base=50.0, step=0.05), sine_quotes('CCC', days=90, base=7.0)]
+
+    for days in (80, 81, 85, 100, 120):
+        store = IndicatorStateStore(path)
+        securities = securities_through(quote_lists, days)
+        caplog.clear()
+        with caplog.at_level('INFO'): indicators = store.update(securities)
+        if days > 80: assert 'Advanced the saved indicator state for 3 stocks and recomputed 0' in caplog.text
+        assert_matches_full_recompute(indicators, securities)
+        store.save()
+
+
+def test_revised_data_is_recomputed(tmp_path, caplog):
+    path = str(tmp_path / 'indicator_state.json')
+    quote_lists = [sine_quotes('AAA')]
+    store = IndicatorStateStore(path)
+    store.update(securities_through(quote_lists, 100))
+    store.save()
+
+    # Yahoo revised the last day the state has seen.
+    quote_lists[0][99] = dict(quote_lists[0][99], Close=quote_lists[0][99]['Close'] + 1)
+    securities = securities_through(quote_lists, 105)
+    with caplog.at_level('INFO'): indicators = IndicatorStateStore(path).update(securities)
+    assert 'recomputed 1 stocks in full' in caplog.text
+    assert_matches_full_recompute(indicators, securities)
+
+
+# A catch-up run for an older day doesn't roll the saved state back.
+def test_older_day_keeps_the_newer_state(tmp_path):
+    path = str(tmp_path / 'indicator_state.json')
+    quote_lists = [sine_quotes('AAA')]
+    store = IndicatorStateStore(path)
+    store.update(securities_through(quote_lists, 110))
+    store.save()
+
+    store = IndicatorStateStore(path)
+    store.update(securities_through(quote_lists, 90))
+    store.save()
+    with open(path) as state_file: assert json.load(state_file)['AAA']['last_date'] == '2016-04-19'
+
+
+def test_corrupt_state_file_starts_over(tmp_path):
+    path = tmp_path / 'indicator_state.json'
+    path.write_text('{not json')
+    securities = securities_through([sine_quotes('AAA')], 100)
+    assert_matches_full_recompute(IndicatorStateStore(str(path)).update(securities), securities)
@@ -0,0 +1,92 @@
+import csv
+import os
+
+import boto3
+import pytest
+
+from input_loader import InputLoader
+
+moto = pytest.importorskip('moto')
+
+
+def test_local_dir(tmp_path):
+    (tmp_path / 'NASDAQ.csv').write_text('"Symbol","Name"\n"AAA","Aaa Inc"\n')
+    with InputLoader(local_dir=str(tmp_path)).open_text('NASDAQ.csv') as company_list:
+        assert list(csv.reader(company_list)) == [['Symbol', 'Name'], ['AAA', 'Aaa Inc']]
+
+
+# The first read streams the file from S3 into the cache, after that an unchanged file comes from the cache.
+def test_s3_file_is_cached_by_etag(tmp_path, monkeypatch, caplog):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    cache_dir = str(tmp_path / 'input_cache')
+
+    with moto.mock_aws():
+        bucket = boto3.resource('s3').create_bucket(Bucket='rodell-screener-input')
+        bucket.put_object(Key='NASDAQ.csv', Body=b'"Symbol"\n"AAA"\n"BBB"\n')
+
+        # Only read the header, the rest still makes it into the cache.
+        with InputLoader('rodell-screener-input', cache_dir).open_text('NASDAQ.csv') as company_list: assert company_list.readline() == '"Symbol"\n'
+        with open(os.path.join(cache_dir, 'NASDAQ.csv'), 'rb') as cached: assert cached.read() == b'"Symbol"\n"AAA"\n"BBB"\n'
+
+        with caplog.at_level('INFO'):
+            with InputLoader('rodell-screener-input', cache_dir).open_text('NASDAQ.csv') as company_list: assert company_list.read() == '"Symbol"\n"AAA"\n"BBB"\n'
+        assert "hasn't changed" in caplog.text
+
+        bucket.put_object(Key='NASDAQ.csv', Body=b'"Symbol"\n"CCC"\n')
+        with InputLoader('rodell-screener-input', cache_dir).open_text('NASDAQ.csv') as company_list: assert company_list.read() == '"Symbol"\n"CCC"\n'
+
+
+def test_failed_read_keeps_the_cached_copy(tmp_path, monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    cache_dir = str(tmp_path / 'input_cache')
+
+    with moto.mock_aws():
+        bucket = boto3.resource('s3').create_bucket(Bucket='rodell-screener-input')
+        bucket.put_object(Key='NASDAQ.csv', Body=b'"Symbol"\n"AAA"\n')
+        with InputLoader('rodell-screener-input', cache_dir).open_text('NASDAQ.csv') as company_list: company_list.read()
+
+        bucket.put_object(Key='NASDAQ.csv', Body=b'"Symbol"\n"BBB"\n')
+        with pytest.raises(RuntimeError):
+            with InputLoader('rodell-screener-input', cache_dir).open_text('NASDAQ.csv') as company_list: raise RuntimeError("Bad row")
+        assert sorted(os.listdir(cache_dir)) == ['NASDAQ.csv', 'NASDAQ.csv.etag']
+        with open(os.path.join(cache_dir, 'NASDAQ.csv'), 'rb') as cached: assert cached.read() == b'"Symbol"\n"AAA"\n'
+
+
+# Without INPUT_BUCKET or a default bucket the files are read from the current directory, INPUT_DIR always wins.
+def test_from_environment_local(tmp_path, monkeypatch):
+    monkeypatch.delenv('INPUT_BUCKET', raising=False)
+    monkeypatch.delenv('INPUT_DIR', raising=False)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'NASDAQ.csv').write_text('"Symbol"\n"AAA"\n')
+    (tmp_path / 'inputs').mkdir()
+    (tmp_path / 'inputs' / 'NASDAQ.csv').write_text('"Symbol"\n"BBB"\n')
+
+    with InputLoader.from_environment().open_text('NASDAQ.csv') as company_list: assert company_list.read() == '"Symbol"\n"AAA"\n'
+    assert not os.path.exists(str(tmp_path / 'input_cache'))
+
+    monkeypatch.setenv('INPUT_DIR', str(tmp_path / 'inputs'))
+    monkeypatch.setenv('INPUT_BUCKET', 'rodell-screener-input')
+    with InputLoader.from_environment('rodell-screener-output').open_text('NASDAQ.csv') as company_list: assert company_list.read() == '"Symbol"\n"BBB"\n'
+
+
+# INPUT_BUCKET overrides the script's default bucket.
+def test_from_environment_bucket(tmp_path, monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('INPUT_CACHE_DIR', str(tmp_path / 'input_cache'))
+    monkeypatch.delenv('INPUT_DIR', raising=False)
+    monkeypatch.delenv('INPUT_BUCKET', raising=False)
+
+    with moto.mock_aws():
+        boto3.resource('s3').create_bucket(Bucket='rodell-screener-output').put_object(Key='NASDAQ.csv', Body=b'"Symbol"\n"AAA"\n')
+        boto3.resource('s3').create_bucket(Bucket='other-bucket').put_object(Key='NASDAQ.csv', Body=b'"Symbol"\n"BBB"\n')
+
+        with InputLoader.from_environment('rodell-screener-output').open_text('NASDAQ.csv') as company_list: assert company_list.read() == '"Symbol"\n"AAA"\n'
+        monkeypatch.setenv('INPUT_BUCKET', 'other-bucket')
+        monkeypatch.setenv('INPUT_CACHE_DIR', str(tmp_path / 'other_cache'))
+        with InputLoader.from_environment('rodell-screener-output').open_text('NASDAQ.csv') as company_list: assert company_list.read() == '"Symbol"\n"BBB"\n'
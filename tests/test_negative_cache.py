@@ -0,0 +1,99 @@
+import datetime
+
+import historical_price_screener
+from historical_price_screener import screen_stocks
+from negative_cache import NegativeCache
+from quote_fetcher import SymbolResult
+
+
+DAY = datetime.date(2016, 6, 1)
+
+
+def fail_on(cache = None, symbol = 'AAA', first_night = DAY, nights = 1):
+    for night in range(nights): cache.record_failure(symbol, 'empty', first_night + datetime.timedelta(days=night))
+
+
+def test_skipped_after_min_failures(tmp_path):
+    cache = NegativeCache(str(tmp_path / 'negative_cache.json'), 3, 7, 180)
+    fail_on(cache, nights=2)
+    assert not cache.should_skip('AAA', DAY + datetime.timedelta(days=2))
+
+    fail_on(cache, first_night=DAY + datetime.timedelta(days=2))
+    assert cache.should_skip('AAA', DAY + datetime.timedelta(days=3))
+    assert cache.should_skip('AAA', DAY + datetime.timedelta(days=8))
+    assert not cache.should_skip('AAA', DAY + datetime.timedelta(days=9))
+    assert [symbol for symbol, entry in cache.get_skipped(DAY + datetime.timedelta(days=3))] == ['AAA']
+
+
+# A re-run on the same day isn't another failed night.
+def test_same_day_counts_once(tmp_path):
+    cache = NegativeCache(str(tmp_path / 'negative_cache.json'), 3, 7, 180)
+    for run in range(5): cache.record_failure('AAA', 'empty', DAY)
+    assert not cache.should_skip('AAA', DAY + datetime.timedelta(days=1))
+
+
+# Each failed re-probe doubles the time skipped, up to max_ttl_days.
+def test_backoff_doubles_up_to_the_max(tmp_path):
+    cache = NegativeCache(str(tmp_path / 'negative_cache.json'), 1, 7, 20)
+    expected = [7, 14, 20, 20]
+    night = DAY
+    for ttl in expected:
+        cache.record_failure('AAA', 'empty', night)
+        assert cache.get_skipped(night)[0][1]['skip_until'] == str(night + datetime.timedelta(days=ttl))
+        night += datetime.timedelta(days=ttl)
+
+
+def test_success_clears_the_symbol(tmp_path):
+    cache = NegativeCache(str(tmp_path / 'negative_cache.json'), 1, 7, 180)
+    fail_on(cache)
+    cache.record_success('AAA')
+    assert not cache.should_skip('AAA', DAY)
+    assert cache.get_skipped(DAY) == []
+
+
+def test_saved_between_runs(tmp_path):
+    path = str(tmp_path / 'negative_cache.json')
+    cache = NegativeCache(path, 1, 7, 180)
+    fail_on(cache)
+    cache.save()
+    assert NegativeCache(path, 1, 7, 180).should_skip('AAA', DAY + datetime.timedelta(days=1))
+
+
+# Each fetch_all answers with the next of replies, a dict of symbol -> quote list, None or the error of its batch.
+class ScriptedFetcher:
+    def __init__(self, *replies):
+        self.replies = list(replies)
+
+    def fetch_all(self, symbol_ranges = ()):
+        reply = self.replies.pop(0)
+        for symbol, start_date, end_date in symbol_ranges:
+            answer = reply.get(symbol)
+            if isinstance(answer, Exception): yield symbol, SymbolResult(error=answer)
+            else: yield symbol, SymbolResult(answer)
+
+
+def sixty_days(symbol = 'AAA', last_day = DAY):
+    days = [last_day - datetime.timedelta(days=i) for i in range(60)]
+    return [{ 'Symbol': symbol, 'Date': str(day), 'Open': 10.0, 'High': 10.5, 'Low': 9.5, 'Close': 10.0, 'Adj_Close': 10.0, 'Volume': 300000 } for day in days]
+
+
+# Only a symbol that comes back empty on its own counts against it.  A batch that couldn't be split is retried
+# at the end of the fetch phase, and listed as unfetched if it fails again.
+def test_screener_only_records_empty_symbols(tmp_path, monkeypatch):
+    monkeypatch.setenv('PRICE_CACHE_DIR', str(tmp_path / 'price_cache'))
+    monkeypatch.setenv('JOURNAL_DIR', str(tmp_path))
+    monkeypatch.setenv('INDICATOR_STATE_FILE', str(tmp_path / 'indicator_state.json'))
+    monkeypatch.setenv('NEGATIVE_CACHE_FILE', str(tmp_path / 'negative_cache.json'))
+    monkeypatch.setenv('NEGATIVE_CACHE_MIN_FAILURES', '1')
+    monkeypatch.setenv('TREND_DB_PATH', str(tmp_path / 'screener.db'))
+    monkeypatch.delenv('TREND_STORE', raising=False)
+
+    fetcher = ScriptedFetcher({ 'AAA': KeyError('quote'), 'BBB': KeyError('quote'), 'CCC': None, 'DDD': sixty_days('DDD') },
+                              { 'AAA': ValueError('Expecting value'), 'BBB': sixty_days('BBB') })
+    monkeypatch.setattr(historical_price_screener, 'open_quote_fetcher', lambda environment = 'DEV': fetcher)
+
+    result = screen_stocks(['AAA', 'BBB', 'CCC', 'DDD'], (), DAY - datetime.timedelta(days=300), DAY, 'DEV')
+
+    assert [symbol for symbol, entry in NegativeCache.from_environment().get_skipped(datetime.date.today())] == ['CCC']
+    assert result.get_unfetched_stocks() == ['AAA']
+    assert fetcher.replies == []
@@ -0,0 +1,30 @@
+from populate_stock_table import diff_stock_list
+from universe import load_universe
+
+
+LISTED = ['S{:02d}'.format(i) for i in range(20)]
+
+
+# Only the symbols that were added or dropped are written, the ones still listed are left alone.
+def test_diff_stock_list():
+    the_stocks = LISTED[1:] + ['NEW']
+    assert diff_stock_list(the_stocks, LISTED) == (['NEW'], ['S00'])
+    assert diff_stock_list(LISTED, LISTED) == ([], [])
+    assert diff_stock_list(LISTED, []) == (LISTED, [])
+
+
+# Stock_List only keys the symbol, so a stock that moved to another exchange isn't written at all.
+def test_moved_listing_is_unchanged(tmp_path):
+    header = '"Symbol","Name","LastSale","MarketCap","IPOyear","Sector","industry","Summary Quote",\n'
+    (tmp_path / 'NASDAQ.csv').write_text(header + '"BBB","Bee","8","$80M","2001","Tech","Software","http://x/bbb",\n')
+    (tmp_path / 'NYSE.csv').write_text(header + '"AAA","Acme","12.5","$300M","2001","Tech","Software","http://x/aaa",\n')
+    the_stocks = load_universe([str(tmp_path / 'NASDAQ.csv'), str(tmp_path / 'NYSE.csv')])
+    assert diff_stock_list(the_stocks, ['AAA', 'BBB']) == ([], [])
+
+
+# An empty universe or too many deletions calls the update off rather than emptying the table.
+def test_deletions_are_guarded():
+    assert diff_stock_list([], LISTED) is None
+    assert diff_stock_list(LISTED[2:], LISTED) == ([], ['S00', 'S01'])
+    assert diff_stock_list(LISTED[3:], LISTED) is None
+    assert diff_stock_list(LISTED[3:], LISTED, .2) == ([], ['S00', 'S01', 'S02'])
@@ -0,0 +1,92 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from historical_price_screener import Security
+from indicator_engine import build_date_matrix, build_price_matrices
+from price_archive import PriceArchive
+
+
+def quote(symbol = 'AAA', date = '', close = 0.0):
+    return { 'Symbol': symbol, 'Date': date, 'Open': close - 0.5, 'High': close + 1.0, 'Low': close - 1.0, 'Close': close, 'Adj_Close': close, 'Volume': int(close * 1000) }
+
+
+# 30 trading days: AAA every day, CCC misses every seventh day and BBB only starts on the eleventh.
+def thirty_days():
+    days = []
+    for i in range(30):
+        date = str(datetime.date(2016, 1, 1) + datetime.timedelta(days=i))
+        quotes = { 'AAA': quote('AAA', date, 10.0 + i) }
+        if i >= 10: quotes['BBB'] = quote('BBB', date, 50.0 + i)
+        if i % 7 != 3: quotes['CCC'] = quote('CCC', date, 5.0 + i / 4)
+        days.append((date, quotes))
+    return days
+
+
+def append_days(archive_dir = ''):
+    archive = PriceArchive(archive_dir)
+    for date, quotes in thirty_days(): archive.append_day(date, quotes)
+    return PriceArchive(archive_dir)
+
+
+def expected_history(symbol = ''):
+    return [(date, quotes[symbol]) for date, quotes in thirty_days() if symbol in quotes]
+
+
+def test_append_and_read_back(tmp_path):
+    archive = append_days(str(tmp_path))
+
+    assert archive.get_day_count() == 30
+    assert archive.get_last_date() == datetime.date(2016, 1, 30)
+    for symbol in ('AAA', 'BBB', 'CCC'):
+        history = archive.get_history(symbol, True)
+        expected = expected_history(symbol)
+        assert [str(date) for date in history['date']] == [date for date, quote in expected]
+        assert list(history['close']) == [quote['Close'] for date, quote in expected]
+        assert list(history['volume']) == [quote['Volume'] for date, quote in expected]
+
+    # Without trading_days_only the days CCC missed are NaN.
+    assert np.isnan(archive.get_history('CCC')['close'][3])
+
+
+def test_build_matches_appending(tmp_path):
+    quote_lists = {}
+    for date, quotes in thirty_days():
+        for symbol, quote in quotes.items(): quote_lists.setdefault(symbol, []).append(quote)
+    built = PriceArchive(str(tmp_path / 'built'))
+    built.build(quote_lists)
+    appended = append_days(str(tmp_path / 'appended'))
+
+    assert np.array_equal(built.get_dates(), appended.get_dates())
+    for symbol in ('AAA', 'BBB', 'CCC'):
+        for name, values in built.get_history(symbol, True).items(): assert np.array_equal(values, appended.get_history(symbol, True)[name]), (symbol, name)
+
+
+def test_days_have_to_be_in_order(tmp_path):
+    archive = append_days(str(tmp_path))
+    with pytest.raises(ValueError): archive.append_day('2016-01-15', { 'AAA': quote('AAA', '2016-01-15', 1.0) })
+
+
+# The matrices line up with what build_price_matrices makes from the Securities, within each stock's trading days.
+@pytest.mark.parametrize('symbols', [None, ['AAA', 'BBB'], ['BBB'], ['CCC', 'AAA']])
+def test_price_matrices_match_the_securities(tmp_path, symbols):
+    archive = append_days(str(tmp_path))
+    symbols = symbols or archive.get_symbols()
+    securities = [Security.from_columns(symbol, archive.get_history(symbol, True)) for symbol in symbols]
+    expected, expected_dates = build_price_matrices(securities), build_date_matrix(securities)
+
+    matrices, dates = archive.get_price_matrices(symbols), archive.get_date_matrix(symbols)
+    assert list(matrices[4]) == list(expected[4])
+    for row, length in enumerate(expected[4]):
+        for values, expected_values in zip(matrices[:4], expected[:4]): assert np.array_equal(values[row, -length:], expected_values[row, -length:])
+        assert np.array_equal(dates[row, -length:], expected_dates[row, -length:])
+        assert np.isnat(dates[row, :-length]).all()
+
+
+# A symbol that traded every day since it was added comes straight from the files, one with gaps is squeezed into a copy.
+def test_price_matrices_are_views(tmp_path):
+    archive = append_days(str(tmp_path))
+    assert np.shares_memory(archive.get_price_matrices(['AAA'])[0], archive.get_column('close'))
+    assert np.shares_memory(archive.get_price_matrices(['BBB'])[0], archive.get_column('close'))
+    assert not np.shares_memory(archive.get_price_matrices(['CCC'])[0], archive.get_column('close'))
@@ -0,0 +1,46 @@
+import datetime
+
+from price_cache import PriceCache
+
+
+def daily_quotes(symbol = 'AAA', first = datetime.date(2016, 6, 1), days = 3):
+    return [{ 'Symbol': symbol, 'Date': str(first + datetime.timedelta(days=i)), 'Close': 10.0 + i } for i in range(days)]
+
+
+def test_only_the_missing_tail_is_requested(tmp_path):
+    cache = PriceCache(str(tmp_path))
+    start, end = datetime.date(2016, 1, 1), datetime.date(2016, 6, 3)
+    assert cache.get_missing_range('AAA', start, end) == (start, end)
+
+    cache.add_quotes('AAA', daily_quotes(), start)
+    assert cache.get_missing_range('AAA', start, end) is None
+    assert cache.get_missing_range('AAA', start, datetime.date(2016, 6, 6)) == (datetime.date(2016, 6, 4), datetime.date(2016, 6, 6))
+    # History from before what is cached means the whole range again.
+    assert cache.get_missing_range('AAA', datetime.date(2015, 12, 1), end) == (datetime.date(2015, 12, 1), end)
+
+
+# A day Yahoo hasn't published yet is asked for again on the next run.
+def test_covered_up_to_the_last_quote(tmp_path):
+    cache = PriceCache(str(tmp_path))
+    start = datetime.date(2016, 1, 1)
+    cache.add_quotes('AAA', daily_quotes(days=2), start)
+    assert cache.get_last_cached_date('AAA') == datetime.date(2016, 6, 2)
+    assert cache.get_missing_range('AAA', start, datetime.date(2016, 6, 3)) == (datetime.date(2016, 6, 3), datetime.date(2016, 6, 3))
+
+
+def test_saved_and_merged_between_runs(tmp_path):
+    start = datetime.date(2016, 1, 1)
+    PriceCache(str(tmp_path)).add_quotes('AAA', daily_quotes(days=2), start)
+    cache = PriceCache(str(tmp_path))
+    cache.add_quotes('AAA', daily_quotes(first=datetime.date(2016, 6, 2), days=3), datetime.date(2016, 6, 2))
+
+    reopened = PriceCache(str(tmp_path))
+    assert reopened.get_cached_symbols() == ['AAA']
+    assert [quote['Date'] for quote in reopened.get_quotes('AAA', start, datetime.date(2016, 6, 30))] == ['2016-06-01', '2016-06-02', '2016-06-03', '2016-06-04']
+    assert [quote['Date'] for quote in reopened.get_quotes('AAA', datetime.date(2016, 6, 2), datetime.date(2016, 6, 3))] == ['2016-06-02', '2016-06-03']
+
+
+def test_corrupt_cache_file_is_fetched_again(tmp_path):
+    (tmp_path / 'AAA.json').write_text('{"covered_from": "2016-')
+    start, end = datetime.date(2016, 1, 1), datetime.date(2016, 6, 3)
+    assert PriceCache(str(tmp_path)).get_missing_range('AAA', start, end) == (start, end)
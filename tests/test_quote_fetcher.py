@@ -0,0 +1,58 @@
+import pytest
+
+import quote_fetcher
+from quote_fetcher import TokenBucket
+
+
+# Stands in for the time module, sleeping just moves the clock forward.
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(quote_fetcher, 'time', fake)
+    return fake
+
+
+def test_tokens_are_handed_out_at_the_rate(clock):
+    bucket = TokenBucket(rate=2.0, capacity=1)
+    for i in range(5): bucket.acquire()
+    # The first token is already in the bucket, the other four take half a second each.
+    assert clock.now - 100.0 == pytest.approx(2.0)
+
+
+def test_a_full_bucket_allows_a_burst(clock):
+    bucket = TokenBucket(rate=1.0, capacity=3)
+    for i in range(3): bucket.acquire()
+    assert clock.sleeps == []
+    bucket.acquire()
+    assert clock.now - 100.0 == pytest.approx(1.0)
+
+
+def test_idle_time_refills_the_bucket_up_to_capacity(clock):
+    bucket = TokenBucket(rate=1.0, capacity=2)
+    bucket.acquire()
+    bucket.acquire()
+    clock.now += 60
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.sleeps == []
+    bucket.acquire()
+    assert sum(clock.sleeps) == pytest.approx(1.0)
+
+
+def test_a_zero_rate_never_waits(clock):
+    bucket = TokenBucket(rate=0)
+    for i in range(100): bucket.acquire()
+    assert clock.sleeps == []
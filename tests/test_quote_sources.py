@@ -0,0 +1,58 @@
+import datetime
+
+import pytest
+
+from quote_sources import YahooYQLSource
+
+
+# The parsed YQL response around results.
+def payload(results = None):
+    return { 'query': { 'count': 0, 'results': results } }
+
+
+def quote(symbol = '', date = '', close = 0.0):
+    return { 'Symbol': symbol, 'Date': date, 'Close': close }
+
+
+def test_a_batch_is_split_by_symbol():
+    quotes = [quote('AAA', '2016-06-02', 10.5), quote('BBB', '2016-06-02', 3.0), quote('AAA', '2016-06-01', 10.0)]
+    split = YahooYQLSource().split_response(payload({ 'quote': quotes }), ['AAA', 'BBB', 'CCC'])
+
+    assert [q['Date'] for q in split['AAA']] == ['2016-06-02', '2016-06-01']
+    assert split['BBB'] == [quotes[1]]
+    # Yahoo left CCC out of the results.
+    assert split['CCC'] is None
+
+
+# One symbol over one trading day comes back as a single dictionary instead of a list.
+def test_a_single_quote_comes_back_as_a_dictionary():
+    split = YahooYQLSource().split_response(payload({ 'quote': quote('AAA', '2016-06-01', 10.0) }), ['AAA'])
+    assert split == { 'AAA': [quote('AAA', '2016-06-01', 10.0)] }
+
+
+def test_no_results_at_all():
+    assert YahooYQLSource().split_response(payload(None), ['AAA', 'BBB']) == { 'AAA': None, 'BBB': None }
+
+
+def test_the_query_covers_the_batch():
+    url = YahooYQLSource().build_query(['AAA', 'BRK-B'], datetime.date(2016, 1, 4), datetime.date(2016, 6, 1))
+    assert 'symbol%20in%20(%22AAA%22%2C%22BRK-B%22)' in url
+    assert 'startDate%20%3D%20%222016-01-04%22' in url and 'endDate%20%3D%20%222016-06-01%22' in url
+
+
+def test_batch_size_is_at_least_one():
+    assert YahooYQLSource(0).get_batch_size() == 1
+    assert YahooYQLSource('50').get_batch_size() == 50
+
+
+def test_anything_but_a_yql_response_is_retried():
+    source = YahooYQLSource()
+    assert source.is_valid_response(payload(None))
+    assert not source.is_valid_response({ 'error': { 'description': 'Query syntax error' } })
+    assert not source.is_valid_response([])
+
+
+# A results dictionary without quotes fails the whole batch, the screener retries it rather than blaming its symbols.
+def test_a_malformed_batch_raises():
+    with pytest.raises(KeyError): YahooYQLSource().split_response(payload({ 'rows': [] }), ['AAA', 'BBB'])
+    with pytest.raises(KeyError): YahooYQLSource().split_response(payload({ 'quote': [{ 'Date': '2016-06-01' }] }), ['AAA'])
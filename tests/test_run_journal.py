@@ -0,0 +1,84 @@
+from run_journal import RunJournal
+from screen_results import NotifiedStock, ScreenResult
+
+
+def notify(result = None, symbol = '', trend_type = 'up'):
+    result.add_notification(NotifiedStock(symbol, 300000, 10.0, 200000, 9.0, 0.1, trend_type))
+
+
+def notified_symbols(result = None):
+    return [stock.get_symbol() for stock in result.get_notifications()]
+
+
+# What a run checkpointed before it died comes back on --resume, the unfinished tail doesn't.
+def test_resume_replays_the_checkpoints(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = RunJournal(path, False, 2)
+    result = ScreenResult('0-of-1')
+
+    notify(result, 'AAA')
+    result.add_up_trend()
+    journal.add_trend_items([{ 'Symbol': 'AAA' }], [{ 'Symbol': 'AAA', 'Date': '2016-06-01' }])
+    assert not journal.mark_complete('AAA')
+    result.add_error('Type Error')
+    assert journal.mark_complete('BBB')
+    assert journal.checkpoint(result) == ([{ 'Symbol': 'AAA' }], [{ 'Symbol': 'AAA', 'Date': '2016-06-01' }])
+
+    # Never checkpointed.
+    notify(result, 'CCC', 'down')
+    journal.mark_complete('CCC')
+    journal.close()
+
+    resumed = RunJournal(path, True, 2)
+    assert resumed.is_complete('AAA') and resumed.is_complete('BBB') and not resumed.is_complete('CCC')
+    replayed = resumed.replay('0-of-1')
+    assert notified_symbols(replayed) == ['AAA']
+    assert replayed.get_up_trend_count() == 1
+    assert replayed.get_error_counter()['Type Error'] == 1
+    assert resumed.get_trend_items() == ([{ 'Symbol': 'AAA' }], [{ 'Symbol': 'AAA', 'Date': '2016-06-01' }])
+    resumed.close()
+
+
+# Each checkpoint only writes what was added since the last one.
+def test_checkpoints_are_incremental(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = RunJournal(path, False, 1)
+    result = ScreenResult()
+    for symbol in ('AAA', 'BBB', 'CCC'):
+        notify(result, symbol)
+        result.add_down_trend()
+        journal.mark_complete(symbol)
+        journal.checkpoint(result)
+    journal.close()
+
+    replayed = RunJournal(path, True).replay()
+    assert notified_symbols(replayed) == ['AAA', 'BBB', 'CCC']
+    assert replayed.get_down_trend_count() == 3
+
+
+# The line being written when the run died is dropped.
+def test_half_written_checkpoint_is_dropped(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = RunJournal(path, False, 1)
+    result = ScreenResult()
+    journal.mark_complete('AAA')
+    journal.checkpoint(result)
+    journal.close()
+    with open(path, 'a') as journal_file: journal_file.write('{"label": "", "completed": ["BB')
+
+    resumed = RunJournal(path, True)
+    assert resumed.is_complete('AAA') and not resumed.is_complete('BBB')
+    resumed.close()
+    with open(path) as journal_file: assert len(journal_file.readlines()) == 1
+
+
+def test_new_run_starts_a_new_journal(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = RunJournal(path, False, 1)
+    journal.mark_complete('AAA')
+    journal.checkpoint(ScreenResult())
+    journal.close()
+
+    journal = RunJournal(path, False, 1)
+    assert not journal.is_complete('AAA')
+    journal.close()
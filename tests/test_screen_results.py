@@ -0,0 +1,59 @@
+from screen_results import NotifiedStock, ScreenResult, shard_symbols
+
+
+SYMBOLS = ['S{}'.format(i) for i in range(200)]
+
+
+def test_shards_split_the_symbols():
+    shards = [shard_symbols(SYMBOLS, i, 3) for i in range(3)]
+    assert sorted(sum(shards, [])) == sorted(SYMBOLS)
+    assert all(len(shard) > 0 for shard in shards)
+    # Order is kept and the same symbol always lands in the same shard.
+    assert shards[0] == [symbol for symbol in SYMBOLS if symbol in shards[0]]
+    assert shard_symbols(SYMBOLS[::-1], 1, 3) == shards[1][::-1]
+
+
+# Splitting a machine's shard across its workers again uses the other bits of the hash.
+def test_shards_split_again_with_stride():
+    machine_shard = shard_symbols(SYMBOLS, 0, 2)
+    workers = [shard_symbols(machine_shard, i, 2, 2) for i in range(2)]
+    assert sorted(sum(workers, [])) == sorted(machine_shard)
+    assert all(len(worker) > 0 for worker in workers)
+
+
+# A stock notified twice (a signal and then a new trend) is on the page once, with the last trend type.
+def test_notifications_are_kept_by_symbol():
+    result = ScreenResult()
+    result.add_notification(NotifiedStock('AAA', 300000, 10.0, 200000, 9.0, 0.1, 'heavy volume reversal'))
+    result.add_notification(NotifiedStock('BBB', 300000, 10.0, 200000, 9.0, 0.1, 'up'))
+    result.add_notification(NotifiedStock('AAA', 300000, 10.0, 200000, 9.0, 0.1, 'up'))
+
+    assert [(stock.get_symbol(), stock.get_trend_type()) for stock in result.get_notifications()] == [('AAA', 'up'), ('BBB', 'up')]
+
+
+def test_merge_and_save(tmp_path):
+    first, second = ScreenResult('0-of-2'), ScreenResult('1-of-2')
+    first.add_notification(NotifiedStock('AAA', 1, 1.0, 1, 1.0, 0.0, 'up'))
+    first.add_up_trend()
+    first.add_error('Type Error')
+    second.add_notification(NotifiedStock('BBB', 2, 2.0, 2, 2.0, 0.0, 'down'))
+    second.add_down_trend()
+    second.add_error('Type Error')
+    second.add_unfetched_stock('CCC')
+    second.add_skipped_stock('DDD')
+
+    path = str(tmp_path / 'shard.json')
+    first.merge(second).save(path)
+    merged = ScreenResult.load(path)
+
+    assert [stock.get_symbol() for stock in merged.get_notifications()] == ['AAA', 'BBB']
+    assert (merged.get_up_trend_count(), merged.get_down_trend_count()) == (1, 1)
+    assert merged.get_error_counter()['Type Error'] == 2
+    assert merged.get_unfetched_stocks() == ['CCC']
+    assert merged.get_skipped_stocks() == ['DDD']
+
+
+def test_notified_stock_record():
+    stock = NotifiedStock('AAA', 300000, 10.0, 200000, 9.0, 0.1, 'up')
+    assert not hasattr(stock, '__dict__')
+    assert NotifiedStock.from_dict(stock.to_dict()).to_dict() == stock.to_dict()
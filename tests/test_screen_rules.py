@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+
+from screen_rules import CompiledRule, Screen, load_screens
+
+
+VALUES = {
+    'close': np.array([4.0, 6.0, 12.0, np.nan]),
+    'volume': np.array([300000.0, 100000.0, 500000.0, 400000.0]),
+    'yesterday_close': np.array([3.0, 7.0, 10.0, 5.0]),
+    'sma10': np.array([1.0, 2.0, 3.0, 4.0]),
+    'ema20': np.array([2.0, 1.0, 3.0, 1.0])
+}
+
+
+def test_comparisons_and_boolean_operators():
+    assert list(CompiledRule('volume >= 250000 and close > yesterday_close').evaluate(VALUES)) == [True, False, True, False]
+    assert list(CompiledRule('sma10 > ema20 or not close > 5').evaluate(VALUES)) == [True, True, False, True]
+
+
+# a < b < c is (a < b) and (b < c) like in Python.
+def test_chained_comparison():
+    assert list(CompiledRule('5 <= close <= 20').evaluate(VALUES)) == [False, True, True, False]
+
+
+def test_arithmetic():
+    assert list(CompiledRule('yesterday_close / close < .8').evaluate(VALUES)) == [True, False, False, False]
+    assert list(CompiledRule('-close + 2 * sma10 > -3').evaluate(VALUES)) == [True, True, False, False]
+
+
+# NaN (not enough history) never matches.
+def test_nan_never_matches():
+    assert not CompiledRule('close > 0').evaluate(VALUES)[3]
+    assert not CompiledRule('close < 0').evaluate(VALUES)[3]
+
+
+def test_indicators_and_lookback():
+    rule = CompiledRule('sma10 > ema30 and cmf15 > 0 and volume > 0')
+    assert rule.get_indicators() == {'sma10', 'ema30', 'cmf15', 'volume'}
+    # The EMA needs one day past its period.
+    assert rule.get_lookback() == 31
+
+
+@pytest.mark.parametrize('expression', ['close >', 'close > 5 if volume else 2', 'foo > 1', '__import__("os")', 'close.real > 1', '5 > 3', 'close in (1, 2)'])
+def test_rejects_bad_rules(expression):
+    with pytest.raises(ValueError): CompiledRule(expression)
+
+
+def test_screen_parameters():
+    screen = Screen('reversal', 'signal', 'volume >= {min_volume} and close > {min_price}', True, True, { 'min_volume': '250000', 'min_price': '5' })
+    assert screen.get_rule().get_expression() == 'volume >= 250000 and close > 5'
+    assert list(screen.evaluate(VALUES)) == [False, False, True, False]
+
+    cheaper = screen.with_parameters({ 'min_price': '3', 'sma_period': '5' })
+    assert cheaper.get_rule().get_expression() == 'volume >= 250000 and close > 3'
+    assert cheaper.get_parameters() == { 'min_volume': '250000', 'min_price': '3' }
+    # The original is left alone.
+    assert screen.get_parameters()['min_price'] == '5'
+
+
+def test_screen_missing_parameter():
+    with pytest.raises(ValueError): Screen('reversal', 'signal', 'volume >= {min_volume}')
+
+
+def write_screens(tmp_path, text = ''):
+    path = tmp_path / 'screens.ini'
+    path.write_text(text)
+    return str(path)
+
+
+SCREENS = """
+[DEFAULT]
+sma_period = 10
+min_volume = 250000
+
+[heavy volume]
+type = signal
+rule = volume >= {min_volume}
+
+[quiet]
+type = signal
+enabled = no
+report = no
+rule = volume < {min_volume}
+
+[up]
+type = trend
+rule = sma{sma_period} > ema20
+
+[down]
+type = trend
+rule = sma{sma_period} < ema20
+"""
+
+
+def test_load_screens(tmp_path):
+    screens = load_screens(write_screens(tmp_path, SCREENS))
+
+    assert [s.get_name() for s in screens.get_signals()] == ['heavy volume']
+    assert [s.get_name() for s in screens.get_signals(True)] == ['heavy volume', 'quiet']
+    assert not screens.get_signals(True)[1].is_reported()
+    assert screens.get_indicators() == ['ema20', 'sma10', 'volume']
+    assert screens.get_lookback() == 21
+    assert screens.get_parameters() == { 'sma_period': '10', 'min_volume': '250000' }
+
+
+def test_screen_set_with_parameters(tmp_path):
+    screens = load_screens(write_screens(tmp_path, SCREENS))
+
+    swept = screens.with_parameters({ 'sma_period': '5', 'min_volume': '1000' })
+    assert swept.get_trend('up').get_rule().get_expression() == 'sma5 > ema20'
+    assert swept.get_signals()[0].get_rule().get_expression() == 'volume >= 1000'
+    assert screens.get_trend('up').get_rule().get_expression() == 'sma10 > ema20'
+
+    with pytest.raises(ValueError): screens.with_parameters({ 'max_price': '20' })
+
+
+def test_load_screens_errors(tmp_path):
+    with pytest.raises(FileNotFoundError): load_screens(str(tmp_path / 'missing.ini'))
+    with pytest.raises(ValueError): load_screens(write_screens(tmp_path, "[up]\ntype = trend\nrule = sma10 > ema20\n"))
+    with pytest.raises(ValueError): load_screens(write_screens(tmp_path, SCREENS + "\n[odd]\ntype = alert\nrule = close > 1\n"))
+
+
+# The screens file that ships with the screener compiles.
+def test_shipped_screens_file():
+    screens = load_screens()
+    assert screens.get_trend('up') is not None and screens.get_trend('down') is not None
+    assert len(screens.get_signals(True)) > 0
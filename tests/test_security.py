@@ -0,0 +1,70 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from historical_price_screener import Security
+
+
+FIRST_DAY = datetime.date(2016, 6, 1)
+
+
+# Twelve trading days, skipping the weekends, with a flat day (high == low) on the fourth.
+def trading_days():
+    quotes, day = [], FIRST_DAY
+    while len(quotes) < 12:
+        if day.weekday() < 5:
+            i = len(quotes)
+            close = 20.0 + ((i * 7) % 5) - i * 0.3
+            spread = 0.0 if i == 3 else 0.25 * (1 + i % 3)
+            quotes.append({ 'Symbol': 'AAA', 'Date': str(day), 'Open': close, 'High': close + spread, 'Low': close - spread / 2,
+                            'Close': close, 'Adj_Close': close, 'Volume': 1000 * (i + 1) + (i % 4) * 250 })
+        day += datetime.timedelta(days=1)
+    return quotes
+
+
+# The straightforward windowed mean of a column, zero when the window reaches back past the first day.
+def windowed_mean(quotes = None, key = '', period = 0, end = 0):
+    if end < period: return 0.0
+    return sum(quote[key] for quote in quotes[end - period:end]) / period
+
+
+def windowed_cmf(quotes = None, period = 0, end = 0):
+    if end < period: return 0.0
+    flow, volume = 0.0, 0.0
+    for quote in quotes[end - period:end]:
+        day_range = quote['High'] - quote['Low']
+        if day_range > 0: flow += ((quote['Close'] - quote['Low']) - (quote['High'] - quote['Close'])) / day_range * quote['Volume']
+        volume += quote['Volume']
+    return flow / volume
+
+
+# Every period, including ones longer than the history, ending on every trading day.
+def test_prefix_sums_match_the_windowed_mean():
+    quotes = trading_days()
+    security = Security(quotes)
+
+    for end in range(1, len(quotes) + 1):
+        end_date = quotes[end - 1]['Date']
+        for period in range(1, len(quotes) + 4):
+            assert security.get_sma(period, end_date) == pytest.approx(windowed_mean(quotes, 'Close', period, end)), (period, end_date)
+            assert security.get_average_volume(period, end_date) == pytest.approx(windowed_mean(quotes, 'Volume', period, end)), (period, end_date)
+            assert security.get_cmf(period, end_date) == pytest.approx(windowed_cmf(quotes, period, end)), (period, end_date)
+
+
+def test_defaults_to_the_last_trading_day():
+    quotes = trading_days()
+    security = Security(quotes)
+    assert security.get_sma(10) == pytest.approx(windowed_mean(quotes, 'Close', 10, 12))
+    assert security.get_sma(10) == security.get_indicator('sma10')
+    assert security.get_average_volume(13) == 0.0
+
+
+# A day without trading means the last trading day before it, a day before the first trading day has no history.
+def test_end_date_between_trading_days():
+    quotes = trading_days()
+    security = Security(quotes)
+    saturday = datetime.date(2016, 6, 4)
+    assert security.get_sma(3, saturday) == security.get_sma(3, '2016-06-03') == pytest.approx(windowed_mean(quotes, 'Close', 3, 3))
+    assert security.get_average_volume(1, FIRST_DAY - datetime.timedelta(days=1)) == 0.0
+    assert np.isclose(security.get_sma(1, datetime.date(2030, 1, 1)), quotes[-1]['Close'])
@@ -0,0 +1,36 @@
+import numpy as np
+
+from screen_rules import load_screens
+from signals import SignalSeries, new_trend_signals
+
+
+# An up signal is a new trend unless the stock was already up, a down signal only when it had no trend at all.
+def test_new_trend_signals():
+    up = np.array([[True, True, False, False, True, False]])
+    down = np.array([[False, False, False, True, False, True]])
+    new_up, new_down = new_trend_signals(up, down)
+    assert list(new_up[0]) == [True, False, False, False, True, False]
+    assert list(new_down[0]) == [False, False, False, False, False, False]
+
+    new_up, new_down = new_trend_signals(np.array([[False, False, True]]), np.array([[True, True, False]]))
+    assert list(new_up[0]) == [False, False, True]
+    assert list(new_down[0]) == [True, False, False]
+
+
+# The screens file's rules over a (symbols x days) matrix, with the parameters swept.
+def test_screen_days_follows_the_screens_parameters(tmp_path):
+    path = tmp_path / 'screens.ini'
+    path.write_text("[DEFAULT]\nmin_volume = 250000\n\n[heavy volume]\ntype = signal\nrule = volume >= {min_volume}\n\n"
+                    "[up]\ntype = trend\nrule = close > yesterday_close\n\n[down]\ntype = trend\nrule = close < yesterday_close\n")
+    screens = load_screens(str(path))
+
+    closes = np.array([[1.0, 2.0, 3.0, 2.0, 4.0]])
+    volumes = np.array([[100000.0, 200000.0, 300000.0, 400000.0, 150000.0]])
+    series = SignalSeries(closes, volumes, np.array([5]), min_days=2)
+
+    days = dict(series.screen_days(screens))
+    assert list(days['heavy volume'][0]) == [False, False, True, True, False]
+    assert list(days['up'][0]) == [False, True, False, False, True]
+
+    days = dict(series.screen_days(screens.with_parameters({ 'min_volume': '150000' })))
+    assert list(days['heavy volume'][0]) == [False, True, True, True, True]
@@ -0,0 +1,80 @@
+import datetime
+import os
+
+from indicator_state import IndicatorStateStore
+from negative_cache import NegativeCache
+from state_files import find_worker_files, labelled_path, load_records, save_json, save_records
+
+
+DAY = datetime.date(2016, 6, 1)
+
+
+# Backdates the files' modification times, the worker files are folded in by age.
+def backdate(paths = (), seconds = 0):
+    for path in paths: os.utime(path, (seconds, seconds))
+
+
+# The shard label goes before the extension, an unsharded run keeps the plain name.
+def test_labelled_path():
+    assert labelled_path('state/indicator_state.json', '') == 'state/indicator_state.json'
+    assert labelled_path('state/indicator_state.json', '0-of-2') == 'state/indicator_state.0-of-2.json'
+
+
+# The worker files are folded in oldest first, a None record drops the symbol.
+def test_worker_records_are_folded_in(tmp_path):
+    path = str(tmp_path / 'state.json')
+    save_records(path, { 'AAA': 1, 'BBB': 2, 'CCC': 3 })
+    save_json(str(tmp_path / 'state.worker-0-of-2-11.json'), { 'AAA': 10, 'BBB': None })
+    save_json(str(tmp_path / 'state.worker-1-of-2-12.json'), { 'AAA': 20 })
+    backdate([str(tmp_path / 'state.worker-1-of-2-12.json')], 1)
+
+    records, worker_files = load_records(path)
+    assert records == { 'AAA': 10, 'CCC': 3 }
+    assert len(worker_files) == 2
+
+    save_records(path, records, worker_files)
+    assert find_worker_files(path) == []
+    assert load_records(path) == ({ 'AAA': 10, 'CCC': 3 }, [])
+
+
+# Another machine shard's files aren't this one's worker files.
+def test_other_shards_are_left_alone(tmp_path):
+    path = str(tmp_path / 'state.json')
+    save_records(labelled_path(path, '0-of-2'), { 'AAA': 1 })
+    save_json(str(tmp_path / 'state.0-of-2.worker-1-of-3-11.json'), { 'AAA': 2 })
+    assert find_worker_files(path) == []
+    assert len(find_worker_files(labelled_path(path, '0-of-2'))) == 1
+
+
+# The failures saved by four workers are all there for a run with two, and then for one.
+def test_worker_count_can_change(tmp_path, monkeypatch):
+    monkeypatch.setenv('NEGATIVE_CACHE_FILE', str(tmp_path / 'negative_cache.json'))
+    monkeypatch.setenv('NEGATIVE_CACHE_MIN_FAILURES', '1')
+    symbols = ['S{}'.format(i) for i in range(8)]
+    for worker in range(4):
+        cache = NegativeCache.from_environment('', "{}-of-4".format(worker))
+        for symbol in symbols[worker::4]: cache.record_failure(symbol, 'empty', DAY)
+        cache.save()
+    backdate(find_worker_files(str(tmp_path / 'negative_cache.json')), 1)
+
+    cache = NegativeCache.from_environment('', '0-of-2')
+    assert [symbol for symbol, entry in cache.get_skipped(DAY)] == symbols
+    cache.record_success('S0')
+    cache.save()
+
+    # What the coordinator does once the workers are done.
+    NegativeCache.from_environment().save()
+    assert find_worker_files(str(tmp_path / 'negative_cache.json')) == []
+    assert [symbol for symbol, entry in NegativeCache.from_environment().get_skipped(DAY)] == symbols[1:]
+
+
+# A worker that advanced nothing saves an empty worker file and leaves the main file be.
+def test_indicator_state_worker_saves_only_its_changes(tmp_path):
+    path = str(tmp_path / 'indicator_state.json')
+    save_records(path, { 'AAA': { 'symbol': 'AAA' }, 'BBB': { 'symbol': 'BBB' } })
+    IndicatorStateStore(path, '0-of-2').save()
+
+    worker_files = find_worker_files(path)
+    assert len(worker_files) == 1
+    assert load_records(worker_files[0])[0] == {}
+    assert sorted(load_records(path)[0]) == ['AAA', 'BBB']
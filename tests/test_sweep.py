@@ -0,0 +1,66 @@
+import datetime
+import math
+
+import pytest
+
+from backtest import backtest_symbols
+from price_cache import PriceCache
+from screen_rules import DEFAULT_SCREENS_FILE, load_screens
+from sweep import default_grid, grid_combinations, parse_parameter, sweep_symbols
+
+
+SYMBOLS = ['AAA', 'BBB', 'CCC', 'DDD']
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    cache = PriceCache(str(tmp_path))
+    first_day = datetime.date(2016, 1, 1)
+    for n, symbol in enumerate(SYMBOLS):
+        quotes = []
+        # DDD only has 60 days, enough for the nightly screens but not for a 60 day EMA.
+        for i in range(60 if symbol == 'DDD' else 150):
+            close = round(10.0 + 4 * math.sin(i / (5.0 + n * 3)) + i * 0.01 * n, 4)
+            quotes.append({ 'Symbol': symbol, 'Date': str(first_day + datetime.timedelta(days=i)), 'Open': close, 'High': close + 0.2,
+                            'Low': close - 0.2, 'Close': close, 'Adj_Close': close, 'Volume': 200000 + (i * 7919) % 150000 })
+        cache.add_quotes(symbol, quotes, first_day)
+    return str(tmp_path)
+
+
+# The screens file's own values come first in the grid, and with them the sweep scores the same signals as the backtest.
+def test_nightly_combination_matches_the_backtest(cache_dir):
+    nightly = grid_combinations(default_grid(load_screens()))[0]
+    assert nightly == load_screens().get_parameters()
+    other = dict(nightly, sma_period='5')
+    stats = sweep_symbols(SYMBOLS, cache_dir, None, None, (5, 30), [nightly, other])
+
+    assert stats[0] == backtest_symbols(SYMBOLS, cache_dir, None, None, (5, 30))
+    assert stats[0]['up']['signals'] > 0
+    assert stats[1] != stats[0]
+
+
+
+# A combination that needs more history than the others only screens the stocks and days the backtest would with its values.
+def test_each_combination_gets_its_own_window(cache_dir, tmp_path):
+    screens_file = tmp_path / 'screens.ini'
+    with open(DEFAULT_SCREENS_FILE) as default_file: screens_file.write_text(default_file.read().replace('ema_slow = 30', 'ema_slow = 60'))
+
+    nightly = load_screens().get_parameters()
+    long_window = dict(nightly, ema_slow='60')
+    stats = sweep_symbols(SYMBOLS, cache_dir, None, None, (5, 10), [nightly, long_window])
+
+    assert stats[1] == backtest_symbols(SYMBOLS, cache_dir, None, None, (5, 10), str(screens_file))
+    assert stats[1]['up']['signals'] > 0
+    assert stats[0] == backtest_symbols(SYMBOLS, cache_dir, None, None, (5, 10))
+
+
+def test_parse_parameter():
+    assert parse_parameter('sma_period=5,10') == ('sma_period', [['5'], ['10']])
+    assert parse_parameter('min_price/max_price=5/20,2/40') == ('min_price/max_price', [['5', '20'], ['2', '40']])
+    with pytest.raises(ValueError): parse_parameter('ema_fast/ema_slow=20')
+
+
+def test_grid_combinations():
+    grid = { 'sma_period': [['10'], ['5']], 'ema_fast/ema_slow': [['20', '30'], ['15', '25']] }
+    assert grid_combinations(grid) == [{ 'sma_period': '10', 'ema_fast': '20', 'ema_slow': '30' }, { 'sma_period': '10', 'ema_fast': '15', 'ema_slow': '25' },
+                                       { 'sma_period': '5', 'ema_fast': '20', 'ema_slow': '30' }, { 'sma_period': '5', 'ema_fast': '15', 'ema_slow': '25' }]
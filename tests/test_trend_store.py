@@ -0,0 +1,152 @@
+import threading
+
+import pytest
+from botocore.exceptions import ClientError
+
+import trend_store
+from trend_store import SqliteTrendStore, TrendStore, WriteBehindTrendStore, open_trend_store, parallel_batch_write
+
+
+def current_trend(symbol = '', up_trend = True, date = '2016-06-01'):
+    return { 'stock_symbol': symbol, 'up_trend': up_trend, 'down_trend': not up_trend, 'trend_start_date': date }
+
+
+def history_entry(symbol = '', date = '', trend_type = 'up'):
+    return { 'stock_symbol': symbol, 'occurence_date': date, 'trend_type': trend_type }
+
+
+def test_sqlite_store_round_trip(tmp_path):
+    store = SqliteTrendStore(str(tmp_path / 'screener.db'))
+    store.write_trends([current_trend('AAA'), current_trend('BBB', False)], [history_entry('AAA', '2016-06-02'), history_entry('AAA', '2016-06-01', 'down')])
+    # Writing an item again replaces it.
+    store.write_trends([current_trend('AAA', False, '2016-06-03')], [history_entry('AAA', '2016-06-02', 'heavy volume reversal')])
+
+    assert store.get_current_trend('AAA') == current_trend('AAA', False, '2016-06-03')
+    assert store.get_current_trend('ZZZ') is None
+    assert sorted(store.load_current_trends()) == ['AAA', 'BBB']
+    assert store.query_trend_history('AAA') == [history_entry('AAA', '2016-06-01', 'down'), history_entry('AAA', '2016-06-02', 'heavy volume reversal')]
+
+    store.reset()
+    assert store.load_current_trends() == {}
+    store.close()
+
+
+# Reads see every write queued before them, and closing applies the rest.
+def test_write_behind_store(tmp_path):
+    path = str(tmp_path / 'screener.db')
+    store = WriteBehindTrendStore(SqliteTrendStore(path), 2)
+    for i in range(5): store.write_trends([current_trend('S{}'.format(i))], [history_entry('S{}'.format(i), '2016-06-01')])
+    assert len(store.load_current_trends()) == 5
+
+    store.write_trends([current_trend('LAST')])
+    store.close()
+    assert SqliteTrendStore(path).get_current_trend('LAST') == current_trend('LAST')
+
+
+class FailingStore(SqliteTrendStore):
+    def write_trends(self, current_trend_items = (), trend_history_items = ()):
+        raise RuntimeError("The db went away")
+
+
+def test_write_behind_store_raises_write_errors(tmp_path):
+    store = WriteBehindTrendStore(FailingStore(str(tmp_path / 'screener.db')))
+    store.write_trends([current_trend('AAA')])
+    with pytest.raises(RuntimeError): store.flush()
+    store.close()
+
+
+# A store has to implement the whole interface.
+def test_trend_store_is_abstract():
+    with pytest.raises(TypeError): TrendStore()
+
+    class PartialStore(TrendStore):
+        def load_current_trends(self):
+            return {}
+
+    with pytest.raises(TypeError): PartialStore()
+
+
+def test_open_trend_store_backends(tmp_path, monkeypatch):
+    monkeypatch.setenv('TREND_DB_PATH', str(tmp_path / 'screener.db'))
+    monkeypatch.delenv('TREND_STORE', raising=False)
+    store = open_trend_store('DEV')
+    assert isinstance(store, SqliteTrendStore)
+    store.close()
+
+    monkeypatch.setenv('TREND_STORE', 'flatfile')
+    with pytest.raises(ValueError): open_trend_store('DEV')
+
+
+# Stands in for the DynamoDB resource, a table's batch writer applies its requests to items when it exits.
+# The first throttled_writes batches to exit are throttled instead and apply nothing.
+class FakeDynamoDB:
+    def __init__(self, items = None, throttled_writes = 0, error_code = 'ProvisionedThroughputExceededException'):
+        self.items = dict(items or {})
+        self.throttled_writes = throttled_writes
+        self.error_code = error_code
+        self.batches = 0
+        self._lock = threading.Lock()
+
+    def Table(self, name):
+        return self
+
+    def batch_writer(self):
+        return FakeBatch(self)
+
+
+class FakeBatch:
+    def __init__(self, db = None):
+        self._db = db
+        self._requests = []
+
+    def __enter__(self):
+        return self
+
+    def put_item(self, Item = None):
+        self._requests.append(('put', Item))
+
+    def delete_item(self, Key = None):
+        self._requests.append(('delete', Key))
+
+    def __exit__(self, *exc_info):
+        with self._db._lock:
+            self._db.batches += 1
+            if self._db.throttled_writes > 0:
+                self._db.throttled_writes -= 1
+                raise ClientError({ 'Error': { 'Code': self._db.error_code, 'Message': 'Slow down' } }, 'BatchWriteItem')
+            for action, item in self._requests:
+                if action == 'put': self._db.items[item['stock_symbol']] = item
+                else: self._db.items.pop(item['stock_symbol'], None)
+
+
+def use_fake_dynamodb(monkeypatch, db = None):
+    monkeypatch.setattr(trend_store, 'dynamodb_resource', lambda environment = 'DEV': db)
+    return db
+
+
+# The puts and deletes are written 25 to a batch, the batches spread over the worker threads.
+def test_parallel_batch_write_spreads_the_chunks(monkeypatch):
+    db = use_fake_dynamodb(monkeypatch, FakeDynamoDB({ 'OLD{}'.format(i): { 'stock_symbol': 'OLD{}'.format(i) } for i in range(30) }))
+    puts = [{ 'stock_symbol': 'NEW{}'.format(i) } for i in range(60)]
+    deletes = [{ 'stock_symbol': 'OLD{}'.format(i) } for i in range(20)]
+    parallel_batch_write('DEV', 'Stock_List', puts, deletes, 3, 25)
+
+    assert sorted(db.items) == sorted(['NEW{}'.format(i) for i in range(60)] + ['OLD{}'.format(i) for i in range(20, 30)])
+    assert db.batches == 4
+
+    parallel_batch_write('DEV', 'Stock_List', (), (), 3, 25)
+    assert db.batches == 4
+
+
+# A throttled chunk is written again after a backoff, anything else is raised straight away.
+def test_parallel_batch_write_retries_throttling(monkeypatch):
+    db = use_fake_dynamodb(monkeypatch, FakeDynamoDB(throttled_writes=3))
+    parallel_batch_write('DEV', 'Stock_List', [{ 'stock_symbol': 'AAA' }], (), 1, 25, 3, 0.0, 0.0)
+    assert db.items == { 'AAA': { 'stock_symbol': 'AAA' } } and db.batches == 4
+
+    use_fake_dynamodb(monkeypatch, FakeDynamoDB(throttled_writes=3))
+    with pytest.raises(ClientError): parallel_batch_write('DEV', 'Stock_List', [{ 'stock_symbol': 'AAA' }], (), 1, 25, 2, 0.0, 0.0)
+
+    db = use_fake_dynamodb(monkeypatch, FakeDynamoDB(throttled_writes=1, error_code='ValidationException'))
+    with pytest.raises(ClientError): parallel_batch_write('DEV', 'Stock_List', [{ 'stock_symbol': 'AAA' }], (), 1, 25, 8, 0.0, 0.0)
+    assert db.batches == 1
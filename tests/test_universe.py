@@ -0,0 +1,81 @@
+import pytest
+
+from universe import UniverseFilter, load_universe, parse_amount
+
+
+HEADER = '"Symbol","Name","LastSale","MarketCap","IPOyear","Sector","industry","Summary Quote",\n'
+
+
+def company_list(tmp_path, name = '', rows = ()):
+    path = tmp_path / name
+    path.write_text(HEADER + ''.join(rows))
+    return str(path)
+
+
+@pytest.mark.parametrize('value, amount', [('9.389', 9.389), ('$55.85M', 55.85e6), ('$1.2B', 1.2e9), ('$300M', 300e6), ('$512.5K', 512500.0),
+                                           ('1,250.5', 1250.5), (' $2T ', 2e12), ('n/a', None), ('', None), ('$', None), ('abc', None)])
+def test_parse_amount(value, amount):
+    assert parse_amount(value) == (pytest.approx(amount) if amount is not None else None)
+
+
+# A quoted comma in the company name doesn't shift LastSale and MarketCap over.
+def test_quoted_commas(tmp_path):
+    path = company_list(tmp_path, 'NASDAQ.csv', ['"AAA","Acme, Inc.","12.5","$300M","n/a","Tech","Software","http://x/aaa",\n',
+                                                 '"BBB","Big Co","4.1","$1.2B","1999","Tech","Software","http://x/bbb",\n'])
+    assert load_universe([path], None, False) == ['AAA', 'BBB']
+    assert load_universe([path], UniverseFilter(min_price=5), False) == ['AAA']
+
+
+# A row with an n/a anywhere in it is skipped unless skip_na is off.
+def test_n_a_rows(tmp_path):
+    path = company_list(tmp_path, 'NYSE.csv', ['"AAA","Acme","12.5","$300M","n/a","Tech","Software","http://x/aaa",\n',
+                                               '"BBB","Big Co","4.1","$1.2B","1999","Tech","Software","http://x/bbb",\n'])
+    assert load_universe([path]) == ['BBB']
+    assert load_universe([path], None, False) == ['AAA', 'BBB']
+
+
+# A symbol listed by more than one exchange is kept once, from the first list, and blank symbols are dropped.
+def test_duplicates_across_exchanges(tmp_path):
+    nasdaq = company_list(tmp_path, 'NASDAQ.csv', ['"AAA","Acme","12.5","$300M","2001","Tech","Software","http://x/aaa",\n',
+                                                   '"CCC","Cee","8","$80M","2001","Tech","Software","http://x/ccc",\n'])
+    nyse = company_list(tmp_path, 'NYSE.csv', ['"BBB","Big Co","4.1","$1.2B","1999","Tech","Software","http://x/bbb",\n',
+                                               '"AAA","Acme","99","$9B","2001","Tech","Software","http://x/aaa",\n',
+                                               '"  ","Nobody","1","$1M","2001","Tech","Software","http://x/",\n'])
+    assert load_universe([nasdaq, nyse]) == ['AAA', 'CCC', 'BBB']
+    # A listing that is filtered out doesn't hide the symbol's listing on the other exchange.
+    assert load_universe([nasdaq, nyse], UniverseFilter(min_price=20)) == ['AAA']
+
+
+ROW = { 'LastSale': '10.00', 'MarketCap': '$300M' }
+
+
+@pytest.mark.parametrize('universe_filter, reason', [
+    (UniverseFilter(), None),
+    (UniverseFilter(min_price=10), None),
+    (UniverseFilter(min_price=10.01), 'price'),
+    (UniverseFilter(max_price=10), None),
+    (UniverseFilter(max_price=9.99), 'price'),
+    (UniverseFilter(min_market_cap=300e6), None),
+    (UniverseFilter(min_market_cap=1.2e9), 'market cap'),
+])
+def test_filter_thresholds(universe_filter, reason):
+    assert universe_filter.rejects(ROW) == reason
+
+
+# Without a price or market cap there is nothing to filter the row on.
+def test_filter_keeps_rows_without_amounts():
+    universe_filter = UniverseFilter(1, 20, 50e6)
+    assert universe_filter.rejects({ 'LastSale': 'n/a', 'MarketCap': '' }) is None
+    assert universe_filter.rejects({}) is None
+
+
+def test_filter_from_environment(monkeypatch):
+    monkeypatch.delenv('UNIVERSE_MIN_PRICE', raising=False)
+    monkeypatch.delenv('UNIVERSE_MAX_PRICE', raising=False)
+    monkeypatch.delenv('UNIVERSE_MIN_MARKET_CAP', raising=False)
+    assert not UniverseFilter.from_environment().is_active()
+
+    monkeypatch.setenv('UNIVERSE_MIN_MARKET_CAP', '50M')
+    universe_filter = UniverseFilter.from_environment()
+    assert universe_filter.is_active()
+    assert universe_filter.rejects({ 'MarketCap': '$49.9M' }) == 'market cap'
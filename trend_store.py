@@ -0,0 +1,318 @@
+#!/usr/bin/python
+
+import abc
+import logging
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+
+    # Storage for the Current_Trend and Trend_History tables.
+    #
+    # TrendStore is the interface the screener and the helper scripts talk to.  There are two
+    # implementations: DynamoTrendStore (PROD, or DynamoDB Local) and SqliteTrendStore, an embedded
+    # database file for local development and benchmarking.  open_trend_store picks one based on
+    # the environment.
+    #
+    # The whole Current_Trend table is read once up front, the new/existing trend decisions are made
+    # against that dictionary, and only the rows that changed are written back.  WriteBehindTrendStore
+    # queues those writes and applies them in batches on a background thread so the screening loop
+    # never waits on the database.
+    #
+    # Items are plain dictionaries with the same attribute names as the DynamoDB tables:
+    #    Current_Trend: stock_symbol, up_trend, down_trend, trend_start_date
+    #    Trend_History: stock_symbol, occurence_date, trend_type
+    ##################################################
+
+
+class TrendStore(abc.ABC):
+    # Returns a dictionary of stock_symbol -> Current_Trend item.
+    @abc.abstractmethod
+    def load_current_trends(self):
+        pass
+
+    # Returns the Current_Trend item for one stock or None.
+    @abc.abstractmethod
+    def get_current_trend(self, symbol = ''):
+        pass
+
+    # Returns the Trend_History items for one stock sorted by occurence_date.
+    @abc.abstractmethod
+    def query_trend_history(self, symbol = ''):
+        pass
+
+    # Writes Current_Trend and Trend_History items.  The last write for a key wins.
+    @abc.abstractmethod
+    def write_trends(self, current_trend_items = (), trend_history_items = ()):
+        pass
+
+    # Drops both tables and creates them again empty.
+    @abc.abstractmethod
+    def reset(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def dynamodb_resource(environment = 'DEV'):
+    # Depending on environment, open locally or to our PROD db.
+    # we default to local development.
+    if environment == "PROD": return boto3.session.Session().resource('dynamodb', region_name='us-east-1', endpoint_url="http://dynamodb.us-east-1.amazonaws.com")
+    return boto3.session.Session().resource('dynamodb', region_name='us-west-2', endpoint_url="http://localhost:8000")
+
+
+# Reads a whole table with total_segments parallel scans and returns the list of items.
+# Each segment gets its own session since boto3 resources can't be shared between threads.
+def parallel_scan(environment = 'DEV', table_name = '', total_segments = 4):
+    def scan_segment(segment):
+        table = dynamodb_resource(environment).Table(table_name)
+        items = []
+        scan_kwargs = { 'Segment': segment, 'TotalSegments': total_segments }
+        while True:
+            response = table.scan(**scan_kwargs)
+            items.extend(response['Items'])
+            if 'LastEvaluatedKey' not in response: return items
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    with ThreadPoolExecutor(max_workers=total_segments) as executor:
+        return [item for segment_items in executor.map(scan_segment, range(total_segments)) for item in segment_items]
+
+
+# Puts put_items and deletes delete_keys through batch_writer from workers parallel threads, each with its own session.
+# The items go in chunks of chunk_size, a chunk that gets throttled is written again after a backoff of up to
+# backoff_max seconds (puts and deletes can safely be repeated), and after max_retries tries the error is raised.
+def parallel_batch_write(environment = 'DEV', table_name = '', put_items = (), delete_keys = (), workers = 4, chunk_size = 25, max_retries = 8, backoff_base = 1.0, backoff_max = 60.0):
+    requests = [('put', item) for item in put_items] + [('delete', key) for key in delete_keys]
+    chunks = [requests[i:i + chunk_size] for i in range(0, len(requests), chunk_size)]
+    throttling_errors = ('ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded')
+
+    def write_chunks(worker):
+        table = dynamodb_resource(environment).Table(table_name)
+        for chunk in chunks[worker::workers]:
+            for attempt in range(max_retries + 1):
+                try:
+                    with table.batch_writer() as batch:
+                        for action, item in chunk:
+                            if action == 'put': batch.put_item(Item=item)
+                            else: batch.delete_item(Key=item)
+                    break
+                except ClientError as ce:
+                    if ce.response.get('Error', {}).get('Code') not in throttling_errors or attempt == max_retries: raise
+                    wait_time = random.uniform(0, min(backoff_max, backoff_base * (2 ** attempt)))
+                    logging.warn("Writes to {} are being throttled, trying again in {:.1f} seconds.".format(table_name, wait_time))
+                    time.sleep(wait_time)
+
+    workers = max(min(workers, len(chunks)), 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for future in [executor.submit(write_chunks, worker) for worker in range(workers)]: future.result()
+
+
+class DynamoTrendStore(TrendStore):
+    # Interesting thing to note is that when you create the tables you only define the keys.  Not the other attributes.
+    table_definitions = {
+        # There is one entry per stock symbol in this table.
+        'Current_Trend': {
+            'KeySchema': [ { 'AttributeName': 'stock_symbol', 'KeyType': 'HASH' } ],
+            'AttributeDefinitions': [ { 'AttributeName': 'stock_symbol', 'AttributeType': 'S' } ],
+        },
+        # There will be many entries per stock symbol in this table.
+        'Trend_History': {
+            'KeySchema': [ { 'AttributeName': 'stock_symbol', 'KeyType': 'HASH' }, { 'AttributeName': 'occurence_date', 'KeyType': 'RANGE' } ],
+            'AttributeDefinitions': [ { 'AttributeName': 'stock_symbol', 'AttributeType': 'S' }, { 'AttributeName': 'occurence_date', 'AttributeType': 'S' } ],
+        },
+    }
+
+    def __init__(self, environment = 'DEV', scan_segments = 4):
+        self._environment = environment
+        self._scan_segments = scan_segments
+        self._dynamodb = dynamodb_resource(environment)
+
+    def load_current_trends(self):
+        items = parallel_scan(self._environment, 'Current_Trend', self._scan_segments)
+        logging.info("Loaded {} current trends.".format(len(items)))
+        return {item['stock_symbol']: item for item in items}
+
+    def get_current_trend(self, symbol = ''):
+        return self._dynamodb.Table('Current_Trend').get_item(Key={'stock_symbol': symbol}).get('Item')
+
+    def query_trend_history(self, symbol = ''):
+        table = self._dynamodb.Table('Trend_History')
+        items = []
+        query_kwargs = { 'KeyConditionExpression': Key('stock_symbol').eq(symbol) }
+        while True:
+            response = table.query(**query_kwargs)
+            items.extend(response['Items'])
+            if 'LastEvaluatedKey' not in response: return items
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    # The batch writers send 25 items per request and re-send anything DynamoDB hands back as unprocessed.
+    # overwrite_by_pkeys drops earlier duplicates of a key within a batch, the last write for a key wins just like put_item.
+    def write_trends(self, current_trend_items = (), trend_history_items = ()):
+        with self._dynamodb.Table('Current_Trend').batch_writer(overwrite_by_pkeys=['stock_symbol']) as batch:
+            for item in current_trend_items: batch.put_item(Item=item)
+
+        with self._dynamodb.Table('Trend_History').batch_writer(overwrite_by_pkeys=['stock_symbol', 'occurence_date']) as batch:
+            for item in trend_history_items: batch.put_item(Item=item)
+
+        logging.info("Saved {} current trends and {} trend history entries.".format(len(current_trend_items), len(trend_history_items)))
+
+    def reset(self, read_capacity = 50, write_capacity = 50):
+        for table_name in self.table_definitions:
+            table = self._dynamodb.Table(table_name)
+            try:
+                table.delete()
+                table.wait_until_not_exists()
+            except self._dynamodb.meta.client.exceptions.ResourceNotFoundException: pass
+
+        for table_name, definition in self.table_definitions.items():
+            table = self._dynamodb.create_table(TableName=table_name, ProvisionedThroughput={ 'ReadCapacityUnits': read_capacity, 'WriteCapacityUnits': write_capacity }, **definition)
+            table.wait_until_exists()
+            logging.info("{} table status: {}".format(table_name, table.table_status))
+
+
+class SqliteTrendStore(TrendStore):
+    # The primary keys give us the (stock_symbol) and (stock_symbol, occurence_date) indexes,
+    # the extra index covers looking up every trend of one type.
+    schema = (
+        'CREATE TABLE IF NOT EXISTS current_trend (stock_symbol TEXT PRIMARY KEY, up_trend INTEGER NOT NULL, down_trend INTEGER NOT NULL, trend_start_date TEXT)',
+        'CREATE TABLE IF NOT EXISTS trend_history (stock_symbol TEXT NOT NULL, occurence_date TEXT NOT NULL, trend_type TEXT NOT NULL, PRIMARY KEY (stock_symbol, occurence_date))',
+        'CREATE INDEX IF NOT EXISTS trend_history_trend_type ON trend_history (trend_type, occurence_date)',
+    )
+
+    def __init__(self, path = 'screener.db'):
+        # The write behind thread uses the same connection, the lock keeps the two from interleaving.
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=60)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            for statement in self.schema: self._connection.execute(statement)
+
+    def _current_trend_item(self, row = None):
+        return { 'stock_symbol': row[0], 'up_trend': bool(row[1]), 'down_trend': bool(row[2]), 'trend_start_date': row[3] }
+
+    def load_current_trends(self):
+        with self._lock:
+            rows = self._connection.execute('SELECT stock_symbol, up_trend, down_trend, trend_start_date FROM current_trend').fetchall()
+        logging.info("Loaded {} current trends.".format(len(rows)))
+        return {row[0]: self._current_trend_item(row) for row in rows}
+
+    def get_current_trend(self, symbol = ''):
+        with self._lock:
+            row = self._connection.execute('SELECT stock_symbol, up_trend, down_trend, trend_start_date FROM current_trend WHERE stock_symbol = ?', (symbol,)).fetchone()
+        if row is None: return None
+        return self._current_trend_item(row)
+
+    def query_trend_history(self, symbol = ''):
+        with self._lock:
+            rows = self._connection.execute('SELECT stock_symbol, occurence_date, trend_type FROM trend_history WHERE stock_symbol = ? ORDER BY occurence_date', (symbol,)).fetchall()
+        return [{ 'stock_symbol': row[0], 'occurence_date': row[1], 'trend_type': row[2] } for row in rows]
+
+    def write_trends(self, current_trend_items = (), trend_history_items = ()):
+        with self._lock, self._connection:
+            self._connection.executemany('INSERT OR REPLACE INTO current_trend (stock_symbol, up_trend, down_trend, trend_start_date) VALUES (?, ?, ?, ?)',
+                                         [(item['stock_symbol'], int(item['up_trend']), int(item['down_trend']), item['trend_start_date']) for item in current_trend_items])
+            self._connection.executemany('INSERT OR REPLACE INTO trend_history (stock_symbol, occurence_date, trend_type) VALUES (?, ?, ?)',
+                                         [(item['stock_symbol'], item['occurence_date'], item['trend_type']) for item in trend_history_items])
+
+        logging.info("Saved {} current trends and {} trend history entries.".format(len(current_trend_items), len(trend_history_items)))
+
+    def reset(self):
+        with self._lock, self._connection:
+            self._connection.execute('DROP TABLE IF EXISTS current_trend')
+            self._connection.execute('DROP TABLE IF EXISTS trend_history')
+            for statement in self.schema: self._connection.execute(statement)
+
+    def close(self):
+        self._connection.close()
+
+
+class WriteBehindTrendStore(TrendStore):
+    # Wraps another TrendStore.  write_trends returns straight away and a background thread applies
+    # the queued writes, combining whatever has piled up into one write of up to batch_size items.
+    # Reads flush the queue first so they always see our own writes.
+    def __init__(self, store = None, batch_size = 500):
+        self._store = store
+        self._batch_size = batch_size
+        self._queue = queue.Queue()
+        self._errors = []
+        self._worker = threading.Thread(target=self._drain, name='trend-store-writer', daemon=True)
+        self._worker.start()
+
+    def _drain(self):
+        stopping = False
+        while not stopping:
+            batches = [self._queue.get()]
+            while len(batches) < self._batch_size:
+                try: batches.append(self._queue.get_nowait())
+                except queue.Empty: break
+
+            current_trend_items, trend_history_items = [], []
+            for batch in batches:
+                if batch is None: stopping = True
+                else:
+                    current_trend_items.extend(batch[0])
+                    trend_history_items.extend(batch[1])
+
+            try:
+                if current_trend_items or trend_history_items: self._store.write_trends(current_trend_items, trend_history_items)
+            except Exception as e:
+                logging.exception("Ran into an issue saving {} current trends and {} trend history entries.".format(len(current_trend_items), len(trend_history_items)))
+                self._errors.append(e)
+
+            for batch in batches: self._queue.task_done()
+
+    # Waits for the queued writes to be applied.  Raises the first write error, if there was one.
+    def flush(self):
+        self._queue.join()
+        if self._errors:
+            error = self._errors[0]
+            self._errors = []
+            raise error
+
+    def load_current_trends(self):
+        self.flush()
+        return self._store.load_current_trends()
+
+    def get_current_trend(self, symbol = ''):
+        self.flush()
+        return self._store.get_current_trend(symbol)
+
+    def query_trend_history(self, symbol = ''):
+        self.flush()
+        return self._store.query_trend_history(symbol)
+
+    def write_trends(self, current_trend_items = (), trend_history_items = ()):
+        self._queue.put((list(current_trend_items), list(trend_history_items)))
+
+    def reset(self):
+        self.flush()
+        self._store.reset()
+
+    # Applies everything that is still queued and stops the background thread.
+    def close(self):
+        self._queue.put(None)
+        self._worker.join()
+        self._store.close()
+        if self._errors: raise self._errors[0]
+
+
+# Picks the trend store for an environment.  TREND_STORE (dynamodb or sqlite) overrides the default,
+# which is DynamoDB in PROD and a local SQLite file (TREND_DB_PATH, default screener.db) everywhere else.
+def open_trend_store(environment = 'DEV', write_behind = False):
+    default_backend = 'dynamodb' if environment == 'PROD' else 'sqlite'
+    backend = os.getenv('TREND_STORE', default_backend).lower()
+
+    if backend == 'dynamodb': store = DynamoTrendStore(environment)
+    elif backend == 'sqlite': store = SqliteTrendStore(os.getenv('TREND_DB_PATH', 'screener.db'))
+    else: raise ValueError("Unknown TREND_STORE {}, use dynamodb or sqlite.".format(backend))
+
+    if write_behind: store = WriteBehindTrendStore(store)
+    return store
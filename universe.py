@@ -0,0 +1,99 @@
+#!/usr/bin/python
+
+import csv
+import logging
+import os
+
+
+    # Loads the universe of stocks to screen from the exchange company lists.
+    #
+    # The company lists (NASDAQ.csv, NYSE.csv, ...) are parsed with the csv module, so a quoted comma
+    # in a company name doesn't shift the columns, and a symbol listed by more than one exchange is
+    # only screened once, from the first file it's in.  Rows with an n/a in them are skipped like they
+    # always have been.
+    #
+    # The lists carry each company's LastSale and MarketCap, which are used to drop the symbols that
+    # could never pass a screen before any prices are requested for them.  The filters are off unless
+    # they are set:
+    #
+    #    UNIVERSE_MIN_PRICE        lowest LastSale to screen, e.g. 1
+    #    UNIVERSE_MAX_PRICE        highest LastSale to screen
+    #    UNIVERSE_MIN_MARKET_CAP   smallest MarketCap to screen, in dollars or with a K, M or B suffix, e.g. 50M
+    ##################################################
+
+
+_MULTIPLIERS = { 'K': 1e3, 'M': 1e6, 'B': 1e9, 'T': 1e12 }
+
+
+# Turns a LastSale or MarketCap value ("9.389", "$55.85M", "$1.2B") into a number, None when there isn't one.
+def parse_amount(value = ''):
+    value = value.strip().lstrip('$').replace(',', '')
+    if len(value) == 0 or value == 'n/a': return None
+
+    multiplier = 1
+    if value[-1].upper() in _MULTIPLIERS:
+        multiplier = _MULTIPLIERS[value[-1].upper()]
+        value = value[:-1]
+    try: return float(value) * multiplier
+    except ValueError: return None
+
+
+class UniverseFilter:
+    def __init__(self, min_price = None, max_price = None, min_market_cap = None):
+        self._min_price = min_price
+        self._max_price = max_price
+        self._min_market_cap = min_market_cap
+
+    # The filters set in UNIVERSE_MIN_PRICE, UNIVERSE_MAX_PRICE and UNIVERSE_MIN_MARKET_CAP.
+    @classmethod
+    def from_environment(cls):
+        return cls(parse_amount(os.getenv('UNIVERSE_MIN_PRICE', '')), parse_amount(os.getenv('UNIVERSE_MAX_PRICE', '')), parse_amount(os.getenv('UNIVERSE_MIN_MARKET_CAP', '')))
+
+    def is_active(self):
+        return any(x is not None for x in (self._min_price, self._max_price, self._min_market_cap))
+
+    # Returns the reason the company list row is filtered out, or None to keep it.
+    # A row without a price or market cap is kept, there is nothing to judge it by.
+    def rejects(self, row = None):
+        price = parse_amount(row.get('LastSale') or '')
+        if price is not None:
+            if self._min_price is not None and price < self._min_price: return 'price'
+            if self._max_price is not None and price > self._max_price: return 'price'
+
+        market_cap = parse_amount(row.get('MarketCap') or '')
+        if market_cap is not None and self._min_market_cap is not None and market_cap < self._min_market_cap: return 'market cap'
+        return None
+
+
+# Returns the symbols in the company list files, in file order without duplicates.
+# universe_filter drops the rows outside its price and market cap limits, skip_na drops the rows with an n/a in them.
+# The files are read through input_loader (see input_loader.py) when there is one, otherwise from the working directory.
+def load_universe(names = (), universe_filter = None, skip_na = True, input_loader = None):
+    symbols = []
+    seen = set()
+    skipped = { 'n/a': 0, 'duplicate': 0, 'price': 0, 'market cap': 0 }
+
+    open_text = input_loader.open_text if input_loader is not None else lambda name: open(name, newline='')
+    for name in names:
+        with open_text(name) as company_list:
+            for row in csv.DictReader(company_list):
+                symbol = (row.get('Symbol') or '').strip()
+                if len(symbol) == 0: continue
+                if skip_na and any('n/a' in (value or '') for value in row.values() if isinstance(value, str)):
+                    skipped['n/a'] += 1
+                    continue
+                if symbol in seen:
+                    skipped['duplicate'] += 1
+                    continue
+
+                reason = universe_filter.rejects(row) if universe_filter is not None else None
+                if reason is not None:
+                    skipped[reason] += 1
+                    continue
+
+                seen.add(symbol)
+                symbols.append(symbol)
+        logging.info("Added stocks from {} for processing.".format(name))
+
+    logging.info("Loaded {} stocks, skipped {}.".format(len(symbols), ', '.join("{} for {}".format(count, reason) for reason, count in skipped.items())))
+    return symbols